@@ -0,0 +1,206 @@
+"""
+Scaling benchmarks of picometer on synthetic structures, runnable offline.
+Every case varies one parameter of the synthetic input (atom count,
+presence of ADPs, number of blocks per file, number of structures, size
+of an unrelated reflection loop), keeping others at `BASELINE`, and times
+five phases of a typical routine as it scales:
+- load: `load` instructions reading all cif files and blocks;
+- select: `AtomSet.locate` of symmetry-transformed rings in all structures;
+- fit: `centroid` and `plane` of selected rings;
+- measure: `distance`, `angle`, `dihedral` between atoms and rings' planes;
+- write: `write` of the evaluation table to a csv file.
+Each phase is timed with `time.perf_counter` in fresh processors, reporting
+the best of `--repeat` runs. Results are stored as JSON, which can be later
+compared with results of another commit using `--compare`.
+
+Usage:
+  python -m benchmarks.suite [-o results.json] [--quick] [--repeat N]
+  python -m benchmarks.suite --compare old.json new.json
+"""
+
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import RING_SIZE, write_synthetic_cif
+from picometer.atom import Locator
+from picometer.instructions import Routine
+from picometer.process import Processor
+from picometer.settings import Settings
+
+
+PHASES = ('load', 'select', 'fit', 'measure', 'write')
+BASELINE = dict(n_atoms=600, adps=True, n_blocks=1, n_structures=4, n_reflections=0)
+SCALES = {
+    'n_atoms': [60, 600, 6000, 24000],
+    'adps': [False, True],
+    'n_blocks': [1, 10, 50],
+    'n_structures': [1, 10, 50],
+    'n_reflections': [0, 100_000],
+}
+QUICK_SCALES = {
+    'n_atoms': [60, 600],
+    'adps': [False, True],
+    'n_blocks': [1, 4],
+    'n_structures': [1, 4],
+}
+N_RINGS_USED = 10  # rings selected, fitted, and measured in every structure
+
+
+def _routine(lines: list[str]) -> Routine:
+    return Routine.from_string('instructions:\n' + ''.join(
+        f'  - {line}\n' for line in lines))
+
+
+def phase_routines(cif_paths: list[Path], n_blocks: int, n_rings: int,
+                   csv_path: Path) -> dict[str, Routine]:
+    """Routines of all phases but `select`, which uses the Python API"""
+    block = ", block: '*'" if n_blocks > 1 else ''
+    rings = range(1, min(n_rings, N_RINGS_USED) + 1)
+    fit, measure = [], []
+    for r in rings:
+        fit.extend([f'select: C{r}_.*', f'centroid: centroid{r}',
+                    f'select: C{r}_.*', f'plane: plane{r}'])
+        measure.extend([f'select: C{r}_1', f'select: C{r}_4', f'distance: d{r}',
+                        f'select: C{r}_1', f'select: C{r}_2', f'select: C{r}_3',
+                        f'angle: a{r}', f'select: C{r}_1', f'select: C{r}_2',
+                        f'select: C{r}_3', f'select: C{r}_4', f'dihedral: t{r}',
+                        f'select: centroid{r}',
+                        f'select: {{label: C{r}_1, symm: -x;-y;-z}}', f'distance: s{r}'])
+        if r > 1:
+            measure.extend([f'select: plane{r - 1}', f'select: plane{r}',
+                            f'angle: p{r}'])
+    return dict(
+        load=_routine([f'load: {{path: {p}{block}}}' for p in cif_paths]),
+        fit=_routine(fit), measure=_routine(measure),
+        write=_routine([f'write: {csv_path}']))
+
+
+def select_locators(n_rings: int) -> list[list[Locator]]:
+    """Selections of rings transformed by every symmetry operation of P 21/c"""
+    symms = ['x,y,z', '-x,y+1/2,-z+1/2', '-x,-y,-z', 'x,-y+1/2,z+1/2']
+    return [[Locator(f'C{r}_.*', symm=symms[r % len(symms)])]
+            for r in range(1, min(n_rings, N_RINGS_USED) + 1)]
+
+
+def run_case(params: dict[str, Any], directory: Path) -> dict[str, float]:
+    """Generate inputs described by `params` and time every phase once"""
+    cif_paths = [directory / f'structure{s}.cif' for s in range(params['n_structures'])]
+    for seed, cif_path in enumerate(cif_paths):
+        if not cif_path.exists():
+            write_synthetic_cif(cif_path, params['n_atoms'], adps=params['adps'],
+                                n_blocks=params['n_blocks'],
+                                n_reflections=params['n_reflections'], seed=seed)
+    n_rings = max(1, params['n_atoms'] // RING_SIZE)
+    routines = phase_routines(cif_paths, params['n_blocks'], n_rings,
+                              directory / 'results.csv')
+    processor = Processor(Settings({'auto_write_unit_cell': False}))
+    timings = {}
+
+    def timed(phase: str, function: Callable[[], None]) -> None:
+        start = time.perf_counter()
+        function()
+        timings[phase] = time.perf_counter() - start
+
+    def process(phase: str) -> Callable[[], None]:
+        return lambda: [processor.process(i) for i in routines[phase]]
+
+    def select() -> None:
+        for model_state in processor.model_states.values():
+            for locators in select_locators(n_rings):
+                model_state.nodes.locate(locators)
+
+    timed('load', process('load'))
+    timed('select', select)
+    for phase in ('fit', 'measure', 'write'):
+        timed(phase, process(phase))
+    return timings
+
+
+def cases(scales: dict[str, list]) -> Iterator[tuple[str, dict[str, Any]]]:
+    for scaled, values in scales.items():
+        for value in values:
+            yield scaled, dict(BASELINE, **{scaled: value})
+
+
+def run_suite(scales: dict[str, list], repeat: int = 3) -> list[dict[str, Any]]:
+    """Time all `cases` of `scales`, return one record per case and phase"""
+    records = []
+    for scaled, params in cases(scales):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runs = [run_case(params, Path(temp_dir)) for _ in range(repeat)]
+        best = {phase: min(run[phase] for run in runs) for phase in PHASES}
+        print(f'{scaled}={params[scaled]!s:<{20 - len(scaled)}}' + ' '.join(
+            f'{phase}={seconds:.4f}s' for phase, seconds in best.items()))
+        records.extend(dict(case=scaled, params=params, phase=phase, seconds=seconds)
+                       for phase, seconds in best.items())
+    return records
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                              check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata() -> dict[str, Any]:
+    return dict(commit=_git_commit(), date=datetime.now(timezone.utc).isoformat(),
+                python=platform.python_version(), platform=platform.platform(),
+                numpy=np.__version__, pandas=pd.__version__)
+
+
+def compare(old_path: Path, new_path: Path) -> pd.DataFrame:
+    """Table of times in two result files and their ratio, new / old"""
+    def table(path: Path) -> pd.Series:
+        records = json.loads(Path(path).read_text())['results']
+        return pd.Series({(r['case'], str(r['params'][r['case']]), r['phase']):
+                          r['seconds'] for r in records})
+    old, new = table(old_path), table(new_path)
+    comparison = pd.DataFrame({'old': old, 'new': new}).dropna()
+    comparison['ratio'] = comparison['new'] / comparison['old']
+    comparison.index.names = ['case', 'value', 'phase']
+    return comparison
+
+
+def parse_args(args: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description='Time picometer phases on scaled synthetic structures')
+    parser.add_argument('-o', '--output', type=Path, default=Path('benchmarks.json'),
+                        help='JSON file to store the results in')
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help='Run a smaller set of cases, e.g. to smoke-test')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of runs of every case; best one is reported')
+    parser.add_argument('--compare', nargs=2, type=Path, metavar=('OLD', 'NEW'),
+                        help='Compare two result files instead of running')
+    return parser.parse_args(args)
+
+
+def main(args: list[str] = None) -> None:
+    args = parse_args(args)
+    if args.compare:
+        with pd.option_context('display.max_rows', None, 'display.width', 120):
+            print(compare(*args.compare).round(4))
+        return
+    logging.getLogger('picometer').setLevel(logging.WARNING)
+    results = run_suite(QUICK_SCALES if args.quick else SCALES, repeat=args.repeat)
+    args.output.write_text(json.dumps(dict(metadata=metadata(), results=results),
+                                      indent=2))
+    print(f'Saved {len(results)} results to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
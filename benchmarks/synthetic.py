@@ -0,0 +1,93 @@
+"""
+Generator of synthetic cif files for benchmarks. Every structure comprises
+randomly oriented, slightly distorted six-membered carbon rings labelled
+`C{ring}_{1-6}`, placed on a grid in a rectangular P 21/c unit cell.
+Atom count, anisotropic displacement parameters, number of data blocks,
+and size of an unrelated reflection loop are tunable; output is seeded.
+"""
+
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+
+RING_SIZE = 6
+RING_RADIUS = 1.39  # Å, aromatic C-C distance
+GRID_SPACING = 7.0  # Å between centers of neighbouring rings
+SYMM_OP_CODES = ('x, y, z', '-x, y+1/2, -z+1/2', '-x, -y, -z', 'x, -y+1/2, z+1/2')
+
+
+def _u(value: float, esd_digits: int, decimals: int) -> str:
+    """Format `value` as a cif number with uncertainty in the last digits"""
+    return f'{value:.{decimals}f}({esd_digits})'
+
+
+def _rotation(rng: np.random.Generator) -> np.ndarray:
+    q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    return q * np.sign(np.diag(r))
+
+
+def synthetic_block(block_name: str, n_atoms: int, adps: bool = True,
+                    n_reflections: int = 0, seed: int = 0,
+                    expansion: float = 1.0) -> str:
+    """Text of a single cif data block with about `n_atoms` atoms in rings"""
+    rng = np.random.default_rng(seed)
+    n_rings = max(1, n_atoms // RING_SIZE)
+    per_edge = int(np.ceil(n_rings ** (1 / 3)))
+    cell = per_edge * GRID_SPACING * expansion * np.array([1.0, 1.015, 1.03])
+    angles = np.linspace(0, 2 * np.pi, RING_SIZE, endpoint=False)
+    ring = RING_RADIUS * np.stack([np.cos(angles), np.sin(angles),
+                                   np.zeros(RING_SIZE)], axis=1)
+    lines = [f'data_{block_name}',
+             f'_cell_length_a {_u(cell[0], 3, 4)}',
+             f'_cell_length_b {_u(cell[1], 4, 4)}',
+             f'_cell_length_c {_u(cell[2], 5, 4)}',
+             '_cell_angle_alpha 90', '_cell_angle_beta 90', '_cell_angle_gamma 90',
+             "_space_group_name_H-M_alt 'P 1 21/c 1'",
+             'loop_', '_space_group_symop_operation_xyz',
+             *(f"'{code}'" for code in SYMM_OP_CODES),
+             'loop_', '_atom_site_label', '_atom_site_type_symbol',
+             '_atom_site_fract_x', '_atom_site_fract_y', '_atom_site_fract_z',
+             '_atom_site_U_iso_or_equiv', '_atom_site_adp_type']
+    labels = []
+    for r in range(n_rings):
+        grid = np.array(np.unravel_index(r, (per_edge, ) * 3)) + 0.5
+        center = grid * GRID_SPACING * expansion
+        xyz = ring @ _rotation(rng).T + center + rng.normal(0, 0.01, (RING_SIZE, 3))
+        fract = xyz / cell
+        for k, f in enumerate(fract, start=1):
+            labels.append(label := f'C{r + 1}_{k}')
+            esds = rng.integers(2, 30, 3)
+            lines.append(f'{label} C {_u(f[0], esds[0], 5)} {_u(f[1], esds[1], 5)} '
+                         f'{_u(f[2], esds[2], 5)} {_u(rng.uniform(.02, .06), 2, 4)} '
+                         f'{"Uani" if adps else "Uiso"}')
+    if adps:
+        lines.extend(['loop_', '_atom_site_aniso_label',
+                      *(f'_atom_site_aniso_U_{ij}' for ij in
+                        ['11', '22', '33', '23', '13', '12'])])
+        for label in labels:
+            u = np.concatenate([rng.uniform(.02, .06, 3), rng.uniform(-.005, .005, 3)])
+            lines.append(label + ' ' + ' '.join(_u(v, 2, 4) for v in u))
+    if n_reflections:
+        lines.extend(['loop_', '_refln_index_h', '_refln_index_k', '_refln_index_l',
+                      '_refln_F_squared_meas', '_refln_F_squared_sigma'])
+        hkl = rng.integers(-30, 31, (n_reflections, 3))
+        f2 = rng.uniform(0, 1000, n_reflections)
+        lines.extend(f'{h:4d}{k:4d}{l:4d}{f:10.2f}{np.sqrt(f):8.2f}'
+                     for (h, k, l), f in zip(hkl, f2))
+    return '\n'.join(lines) + '\n'
+
+
+def write_synthetic_cif(cif_path: Union[str, Path], n_atoms: int = 600,
+                        adps: bool = True, n_blocks: int = 1,
+                        n_reflections: int = 0, seed: int = 0) -> list[str]:
+    """Write a cif with `n_blocks` blocks, e.g. measured at increasing
+    temperatures, i.e. with slightly expanded cells; return block names"""
+    block_names = [f'synthetic_{seed}_{b + 1}' for b in range(n_blocks)]
+    with open(cif_path, 'w') as cif_file:
+        for b, block_name in enumerate(block_names):
+            cif_file.write(synthetic_block(
+                block_name, n_atoms, adps=adps, n_reflections=n_reflections,
+                seed=seed * 1000 + b, expansion=1.0 + 0.001 * b))
+    return block_names
@@ -0,0 +1,38 @@
+"""
+Micro-benchmark of parsing cif numbers with uncertainties: compares
+per-value `uncertainties.ufloat_fromstr` with vectorized `ustrs2arrays`.
+Usage: python benchmarks/ustr_parsing.py [number of values]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import uncertainties as uc
+
+from picometer.utility import ustrs2arrays
+
+
+def random_ustrs(n: int, seed: int = 42) -> list[str]:
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(-1, 1, n)
+    esds = rng.integers(1, 99, n)
+    return [f'{v:.5f}({e})' if e % 5 else f'{v:.4f}' for v, e in zip(values, esds)]
+
+
+def main(n: int = 100_000, repeat: int = 5) -> None:
+    strings = random_ustrs(n)
+    reference = np.array([uc.ufloat_fromstr(s).nominal_value for s in strings])
+    assert np.array_equal(ustrs2arrays(strings)[0], reference)
+    timings = {
+        'ufloat_fromstr': lambda: [uc.ufloat_fromstr(s) for s in strings],
+        'ustrs2arrays': lambda: ustrs2arrays(strings)}
+    best = {name: min(timeit.repeat(f, number=1, repeat=repeat))
+            for name, f in timings.items()}
+    for name, seconds in best.items():
+        print(f'{name:>16}: {seconds * 1e3:9.2f} ms for {n} values')
+    print(f'{"speedup":>16}: {best["ufloat_fromstr"] / best["ustrs2arrays"]:9.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
@@ -1,4 +1,6 @@
-# read version from installed package
-from importlib.metadata import version
-
-__version__ = version("picometer")
+# read version from installed package on first access, to speed up start-up
+def __getattr__(name: str) -> str:
+    if name == '__version__':
+        from importlib.metadata import version
+        return version('picometer')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -2,6 +2,7 @@ from argparse import ArgumentParser, Namespace
 from picometer.instructions import Routine
 from picometer.logging import add_file_handler
 from picometer.process import process
+from picometer.settings import Settings
 import sys
 
 
@@ -12,6 +13,33 @@ def parse_args() -> Namespace:
     ap = ArgumentParser(prog='picometer', description=desc, epilog=author)
     ap.add_argument('filename', help='Path to yaml file with routine '
                                      'settings and instructions')
+    ap.add_argument('-w', '--workers', type=int, metavar='N',
+                    help='Number of processes used to read cif files, '
+                         '0 to use all CPUs (default: "load_workers" setting)')
+    ap.add_argument('-s', '--stream', action='store_true',
+                    help='Process structures one at a time to limit memory '
+                         'usage, reading next cif files in background')
+    ap.add_argument('-i', '--incremental', metavar='DIR',
+                    help='Stream structures, reusing results of structures '
+                         'unchanged since the previous run cached in DIR')
+    ap.add_argument('-c', '--checkpoint', metavar='PATH',
+                    help='Periodically save processor state to PATH '
+                         '(default: "checkpoint_path" setting)')
+    ap.add_argument('-r', '--resume', action='store_true',
+                    help='Continue the routine from the last saved checkpoint')
+    ap.add_argument('-O', '--optimize', action='store_true',
+                    help='Skip unused and repeated fits of centroids, lines, '
+                         'and planes, which do not affect the results')
+    ap.add_argument('-t', '--timings', action='store_true',
+                    help='Print wall and CPU time spent on every instruction')
+    ap.add_argument('--trace', metavar='PATH',
+                    help='Save timings as a Chrome trace JSON file to PATH, '
+                         'to be viewed e.g. in Perfetto')
+    ap.add_argument('-l', '--log-level', default='DEBUG', type=str.upper,
+                    choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                    metavar='LEVEL', help='Minimum level of messages written to '
+                    'picometer.log: DEBUG (default), INFO, WARNING, ERROR, '
+                    'or CRITICAL')
     if len(sys.argv) == 1:
         ap.print_help(sys.stderr)
         sys.exit(1)
@@ -21,9 +49,22 @@ def parse_args() -> Namespace:
 def main() -> int:
     args = parse_args()
     if filename := args.filename:
-        add_file_handler('picometer.log')
+        add_file_handler('picometer.log', level=args.log_level)
         routine = Routine.from_yaml(filename)
-        process(routine)
+        settings = Settings()
+        if args.workers is not None:
+            settings['load_workers'] = args.workers
+        if args.incremental:
+            settings['incremental_cache_dir'] = args.incremental
+        if args.checkpoint:
+            settings['checkpoint_path'] = args.checkpoint
+        stream = args.stream or bool(args.incremental)
+        processor = process(routine, settings, stream=stream,
+                            optimize=args.optimize, resume=args.resume)
+        if args.timings:
+            print(processor.timing_table.to_string(index=False))
+        if args.trace:
+            processor.timer.write_trace(args.trace)
     return 0
 
 
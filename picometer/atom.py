@@ -1,21 +1,26 @@
-from copy import deepcopy
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
+from functools import lru_cache, wraps
+import itertools
 import logging
-from typing import Dict, NamedTuple, List, Sequence
+import re
+from typing import Any, Callable, Dict, Mapping, NamedTuple, List, Optional, \
+    Sequence, Tuple, TYPE_CHECKING
 
-from hikari.dataframes import BaseFrame, CifFrame
 from numpy.linalg import norm
 import numpy as np
 import pandas as pd
 
+from picometer.cache import CachedStructure, StructureCache
+from picometer.cif import CifError, CifReader, CifValue
 from picometer.shapes import (are_synparallel, degrees_between, Line,
                               Plane, Shape, Vector3)
-from picometer.utility import ustr2float, ustr2floats
+from picometer.utility import LRUCache, ustrs2arrays
 
 
-try:
+if TYPE_CHECKING:  # hikari is imported on first use to speed up start-up
+    from hikari.dataframes import BaseFrame
     from hikari.symmetry import Operation
-except ImportError:  # hikari version < 0.3.0
-    from hikari.symmetry import SymmOp as Operation
 
 
 logger = logging.getLogger(__name__)
@@ -38,24 +43,359 @@ class Locator(NamedTuple):
         return self.label is not None
 
 
-group_registry: Dict[str, List[Locator]] = {}
+class GroupRegistry(Dict[str, List[Locator]]):
+    """Dictionary of named groups that counts its modifications in `version`"""
+    version: int = 0
+
+    def __setitem__(self, key: str, value: List[Locator]) -> None:
+        if key in self and self[key] == value:
+            return  # re-defining identical group keeps cached plans valid
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.version += 1
+
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
+
+    def pop(self, *args) -> List[Locator]:
+        self.version += 1
+        return super().pop(*args)
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self.version += 1
+
+
+group_registry = GroupRegistry()
+
+
+@lru_cache(maxsize=1024)
+def _compile_label_regex(label_regex: str) -> re.Pattern:
+    return re.compile(label_regex)
+
+
+@lru_cache(maxsize=None)
+def _operation_type() -> type:
+    """Class of hikari symmetry operations, imported on first use"""
+    try:
+        from hikari.symmetry import Operation
+    except ImportError:  # hikari version < 0.3.0
+        from hikari.symmetry import SymmOp as Operation
+    return Operation
+
+
+class _SymmetryOperation(NamedTuple):
+    """Parsed symmetry operation with read-only matrices used by `transform`"""
+    operation: 'Operation'
+    tf: np.ndarray  # 3x3 rotation of fractional coordinates
+    tl: np.ndarray  # 3-vector of fractional translation
+    tf_t: np.ndarray  # transposed `tf`, rotates Uij as `tf @ Uij @ tf_t`
+    is_identity: bool
+
+
+@lru_cache(maxsize=1024)
+def _parse_symm_op(symm_op_code: str) -> _SymmetryOperation:
+    operation = _operation_type().from_code(symm_op_code)
+    tf, tl = operation.tf.copy(), operation.tl.copy()
+    tf_t = np.ascontiguousarray(tf.T)
+    tf, tl, tf_t = map(_read_only, (tf, tl, tf_t))
+    is_identity = np.array_equal(tf, np.eye(3)) and not np.any(tl)
+    return _SymmetryOperation(operation, tf, tl, tf_t, is_identity)
+
+
+DISTANCE_MEMORY_BUDGET = 64 * 2 ** 20  # bytes of temporary distance arrays
+KDTREE_MIN_PAIRS = 2 ** 20  # use k-d tree for at least this many atom pairs
+
+
+class ClosestPair(NamedTuple):
+    """Shortest distance between two AtomSets and atoms defining it"""
+    distance: float
+    label1: str
+    label2: str
+    position1: int = 0  # position of the first atom in the first AtomSet
+    position2: int = 0  # position of the second atom in the second AtomSet
+
+
+@lru_cache(maxsize=None)
+def _kdtree_type() -> Optional[type]:
+    """Class of scipy k-d trees imported on first use, or None if unavailable"""
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:  # scipy is optional, use chunked brute force instead
+        return None
+    return cKDTree
+
+
+def _closest_positions(xyz1: np.ndarray, xyz2: np.ndarray,
+                       memory_budget: int = None) -> Tuple[float, int, int]:
+    """
+    Shortest distance between (N, 3) and (K, 3) coordinates & its positions.
+    Use k-d tree for large sets if scipy is available, otherwise compare
+    blocks of `xyz1` against `xyz2` to stay within `memory_budget` bytes.
+    """
+    memory_budget = memory_budget or DISTANCE_MEMORY_BUDGET
+    if len(xyz1) * len(xyz2) >= KDTREE_MIN_PAIRS \
+            and (kdtree_type := _kdtree_type()) is not None:
+        distances, indices = kdtree_type(xyz2).query(xyz1, k=1)
+        i = int(np.argmin(distances))
+        return float(distances[i]), i, int(indices[i])
+    # https://stackoverflow.com/a/43359192/8279065 bloody brilliant
+    squares2 = np.sum(xyz2 ** 2, axis=1)
+    block_size = max(1, memory_budget // (16 * len(xyz2)))  # 2 (n, k) arrays
+    best = (np.inf, 0, 0)
+    for start in range(0, len(xyz1), block_size):
+        block = xyz1[start:start + block_size]
+        p = np.add.outer(np.sum(block ** 2, axis=1), squares2)
+        d2 = p - 2 * np.dot(block, xyz2.T)
+        i, j = np.unravel_index(np.argmin(d2), d2.shape)
+        if d2[i, j] < best[0]:
+            best = (d2[i, j], start + int(i), int(j))
+    return float(np.sqrt(max(best[0], 0.))), best[1], best[2]
+
+
+class _CellMatrices(NamedTuple):
+    """Read-only matrices derived from the unit cell of a `BaseFrame`"""
+    orthogonalisation: np.ndarray  # A_d.T, fractional to Cartesian coords
+    fractionalisation: np.ndarray  # inverse of A_d.T, Cartesian to fractional
+    reciprocal_lengths: np.ndarray  # lengths of a*, b*, c*
+
+
+_cell_matrices_cache = LRUCache(maxsize=1024)
+
+
+def _cell_matrices(bf: 'BaseFrame') -> _CellMatrices:
+    """Matrices for the unit cell of `bf`, computed once per unit cell"""
+    key = (bf.a_d, bf.b_d, bf.c_d, bf.al_d, bf.be_d, bf.ga_d)
+    if (matrices := _cell_matrices_cache.get(key)) is None:
+        orthogonalisation = bf.A_d.T
+        fractionalisation = np.linalg.inv(orthogonalisation)
+        reciprocal_lengths = np.array([bf.a_r, bf.b_r, bf.c_r])
+        matrices = _CellMatrices(*map(_read_only, (
+            orthogonalisation, fractionalisation, reciprocal_lengths)))
+        _cell_matrices_cache[key] = matrices
+    return matrices
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def _memoized(getter: Callable[['AtomSet'], Any]) -> property:
+    """Property of AtomSet memoized until its `table` or `base` are replaced"""
+    name = getter.__name__
+
+    @wraps(getter)
+    def memoized_getter(self: 'AtomSet') -> Any:
+        try:
+            return self._memo[name]
+        except KeyError:
+            value = getter(self)
+            if isinstance(value, np.ndarray):
+                value = _read_only(value)
+            self._memo[name] = value
+            return value
+    return property(memoized_getter)
+
+
+def _literal_prefix(label_regex: str) -> str:
+    """Longest literal prefix that every match of `label_regex` starts with"""
+    if '|' in label_regex:
+        return ''
+    prefix = []
+    for char in label_regex:
+        if char in '.^$*+?{}[]\\|()':
+            if char in '*?{' and prefix:
+                prefix.pop()  # last literal char is optional
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+class LabelIndex:
+    """
+    Positions of atom labels, shared by all `AtomSet`s with the same labels.
+    Exact labels are found in constant time, while regular expressions
+    are tested only against labels starting with their literal prefix.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, labels: Tuple[str, ...]) -> None:
+        self.id = next(self._ids)
+        self.labels = labels
+        positions: Dict[str, List[int]] = {}
+        for position, label in enumerate(labels):
+            positions.setdefault(label, []).append(position)
+        self.exact = {k: np.array(v, dtype=np.intp) for k, v in positions.items()}
+        self.sorted_labels = sorted(self.exact)
+        self.matches: LRUCache = LRUCache(maxsize=1024)
+
+    @classmethod
+    def get(cls, labels: Tuple[str, ...]) -> 'LabelIndex':
+        """Return shared `LabelIndex` for labels, creating it if necessary"""
+        if labels not in _label_indices:
+            _label_indices[labels] = cls(labels)
+        return _label_indices[labels]
+
+    def __reduce__(self) -> tuple:
+        """Unpickle as the shared index of the current process: the pickled
+        `id` may have been assigned to another label set in this process"""
+        return self.get, (self.labels, )
+
+    def extended(self, new_labels: Sequence[str]) -> 'LabelIndex':
+        """Shared `LabelIndex` of self with `new_labels` appended at the end"""
+        labels = self.labels + tuple(new_labels)
+        if labels in _label_indices:
+            return _label_indices[labels]
+        new = self.__class__.__new__(self.__class__)
+        new.id = next(self._ids)
+        new.labels = labels
+        new.exact = dict(self.exact)
+        new.sorted_labels = list(self.sorted_labels)
+        new.matches = LRUCache(maxsize=1024)
+        for position, label in enumerate(new_labels, start=len(self.labels)):
+            if label in new.exact:
+                new.exact[label] = np.append(new.exact[label], position)
+            else:
+                new.exact[label] = np.array([position], dtype=np.intp)
+                insort(new.sorted_labels, label)
+        _label_indices[labels] = new
+        return new
+
+    def match(self, label_regex: str) -> np.ndarray:
+        """Positions of labels equal to or else `re.match`-ing `label_regex`"""
+        if (positions := self.exact.get(label_regex)) is not None:
+            return positions
+        if label_regex not in self.matches:
+            self.matches[label_regex] = self._match_regex(label_regex)
+        return self.matches[label_regex]
+
+    def _match_regex(self, label_regex: str) -> np.ndarray:
+        pattern = _compile_label_regex(label_regex)
+        prefix = _literal_prefix(label_regex)
+        start = bisect_left(self.sorted_labels, prefix)
+        matched = []
+        for label in self.sorted_labels[start:]:
+            if not label.startswith(prefix):
+                break
+            if pattern.match(label):
+                matched.append(self.exact[label])
+        return np.sort(np.concatenate(matched)) if matched \
+            else np.array([], dtype=np.intp)
+
+
+# Selection plans: lists of (positions, symm op codes) fragments to locate.
+# Plans depend only on labels, so they are shared by all AtomSets with
+# identical label sets, identified by `LabelIndex`es stored in `_label_indices`
+Plan = List[Tuple[np.ndarray, Tuple[str, ...]]]
+_label_indices: LRUCache = LRUCache(maxsize=1024)
+_plan_cache: LRUCache = LRUCache(maxsize=65536)
+
+
+def _cif_loop_frame(cif_block, labels: Sequence[str],
+                    columns: Dict[str, str], esds: bool = False) -> pd.DataFrame:
+    """Build a float table of `columns` (name: cif key) from one cif loop.
+    Like `zip`, use only rows present in labels and every requested column.
+    If `esds`, follow every column with its standard uncertainties column"""
+    values = {}
+    for name, key in columns.items():
+        values[name], esd = ustrs2arrays(cif_block.get(key, []))
+        if esds:
+            values[name + '_esd'] = esd
+    length = min(len(labels), *(len(v) for v in values.values()))
+    data = {name: v[:length] for name, v in values.items()}
+    return pd.DataFrame(data, index=pd.Index(labels[:length], dtype=str))
+
+
+def _is_block_pattern(block: Optional[str]) -> bool:
+    return bool(block) and any(c in block for c in '*?[')
+
+
+def _match_blocks(cif_path: str, block: Optional[str], block_names: Sequence[str]
+                  ) -> List[Optional[str]]:
+    """Names of blocks matching glob pattern `block`, or `block` itself"""
+    if not _is_block_pattern(block):
+        return [block]
+    matched = [name for name in block_names if fnmatchcase(name.lower(), block.lower())]
+    if not matched:
+        logger.warning('No blocks matching %s found in %s', block, cif_path)
+    return matched
+
+
+FRACT_ESD_COLUMNS = ['fract_x_esd', 'fract_y_esd', 'fract_z_esd']
+_UIJ_COMPONENTS = {'U11': (0, 0), 'U22': (1, 1), 'U33': (2, 2),
+                   'U12': (0, 1), 'U13': (0, 2), 'U23': (1, 2)}
 
 
 class AtomSet(Shape):
-    """Container class w/ atoms stored in pd.Dataframe & convenience methods"""
+    """
+    Container class w/ atoms stored in pd.Dataframe & convenience methods.
+    Selections and transformations share data of their parent's table
+    where possible; the table is never edited in-place, only replaced.
+    Derived coordinates are memoized until the table or base are replaced.
+    """
 
     kind = Shape.Kind.spatial
+    symm_op_codes: Tuple[str, ...] = ('x,y,z', )  # space group, set on load
+    cell_esd: Optional[np.ndarray] = None  # esds of a, b, c, al, be, ga if kept
 
     def __init__(self,
-                 bf: BaseFrame = None,
+                 bf: 'BaseFrame' = None,
                  table: pd.DataFrame = None,
                  ) -> None:
 
-        logger.debug(f'Created atom set with {bf!r} and '
-                     f'{len(table) if table is not None else 0}-element table')
+        logger.debug('Created atom set with %r and %d-element table',
+                     bf, len(table) if table is not None else 0)
+        self._memo = {}
         self.base = bf
         self.table = table
 
+    @property
+    def base(self) -> 'BaseFrame':
+        return self._base
+
+    @base.setter
+    def base(self, bf: 'BaseFrame') -> None:
+        self._base = bf
+        self._memo = {}
+
+    @property
+    def table(self) -> pd.DataFrame:
+        return self._table
+
+    @table.setter
+    def table(self, table: pd.DataFrame) -> None:
+        self._table = table
+        self._label_index = None
+        self._memo = {}
+
+    @property
+    def cell_matrices(self) -> _CellMatrices:
+        """Orthogonalisation & fractionalisation matrices, reciprocal lengths"""
+        return _cell_matrices(self.base)
+
+    @property
+    def label_index(self) -> LabelIndex:
+        """A `LabelIndex` shared by all AtomSets with identical labels"""
+        if self._label_index is None:
+            labels = tuple(self.table.index.tolist()) if self.table is not None else ()
+            self._label_index = LabelIndex.get(labels)
+        return self._label_index
+
+    @label_index.setter
+    def label_index(self, label_index: LabelIndex) -> None:
+        """Use a known `LabelIndex`; it must describe labels of the table"""
+        self._label_index = label_index
+
+    @property
+    def label_set_id(self) -> int:
+        """An id shared by all AtomSets with identical labels in same order"""
+        return self.label_index.id
+
     def __len__(self) -> int:
         return len(self.table) if self.table is not None else 0
 
@@ -70,56 +410,157 @@ class AtomSet(Shape):
         return self.__class__(bf=self.base, table=self.table[item])
 
     @classmethod
-    def from_cif(cls, cif_path: str, block_name: str = None) -> 'AtomSet':
-        """Initialize from cif file using hikari's `BaseFrame` and `CifFrame`"""
+    def from_cif(cls,
+                 cif_path: str,
+                 block_name: str = None,
+                 cache: StructureCache = None,
+                 esds: bool = False,
+                 ) -> 'AtomSet':
+        """Initialize from cif file using `CifReader` and hikari's `BaseFrame`.
+        If `cache` is given, read the structure from it or store it there.
+        If `esds`, keep standard uncertainties of coordinates and unit cell"""
+        return cls.from_cif_blocks(cif_path, [block_name], cache, esds)[0][0][1]
+
+    @classmethod
+    def from_cif_blocks(cls,
+                        cif_path: str,
+                        blocks: Sequence[Optional[str]],
+                        cache: StructureCache = None,
+                        esds: bool = False,
+                        ) -> List[List[Tuple[Optional[str], 'AtomSet']]]:
+        """Initialize from several blocks of a cif file, parsing it once.
+        Every block is a name, `None` for the first block, or a glob pattern
+        matched case-insensitively against names of blocks in the same parse.
+        For every block return pairs of matched block name and `AtomSet`.
+        See `from_cif` for other args."""
+        if cache and not any(map(_is_block_pattern, blocks)):
+            structures = [cache.get(cif_path, b) for b in blocks]
+            if all(s is not None for s in structures):
+                return [[(b, cls._from_structure(s, esds))]
+                        for b, s in zip(blocks, structures)]
+        return [[(block_name, cls._from_structure(structure, esds))
+                 for block_name, structure in matched]
+                for matched in cls._parse_cif_blocks(cif_path, blocks, cache)]
+
+    @classmethod
+    def _from_structure(cls, structure: CachedStructure, esds: bool) -> 'AtomSet':
+        from hikari.dataframes import BaseFrame
         bf = BaseFrame()
+        bf.edit_cell(**dict(zip(['a', 'b', 'c', 'al', 'be', 'ga'],
+                                structure.cell.tolist())))
+        table = structure.table
+        if esds:
+            atoms = cls(bf, table)
+            atoms.cell_esd = _read_only(np.array(structure.cell_esd, dtype=float))
+        else:
+            atoms = cls(bf, table.drop(columns=FRACT_ESD_COLUMNS, errors='ignore'))
+        atoms.symm_op_codes = structure.symm_op_codes
+        return atoms
+
+    @staticmethod
+    def cif_block_names(cif_path: str) -> List[str]:
+        """Names of all data blocks in cif file, in order of appearance"""
+        try:
+            with CifReader(cif_path) as reader:
+                return reader.block_names
+        except CifError as e:
+            logger.info('Reading %s using hikari: %r', cif_path, e)
+        from hikari.dataframes import CifFrame
         cf = CifFrame()
         cf.read(cif_path)
-        block_name = block_name if block_name else list(cf.keys())[0]
-        cb = cf[block_name]
-        bf.edit_cell(a=ustr2float(cb['_cell_length_a']),
-                     b=ustr2float(cb['_cell_length_b']),
-                     c=ustr2float(cb['_cell_length_c']),
-                     al=ustr2float(cb['_cell_angle_alpha']),
-                     be=ustr2float(cb['_cell_angle_beta']),
-                     ga=ustr2float(cb['_cell_angle_gamma']))
-
-        atoms = pd.DataFrame()
-
-        atom_labels = cb.get('_atom_site_label', [])
-        atom_xs = ustr2floats(cb.get('_atom_site_fract_x', []))
-        atom_ys = ustr2floats(cb.get('_atom_site_fract_y', []))
-        atom_zs = ustr2floats(cb.get('_atom_site_fract_z', []))
-        atom_u_isos = ustr2floats(cb.get('_atom_site_U_iso_or_equiv', []))
-        for label, x, y, z in zip(atom_labels, atom_xs, atom_ys, atom_zs):
-            atoms.loc[label, ['fract_x', 'fract_y', 'fract_z']] = [x, y, z]
-        for label, u_iso in zip(atom_labels, atom_u_isos):
-            atoms.loc[label, 'Uiso'] = u_iso
-
-        atom_labels = cb.get('_atom_site_aniso_label', [])
-        atom_u11s = ustr2floats(cb.get('_atom_site_aniso_U_11', []))
-        atom_u22s = ustr2floats(cb.get('_atom_site_aniso_U_22', []))
-        atom_u33s = ustr2floats(cb.get('_atom_site_aniso_U_33', []))
-        atom_u12s = ustr2floats(cb.get('_atom_site_aniso_U_12', []))
-        atom_u13s = ustr2floats(cb.get('_atom_site_aniso_U_13', []))
-        atom_u23s = ustr2floats(cb.get('_atom_site_aniso_U_23', []))
-        atom_us = zip(atom_u11s, atom_u22s, atom_u33s, atom_u12s, atom_u13s, atom_u23s)
-        for label, us in zip(atom_labels, atom_us):
-            atoms.loc[label, ['U11', 'U22', 'U33', 'U12', 'U13', 'U23']] = list(us)
-
-        for col in atoms.columns:
-            atoms[col] = pd.to_numeric(atoms[col], errors='coerce')
-        return AtomSet(bf, atoms)
-
-    @property
+        return list(cf.keys())
+
+    @staticmethod
+    def _parse_cif(cif_path: str, block_name: str = None) -> CachedStructure:
+        """Read unit cell and atom table from cif block, by default first one"""
+        return AtomSet._parse_cif_blocks(cif_path, [block_name])[0][0][1]
+
+    @staticmethod
+    def _parse_cif_blocks(cif_path: str,
+                          blocks: Sequence[Optional[str]],
+                          cache: StructureCache = None,
+                          ) -> List[List[Tuple[Optional[str], CachedStructure]]]:
+        """Read unit cell and atom table from cif blocks in a single pass,
+        resolving block patterns against the blocks found by the same reader.
+        Use the targeted `CifReader`; fall back to hikari's `CifFrame`
+        for syntax it does not handle or if it finds no required items.
+        Structures found in `cache` are not parsed, new ones are stored"""
+        def read(block_name: Optional[str], parse: Callable[[], CachedStructure]
+                 ) -> Tuple[Optional[str], CachedStructure]:
+            if cache and (structure := cache.get(cif_path, block_name)) is not None:
+                return block_name, structure
+            structure = parse()
+            if cache:
+                cache.put(cif_path, block_name, structure)
+            return block_name, structure
+
+        try:
+            with CifReader(cif_path) as reader:
+                return [[read(b, lambda: AtomSet._parse_cif_block(reader.block(b)))
+                         for b in _match_blocks(cif_path, block, reader.block_names)]
+                        for block in blocks]
+        except (CifError, KeyError) as e:
+            logger.info('Reading %s using hikari: %r', cif_path, e)
+        from hikari.dataframes import CifFrame
+        cf = CifFrame()
+        cf.read(cif_path)
+        first_block_name = list(cf.keys())[0]
+        return [[read(b, lambda: AtomSet._parse_cif_block(cf[b or first_block_name]))
+                 for b in _match_blocks(cif_path, block, list(cf.keys()))]
+                for block in blocks]
+
+    @staticmethod
+    def _parse_cif_block(cb: Mapping[str, CifValue]) -> CachedStructure:
+        """Read unit cell and atom table from a cif block mapping"""
+        cell, cell_esd = ustrs2arrays(cb[key] for key in [
+            '_cell_length_a', '_cell_length_b', '_cell_length_c',
+            '_cell_angle_alpha', '_cell_angle_beta', '_cell_angle_gamma'])
+
+        site_labels = cb.get('_atom_site_label', [])
+        site_xyz = _cif_loop_frame(cb, site_labels, {
+            'fract_x': '_atom_site_fract_x',
+            'fract_y': '_atom_site_fract_y',
+            'fract_z': '_atom_site_fract_z'}, esds=True)
+        site_u_iso = _cif_loop_frame(cb, site_labels, {
+            'Uiso': '_atom_site_U_iso_or_equiv'})
+        aniso_labels = cb.get('_atom_site_aniso_label', [])
+        aniso_uij = _cif_loop_frame(cb, aniso_labels, {
+            'U11': '_atom_site_aniso_U_11',
+            'U22': '_atom_site_aniso_U_22',
+            'U33': '_atom_site_aniso_U_33',
+            'U12': '_atom_site_aniso_U_12',
+            'U13': '_atom_site_aniso_U_13',
+            'U23': '_atom_site_aniso_U_23'})
+
+        frames = [f for f in (site_xyz, site_u_iso, aniso_uij) if len(f)]
+        labels = pd.Index([], dtype=str)
+        for frame in frames:
+            labels = labels.append(frame.index.difference(labels, sort=False))
+        atoms = pd.concat([f.reindex(labels) for f in frames], axis=1) \
+            if frames else pd.DataFrame()
+        symm_op_codes = cb.get('_space_group_symop_operation_xyz') \
+            or cb.get('_symmetry_equiv_pos_as_xyz') or ['x,y,z']
+        symm_op_codes = tuple(c.replace(' ', '') for c in symm_op_codes)
+        return CachedStructure(cell=cell, table=atoms, symm_op_codes=symm_op_codes,
+                               cell_esd=cell_esd)
+
+    @_memoized
     def fract_xyz(self) -> np.ndarray:
         return np.vstack([self.table['fract_' + k].to_numpy() for k in 'xyz'])
 
-    @property
+    @_memoized
+    def fract_xyz_esd(self) -> np.ndarray:
+        """3xN standard uncertainties of `fract_xyz`, NaN if not known"""
+        t = self.table
+        default = pd.Series([np.nan] * len(t), index=t.index)
+        return np.vstack([t.get(k, default).to_numpy(dtype=np.float64)
+                          for k in FRACT_ESD_COLUMNS])
+
+    @_memoized
     def cart_xyz(self) -> np.ndarray:
         return self.orthogonalise(self.fract_xyz)
 
-    @property
+    @_memoized
     def fract_uij(self) -> np.ndarray:
         """Return a 3D array i.e. stack of 3x3 fract. displacement tensors."""
         t = self.table
@@ -135,18 +576,31 @@ class AtomSet(Shape):
 
     def fractionalise(self, cart_xyz: np.ndarray) -> np.ndarray:
         """Multiply 3xN vector by crystallographic matrix to get fract coord"""
-        return np.linalg.inv(self.base.A_d.T) @ cart_xyz
+        return self.cell_matrices.fractionalisation @ cart_xyz
 
     def orthogonalise(self, fract_xyz: np.ndarray) -> np.ndarray:
         """Multiply 3xN vector by crystallographic matrix to get Cart. coord"""
-        return self.base.A_d.T @ fract_xyz
+        return self.cell_matrices.orthogonalisation @ fract_xyz
 
     def locate(self, locators: Sequence[Locator]) -> 'AtomSet':
         """Convenience method to select multiple fragments from locators
         while interpreting and extending groups if necessary"""
-        logger.debug(f'Locate {locators} in {self}')
-        new = AtomSet()
+        logger.debug('Locate %s in %s', locators, self)
         assert len(locators) == 0 or isinstance(locators[0], Locator)
+        if (plan := self._plan(locators)) is None:
+            return self._locate_recursively(locators)
+        new = AtomSet()
+        for positions, symm_op_codes in plan:
+            new2 = self.take(positions)
+            logger.debug('Selected %d atoms using %s', len(positions), symm_op_codes)
+            for symm_op_code in symm_op_codes:
+                new2 = new2.transform(symm_op_code)
+            new += new2
+        return new
+
+    def _locate_recursively(self, locators: Sequence[Locator]) -> 'AtomSet':
+        """Locate fragments one-by-one; needed if any is recentered `at`"""
+        new = AtomSet()
         for label, symm_op_code, at in locators:
             if label in group_registry:
                 new2 = self.locate(locators=group_registry[label])
@@ -158,32 +612,82 @@ class AtomSet(Shape):
             new += new2
         return new
 
+    def _plan(self, locators: Sequence[Locator]) -> Optional[Plan]:
+        """Resolve locators into a (cached) `Plan` or None if impossible"""
+        if any(at for _, _, at in locators):
+            return None
+        key = (self.label_set_id, group_registry.version, tuple(locators))
+        if key not in _plan_cache:
+            _plan_cache[key] = self._resolve_plan(locators)
+        return _plan_cache[key]
+
+    def _resolve_plan(self, locators: Sequence[Locator]) -> Optional[Plan]:
+        plan = []
+        for label, symm_op_code, at in locators:
+            if at:
+                return None
+            if label in group_registry:
+                if (group_plan := self._resolve_plan(group_registry[label])) is None:
+                    return None
+                plan.extend((p, codes + (symm_op_code,)) for p, codes in group_plan)
+            else:
+                plan.append((self._match_positions(label), (symm_op_code,)))
+        return plan
+
+    def _match_positions(self, label_regex: str) -> np.ndarray:
+        """Positions of atoms with label equal to or matching `label_regex`"""
+        return self.label_index.match(label_regex)
+
+    def view(self) -> 'AtomSet':
+        """Return a new AtomSet sharing the table with self, without copy"""
+        new = self.__class__(self.base, self.table)
+        new.label_index = self.label_index
+        return new
+
+    def _with_columns(self, **columns: np.ndarray) -> pd.DataFrame:
+        """Shallow copy of the table where only given `columns` are replaced"""
+        data = self.table.copy(deep=False)
+        for name, values in columns.items():
+            data[name] = values
+        return data
+
+    def take(self, positions: np.ndarray) -> 'AtomSet':
+        """Return a new AtomSet with atoms at given integer positions"""
+        if len(positions) and positions[-1] - positions[0] == len(positions) - 1 \
+                and np.all(np.diff(positions) == 1):  # slice instead of copy
+            return self.__class__(self.base, self.table.iloc[
+                positions[0]:positions[-1] + 1])
+        return self.__class__(self.base, self.table.iloc[positions])
+
     def select_atom(self, label_regex: str) -> 'AtomSet':
-        mask = self.table.index == label_regex
-        if not any(mask):  # noqa: mask will in fact be Iterable
-            mask = self.table.index.str.match(label_regex)
-        logger.debug(f'Selected {sum(mask)} atoms with {label_regex=}')
-        return self.__class__(self.base, deepcopy(self.table[mask]))
+        positions = self._match_positions(label_regex)
+        logger.debug('Selected %d atoms with label_regex=%r',
+                     len(positions), label_regex)
+        return self.take(positions)
 
     def transform(self, symm_op_code: str) -> 'AtomSet':
-        symm_op = Operation.from_code(symm_op_code)
-        fract_xyz = symm_op.transform(self.fract_xyz.T)
-        data = deepcopy(self.table)
-        data['fract_x'] = fract_xyz[:, 0]
-        data['fract_y'] = fract_xyz[:, 1]
-        data['fract_z'] = fract_xyz[:, 2]
-        if {'U11', 'U22', 'U33', 'U12', 'U13', 'U23'}.issubset(data.columns):
+        logger.debug('Transform %d atoms using %s', len(self), symm_op_code)
+        symm_op = _parse_symm_op(symm_op_code)
+        if symm_op.is_identity:
+            return self.view()
+        fract_xyz = symm_op.tf @ self.fract_xyz + symm_op.tl[:, np.newaxis]
+        columns = dict(fract_x=fract_xyz[0], fract_y=fract_xyz[1],
+                       fract_z=fract_xyz[2])
+        if FRACT_ESD_COLUMNS[0] in self.table.columns:  # neglect correlation
+            esd = np.sqrt(symm_op.tf ** 2 @ self.fract_xyz_esd ** 2)
+            columns.update(zip(FRACT_ESD_COLUMNS, esd))
+        if {'U11', 'U22', 'U33', 'U12', 'U13', 'U23'}.issubset(self.table.columns):
             uij = self.fract_uij  # shape: (n_atoms, 3, 3)
             mask = ~np.isnan(uij).all(axis=(1, 2))  # atoms with defined Uij
             if np.any(mask):
-                uij_rot = (s := symm_op.tf) @ uij[mask] @ s.T
-                data.loc[mask, 'U11'] = uij_rot[:, 0, 0]
-                data.loc[mask, 'U22'] = uij_rot[:, 1, 1]
-                data.loc[mask, 'U33'] = uij_rot[:, 2, 2]
-                data.loc[mask, 'U12'] = uij_rot[:, 0, 1]
-                data.loc[mask, 'U13'] = uij_rot[:, 0, 2]
-                data.loc[mask, 'U23'] = uij_rot[:, 1, 2]
-        return self.__class__(self.base, data)
+                uij_rot = symm_op.tf @ uij[mask] @ symm_op.tf_t
+                for name, (i, j) in _UIJ_COMPONENTS.items():
+                    values = self.table[name].to_numpy(dtype=np.float64, copy=True)
+                    values[mask] = uij_rot[:, i, j]
+                    columns[name] = values
+        new = self.__class__(self.base, self._with_columns(**columns))
+        new.label_index = self.label_index
+        return new
 
     @property
     def u_cartesian_eigenvalues(self):
@@ -192,15 +696,15 @@ class AtomSet(Shape):
         if not set(u_columns).issubset(self.table.keys()):
             return eigenvalues
         u_fract = self.fract_uij  # Nx3n3 stack of abc-normalized U_cif tensors
-        a_mat = self.base.A_d.T  # fractional to orthogonal cartesian metric
-        n_mat = np.diag([self.base.a_r, self.base.b_r, self.base.c_r])
+        a_mat = self.cell_matrices.orthogonalisation  # fract. to cartesian
+        n_mat = np.diag(self.cell_matrices.reciprocal_lengths)
         u_star = (n_mat @ u_fract) @ n_mat  # eq. 4b @ S0021889802008580
         u_cart = (a_mat @ u_star) @ a_mat.T  # eq. 3a @ S0021889802008580
         mask = ~self.table[u_columns].isna().any(axis=1)
         eigenvalues[mask, :] = np.linalg.eigh(u_cart[mask, :, :])[0]
         return eigenvalues
 
-    @property
+    @_memoized
     def centroid(self) -> np.ndarray:
         """A 3-vector with average atom position."""
         return self.cart_xyz.T.mean(axis=0)
@@ -213,17 +717,17 @@ class AtomSet(Shape):
     def line(self) -> Line:
         """A 3-vector describing line that best fits the cartesian
         coordinates of atoms. Based on https://stackoverflow.com/q/2298390/"""
-        cart_xyz = self.cart_xyz.T
-        uu, dd, vv = np.linalg.svd(cart_xyz - self.centroid)
-        return Line(direction=vv[0], origin=self.centroid)
+        cart_xyz, centroid = self.cart_xyz.T, self.centroid
+        uu, dd, vv = np.linalg.svd(cart_xyz - centroid)
+        return Line(direction=vv[0], origin=centroid)
 
     @property
     def plane(self) -> Plane:
         """A 3-vector normal to plane that best fits atoms' cartesian coords.
         Based on https://gist.github.com/amroamroamro/1db8d69b4b65e8bc66a6"""
-        cart_xyz = self.cart_xyz.T
-        uu, dd, vv = np.linalg.svd((cart_xyz - self.centroid).T)
-        return Plane(direction=uu[:, -1], origin=self.centroid)
+        cart_xyz, centroid = self.cart_xyz.T, self.centroid
+        uu, dd, vv = np.linalg.svd((cart_xyz - centroid).T)
+        return Plane(direction=uu[:, -1], origin=centroid)
 
     @property
     def origin(self) -> Vector3:
@@ -234,9 +738,12 @@ class AtomSet(Shape):
         """Change origin to the new one provided in cartesian coordinates"""
         new_origin_fract = self.fractionalise(new_origin)
         delta = new_origin_fract - self.fractionalise(self.centroid)
-        self.table['fract_x'] += delta[0]
-        self.table['fract_y'] += delta[1]
-        self.table['fract_z'] += delta[2]
+        label_index = self.label_index
+        self.table = self._with_columns(  # private copy, shared table intact
+            fract_x=self.table['fract_x'].to_numpy() + delta[0],
+            fract_y=self.table['fract_y'].to_numpy() + delta[1],
+            fract_z=self.table['fract_z'].to_numpy() + delta[2])
+        self.label_index = label_index
         assert np.allclose(new_origin, self.centroid)
 
     def _angle(self, *others: 'Shape') -> float:
@@ -248,12 +755,7 @@ class AtomSet(Shape):
 
     def _distance(self, other: 'Shape') -> float:
         if other.kind is self.Kind.spatial:
-            # https://stackoverflow.com/a/43359192/8279065 bloody brilliant
-            other: 'AtomSet'
-            xy1, xy2 = self.cart_xyz.T, other.cart_xyz.T
-            p = np.add.outer(np.sum(xy1**2, axis=1), np.sum(xy2**2, axis=1))
-            n = np.dot(xy1, xy2.T)
-            return np.min(np.sqrt(p - 2 * n))
+            return self.closest_pair(other).distance
         elif other.kind is self.Kind.planar:
             deltas = self.cart_xyz.T - other.origin
             return min(np.abs(np.dot(deltas, other.direction)))
@@ -263,6 +765,16 @@ class AtomSet(Shape):
             along = np.abs(np.dot(deltas, other.direction))
             return min(norms ** 2 - along ** 2)
 
+    def closest_pair(self, other: 'AtomSet', memory_budget: int = None
+                     ) -> ClosestPair:
+        """Find the shortest distance between atoms of self and other,
+        using at most `memory_budget` bytes for temporary arrays"""
+        distance, i, j = _closest_positions(
+            self.cart_xyz.T, other.cart_xyz.T, memory_budget)
+        pair = ClosestPair(distance, self.table.index[i], other.table.index[j], i, j)
+        logger.debug('Closest pair of %d x %d atoms: %s', len(self), len(other), pair)
+        return pair
+
     def dihedral(self, *others: 'AtomSet') -> float:
         assert all(o.kind is o.Kind.spatial for o in [self, *others])
         combined = sum(others, self)
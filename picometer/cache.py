@@ -0,0 +1,192 @@
+"""
+Opt-in persistent caches of structures parsed from cif files
+and of results evaluated for them by incremental routine runs.
+Every `StructureCache` entry stores the unit cell parameters, symmetry
+operations, and the atom table of a single cif block, while every
+`ResultCache` entry stores a row of results for a single cif block.
+Entries are binary `.npz` files named after a hash of the cif path,
+its size, its modification time, the block name and, for results,
+a fingerprint of the routine. Changing a cif file automatically changes
+its key, so stale entries are never read; they can be safely removed
+by deleting the directory.
+"""
+
+from hashlib import sha1
+import logging
+import os
+from pathlib import Path
+import tempfile
+from typing import NamedTuple, Optional, Union
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_FORMAT_VERSION = 3
+
+
+def _file_key(cif_path: Union[str, Path], block_name: str = None,
+              fingerprint: str = '') -> str:
+    """Hash of cif path, size, modification time, block name & fingerprint"""
+    path = Path(cif_path).resolve()
+    stat = path.stat()
+    key = f'{CACHE_FORMAT_VERSION}|{path}|{stat.st_size}|' \
+          f'{stat.st_mtime_ns}|{block_name or ""}'
+    key += f'|{fingerprint}' if fingerprint else ''
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+def _load_npz(entry_path: Path) -> Optional[dict[str, np.ndarray]]:
+    """Read all arrays of an `.npz` file or None if it is missing or broken"""
+    try:
+        with np.load(entry_path, allow_pickle=False) as entry:
+            return {k: entry[k] for k in entry.files}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning('Ignoring unreadable cache entry %s: %s', entry_path, e)
+        return None
+
+
+def _save_npz(entry_path: Path, **arrays: np.ndarray) -> None:
+    """Atomically write `arrays` to an `.npz` file"""
+    entry_path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=entry_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            np.savez(temp_file, **arrays)
+        os.replace(temp_path, entry_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+class CachedStructure(NamedTuple):
+    cell: np.ndarray  # a, b, c, alpha, beta, gamma as read from the cif
+    table: pd.DataFrame  # atom table as constructed by `AtomSet.from_cif`
+    symm_op_codes: tuple[str, ...] = ('x,y,z', )  # space group operations
+    cell_esd: np.ndarray = np.zeros(6)  # standard uncertainties of `cell`
+
+
+class StructureCache:
+    """Store and retrieve `CachedStructure`s in `directory` as `.npz` files"""
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self.directory = Path(directory)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({str(self.directory)!r})'
+
+    def key(self, cif_path: Union[str, Path], block_name: str = None) -> str:
+        """Hash of cif path, size, modification time, and block name"""
+        return _file_key(cif_path, block_name)
+
+    def path(self, cif_path: Union[str, Path], block_name: str = None) -> Path:
+        return self.directory / (self.key(cif_path, block_name) + '.npz')
+
+    def get(self, cif_path: Union[str, Path], block_name: str = None
+            ) -> Optional[CachedStructure]:
+        """Return cached structure if available and up-to-date, else None"""
+        entry_path = self.path(cif_path, block_name)
+        if (entry := _load_npz(entry_path)) is None:
+            return None
+        try:
+            cell, labels = entry['cell'], entry['labels']
+            columns, values = entry['columns'], entry['values']
+            symm_op_codes = tuple(entry['symm_op_codes'].tolist())
+            cell_esd = entry['cell_esd']
+        except KeyError as e:
+            logger.warning('Ignoring unreadable cache entry %s: %s', entry_path, e)
+            return None
+        if len(columns):
+            table = pd.DataFrame(values, index=pd.Index(labels, dtype=str),
+                                 columns=pd.Index(columns, dtype=str))
+        else:
+            table = pd.DataFrame()
+        logger.debug('Read %s:%s from %s', cif_path, block_name or '', entry_path)
+        return CachedStructure(cell=cell, table=table, symm_op_codes=symm_op_codes,
+                               cell_esd=cell_esd)
+
+    def put(self, cif_path: Union[str, Path], block_name: str,
+            structure: CachedStructure) -> None:
+        """Atomically write a structure entry to the cache directory"""
+        entry_path = self.path(cif_path, block_name)
+        table = structure.table
+        _save_npz(entry_path,
+                  cell=np.asarray(structure.cell, dtype=np.float64),
+                  labels=np.array(table.index, dtype=str),
+                  columns=np.array(table.columns, dtype=str),
+                  values=table.to_numpy(dtype=np.float64),
+                  symm_op_codes=np.array(structure.symm_op_codes, dtype=str),
+                  cell_esd=np.asarray(structure.cell_esd, dtype=np.float64))
+        logger.debug('Cached %s:%s in %s', cif_path, block_name or '', entry_path)
+
+
+class CachedResult(NamedTuple):
+    columns: list[str]  # names of evaluation table columns in record order
+    values: np.ndarray  # values recorded in subsequent columns
+    offsets: np.ndarray  # instruction indices relative to first non-load one
+    contacts: Optional[pd.DataFrame]  # contacts table, if any was found
+
+
+class ResultCache:
+    """Store and retrieve `CachedResult`s in `directory` as `.npz` files"""
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self.directory = Path(directory)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({str(self.directory)!r})'
+
+    def path(self, fingerprint: str, cif_path: Union[str, Path],
+             block_name: str = None) -> Path:
+        return self.directory / (_file_key(cif_path, block_name, fingerprint) + '.npz')
+
+    def get(self, fingerprint: str, cif_path: Union[str, Path],
+            block_name: str = None) -> Optional[CachedResult]:
+        """Return results cached for routine `fingerprint` and cif, or None"""
+        entry_path = self.path(fingerprint, cif_path, block_name)
+        if (entry := _load_npz(entry_path)) is None:
+            return None
+        try:
+            contacts = None
+            if entry['has_contacts']:
+                contacts = pd.DataFrame({
+                    'label1': pd.Series(entry['contacts_label1'], dtype=str),
+                    'label2': pd.Series(entry['contacts_label2'], dtype=str),
+                    'symm': pd.Series(entry['contacts_symm'], dtype=str),
+                    'distance': entry['contacts_distance']})
+            result = CachedResult(columns=entry['columns'].tolist(),
+                                  values=entry['values'],
+                                  offsets=entry['offsets'],
+                                  contacts=contacts)
+        except KeyError as e:
+            logger.warning('Ignoring unreadable cache entry %s: %s', entry_path, e)
+            return None
+        logger.debug('Read results for %s:%s from %s',
+                     cif_path, block_name or '', entry_path)
+        return result
+
+    def put(self, fingerprint: str, cif_path: Union[str, Path], block_name: str,
+            result: CachedResult) -> None:
+        """Atomically write a result entry to the cache directory"""
+        entry_path = self.path(fingerprint, cif_path, block_name)
+        contacts = result.contacts
+        has_contacts = contacts is not None
+        if contacts is None:
+            contacts = pd.DataFrame(columns=['label1', 'label2', 'symm', 'distance'])
+        _save_npz(entry_path,
+                  columns=np.array(result.columns, dtype=str),
+                  values=np.asarray(result.values, dtype=np.float64),
+                  offsets=np.asarray(result.offsets, dtype=np.int64),
+                  has_contacts=np.array(has_contacts),
+                  contacts_label1=np.array(contacts['label1'], dtype=str),
+                  contacts_label2=np.array(contacts['label2'], dtype=str),
+                  contacts_symm=np.array(contacts['symm'], dtype=str),
+                  contacts_distance=np.array(contacts['distance'], dtype=np.float64))
+        logger.debug('Cached results for %s:%s in %s',
+                     cif_path, block_name or '', entry_path)
@@ -0,0 +1,73 @@
+"""
+Checkpoints of `Processor` state, which allow long routines interrupted
+e.g. by running out of memory to be resumed from the last checkpoint.
+A checkpoint stores model states, selection, groups, settings, results,
+and the history of processed instructions in a single pickled file.
+Loaded structures are stored as arrays, so they are not re-parsed on resume.
+Checkpoints are written atomically: an interrupted write leaves
+the previous checkpoint intact.
+"""
+
+import logging
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import NamedTuple, Union
+
+import pandas as pd
+
+from picometer.atom import Locator
+from picometer.instructions import Routine
+from picometer.models import ModelStates
+from picometer.results import ResultStore
+
+
+logger = logging.getLogger(__name__)
+
+
+CHECKPOINT_FORMAT_VERSION = 2
+
+
+class CheckpointError(ValueError):
+    """Raised when a checkpoint can not be used to resume a routine"""
+
+
+class Checkpoint(NamedTuple):
+    version: int
+    history: Routine
+    model_states: ModelStates
+    selection: list[Locator]
+    groups: dict[str, list[Locator]]
+    settings: dict
+    results: ResultStore
+    contacts: dict[str, pd.DataFrame]
+    streamed: int = 0  # structures of the streamed segment processed so far
+
+
+def write_checkpoint(path: Union[str, Path], checkpoint: Checkpoint) -> None:
+    """Atomically pickle `checkpoint` to `path`"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            pickle.dump(checkpoint, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    logger.info('Saved checkpoint after %d instructions to %s',
+                len(checkpoint.history), path)
+
+
+def read_checkpoint(path: Union[str, Path]) -> Checkpoint:
+    """Read a checkpoint written by `write_checkpoint`; trusted files only"""
+    with open(path, 'rb') as checkpoint_file:
+        checkpoint = pickle.load(checkpoint_file)
+    if not isinstance(checkpoint, Checkpoint) \
+            or checkpoint.version != CHECKPOINT_FORMAT_VERSION:
+        raise CheckpointError(f'{path} is not a compatible picometer checkpoint')
+    logger.info('Read checkpoint after %d instructions from %s',
+                len(checkpoint.history), path)
+    return checkpoint
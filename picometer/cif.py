@@ -0,0 +1,166 @@
+"""
+Lightweight reader of cif files, which extracts only the data items picometer
+needs: unit cell parameters, atom sites, and symmetry operations.
+Files are memory-mapped and scanned once for lines that start data blocks,
+loops, data items, and text fields. Values are then tokenized only for
+the requested data names: other loops and items, including embedded hkl
+or fcf data, are skipped without ever being materialized. Syntax this reader
+does not handle raises a `CifError`, so that `AtomSet.from_cif` can fall back
+to the complete cif parser of hikari.
+"""
+
+import itertools
+import mmap
+from pathlib import Path
+import re
+from typing import NamedTuple, Optional, Sequence, Union
+
+
+CifValue = Union[str, list[str]]
+CifBlock = dict[str, CifValue]  # data name: value or list of loop values
+
+PICOMETER_DATA_NAMES = ('_cell_', '_atom_site_', '_space_group_symop_',
+                        '_symmetry_equiv_')  # prefixes of data names read
+
+_LINE = rb'(?:(?P<text>;)|[ \t]*(?:data_(?P<data>\S*)|(?P<loop>loop_)(?=\s)' \
+    rb'|(?P<tag>_\S+)))'
+_FIRST_MARKER = re.compile(_LINE, re.IGNORECASE)
+_MARKER = re.compile(rb'\n' + _LINE, re.IGNORECASE)  # literal prefix: fast search
+_TOKEN = re.compile(rb"""
+    ^;(?P<text>(?s:.*?))\r?\n;     # text field, delimited by lines starting with ;
+    | '(?P<single>.*?)'(?=\s|$)    # single-quoted string
+    | "(?P<double>.*?)"(?=\s|$)    # double-quoted string
+    | \#.*                         # comment
+    | (?P<bare>\S+)
+    """, re.MULTILINE | re.VERBOSE)
+_BLANK = re.compile(rb'(?:\s+|#.*)*')
+
+
+class CifError(ValueError):
+    """Raised when a cif file can not be read by the `CifReader`"""
+
+
+class _Marker(NamedTuple):
+    """Line starting a data block, loop, or data item, found by `_MARKER`"""
+    kind: str  # 'data', 'loop' or 'tag'
+    start: int
+    end: int
+    name: str = ''
+
+
+class CifReader:
+    """
+    Memory-mapped cif file, scanned for markers of blocks, loops, and
+    data items once on initialization. Individual blocks can be then read
+    with `block`, which tokenizes values of selected data names only.
+    Use as a context manager to release the file after reading.
+    """
+
+    def __init__(self, cif_path: Union[str, Path]) -> None:
+        self.cif_path = cif_path
+        self._file = open(cif_path, 'rb')
+        try:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:  # raised for empty files
+            self._file.close()
+            raise CifError(f'Can not memory-map {cif_path}: {e}') from e
+        try:
+            if self._buffer[:10] == b'#\\#CIF_2.0':
+                raise CifError(f'{cif_path} uses unsupported CIF 2.0 syntax')
+            self._markers = self._scan()
+        except CifError:
+            self.close()
+            raise
+        self._blocks: dict[str, int] = {}  # block name: index of its marker
+        for index, marker in enumerate(self._markers):
+            if marker.kind == 'data':
+                self._blocks.setdefault(marker.name, index)
+
+    def __enter__(self) -> 'CifReader':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._buffer.close()
+        self._file.close()
+
+    @property
+    def block_names(self) -> list[str]:
+        """Names of all data blocks in the order of appearance"""
+        return list(self._blocks)
+
+    def _scan(self) -> list[_Marker]:
+        """Find markers outside text fields in a single regex pass"""
+        markers, in_text = [], False
+        first = _FIRST_MARKER.match(self._buffer)
+        for match in itertools.chain([first] if first else [],
+                                     _MARKER.finditer(self._buffer)):
+            kind = match.lastgroup
+            if kind == 'text':
+                in_text = not in_text
+            elif not in_text:
+                markers.append(_Marker(kind, match.start(), match.end(),
+                                       match.group(kind).decode('utf-8', 'replace')))
+        if in_text:
+            raise CifError(f'Unterminated text field in {self.cif_path}')
+        return markers
+
+    def _tokens(self, start: int, end: int) -> list[str]:
+        """Values between `start` and `end` of the buffer"""
+        try:
+            return [match.group(match.lastgroup).decode('utf-8') for match
+                    in _TOKEN.finditer(self._buffer, start, end) if match.lastgroup]
+        except UnicodeDecodeError as e:
+            raise CifError(f'Can not decode values in {self.cif_path}: {e}') from e
+
+    def _is_blank(self, start: int, end: int) -> bool:
+        return _BLANK.match(self._buffer, start, end).end() == end
+
+    def block(self, block_name: Optional[str] = None,
+              prefixes: Sequence[str] = PICOMETER_DATA_NAMES) -> CifBlock:
+        """Read items of `block_name` (by default first block) whose names
+        start with one of lower-case `prefixes`; loop values are read as lists"""
+        if not self._blocks:
+            raise CifError(f'No data blocks found in {self.cif_path}')
+        block_name = block_name if block_name else self.block_names[0]
+        if (first := self._blocks.get(block_name)) is None:
+            lower_names = {name.lower(): i for name, i in self._blocks.items()}
+            if (first := lower_names.get(block_name.lower())) is None:
+                raise CifError(f'Block {block_name} not found in {self.cif_path}')
+        last = next((i for i in range(first + 1, len(self._markers))
+                     if self._markers[i].kind == 'data'), len(self._markers))
+        markers = self._markers[first + 1:last]
+        block_end = self._markers[last].start if last < len(self._markers) \
+            else len(self._buffer)
+        prefixes = tuple(prefixes)
+        block: CifBlock = {}
+        i = 0
+        while i < len(markers):
+            marker = markers[i]
+            if marker.kind == 'loop':
+                j = i + 1
+                while j < len(markers) and markers[j].kind == 'tag' \
+                        and self._is_blank(markers[j - 1].end, markers[j].start):
+                    j += 1
+                names = [m.name for m in markers[i + 1:j]]
+                if any(name.lower().startswith(prefixes) for name in names):
+                    end = markers[j].start if j < len(markers) else block_end
+                    values = self._tokens(markers[j - 1].end, end)
+                    if len(values) % len(names):
+                        raise CifError(f'Loop of {names[0]} in {self.cif_path} has '
+                                       f'{len(values)} values for {len(names)} names')
+                    for k, name in enumerate(names):
+                        block[name] = values[k::len(names)]
+                i = j
+                continue
+            if marker.name.lower().startswith(prefixes):
+                end = markers[i + 1].start if i + 1 < len(markers) else block_end
+                values = self._tokens(marker.end, end)
+                if len(values) != 1:
+                    raise CifError(f'Item {marker.name} in {self.cif_path} has '
+                                   f'{len(values)} values instead of one')
+                block[marker.name] = values[0]
+            i += 1
+        return block
@@ -0,0 +1,191 @@
+"""
+Optimizing compiler of `Routine`s. Instructions of every routine segment
+(separated by `clear`) are split into blocks, each comprising a sequence
+of selections and the single instruction that consumes them. Every block
+is linked to blocks defining groups, centroids, and shapes it reads,
+forming a dependency graph. The graph is then used to:
+- drop re-fits of lines and planes identical to their current definition;
+- drop centroids, lines, and planes whose results are never read.
+Measurements, groups and other instructions are always kept, so that
+the compiled routine produces the same evaluation table as the original.
+"""
+
+import logging
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from picometer.atom import Locator
+from picometer.instructions import Instruction, Routine
+from picometer.settings import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+SELECTIONS = {'select', 'recenter'}
+FITS = {'centroid', 'line', 'plane'}
+CONSUMERS = FITS | {'group', 'coordinates', 'displacement', 'distance',
+                    'angle', 'dihedral', 'contacts'}
+
+
+class Block(NamedTuple):
+    """Instructions consumed together; `positions` index the routine"""
+    positions: list[int]
+    instructions: list[Instruction]
+
+    @property
+    def consumer(self) -> Instruction:
+        return self.instructions[-1]
+
+    @property
+    def label(self) -> Optional[str]:
+        """Label of a group, centroid, or shape defined by this block"""
+        if self.consumer.keyword in FITS | {'group'}:
+            return self.consumer.kwargs['label']
+        return None
+
+    @property
+    def locators(self) -> list[Locator]:
+        """All locators read by selections in this block, including `at`"""
+        locators = []
+        for instruction in self.instructions[:-1]:
+            if (locator := Locator.from_dict(instruction.kwargs)).label:
+                locators.extend(_flatten(locator))
+        return locators
+
+    def same_as(self, other: 'Block') -> bool:
+        return [i.as_dict() for i in self.instructions] == \
+            [i.as_dict() for i in other.instructions]
+
+
+def _flatten(locator: Locator) -> Iterable[Locator]:
+    yield locator
+    at = locator.at
+    for at_locator in [at] if isinstance(at, Locator) else at or []:
+        yield from _flatten(at_locator)
+
+
+def _matches(label_regex: str, label: str) -> bool:
+    """Whether a centroid `label` could be selected by `label_regex`"""
+    try:
+        return label_regex == label or bool(re.match(label_regex, label))
+    except re.error:
+        return True
+
+
+def _split_segments(routine: Routine) -> list[list[int]]:
+    segments = [[]]
+    for position, instruction in enumerate(routine):
+        if instruction.keyword == 'clear' and segments[-1]:
+            segments.append([])
+        segments[-1].append(position)
+    return segments
+
+
+def _blocks(routine: Routine, positions: list[int]) -> list[Block]:
+    """Split positions of a segment into consumer blocks, skip the rest"""
+    blocks, pending = [], []
+    for position in positions:
+        keyword = routine[position].keyword
+        if keyword in SELECTIONS:
+            pending.append(position)
+        elif keyword in CONSUMERS:
+            pending.append(position)
+            blocks.append(Block(pending, [routine[p] for p in pending]))
+            pending = []
+    return blocks
+
+
+class _Definitions:
+    """Definitions of groups, centroids, and shapes preceding a block"""
+    def __init__(self) -> None:
+        self.groups: dict[str, Block] = {}
+        self.shapes: dict[str, Block] = {}
+        self.centroids: list[Block] = []
+
+    def define(self, block: Block) -> None:
+        keyword = block.consumer.keyword
+        if keyword == 'group':
+            self.groups[block.label] = block
+        elif keyword == 'centroid':
+            self.centroids.append(block)
+        elif keyword in FITS:
+            self.shapes[block.label] = block
+
+    def read_by(self, block: Block) -> list[Block]:
+        """Blocks whose definitions can be read by `block`"""
+        read, seen, queue = [], set(), list(block.locators)
+        while queue:
+            label = queue.pop().label
+            if label in seen:
+                continue
+            seen.add(label)
+            if group := self.groups.get(label):
+                read.append(group)
+                queue.extend(group.locators)
+            if shape := self.shapes.get(label):
+                read.append(shape)
+            read.extend(c for c in self.centroids if _matches(label, c.label))
+        return read
+
+
+def compile_routine(routine: Routine, settings: Settings = None) -> Routine:
+    """Return a routine producing the same results as input in less work
+    when processed with initial `settings`, by default the packaged ones"""
+    initial = Settings.from_yaml()
+    initial.update(settings or {})
+    if not initial['clear_selection_after_use']:
+        logger.info('Selection is not cleared after use, routine not compiled')
+        return routine
+    for instruction in routine:
+        if instruction.keyword == 'set' and isinstance(instruction.raw_kwargs, dict) \
+                and not instruction.raw_kwargs.get('clear_selection_after_use', True):
+            logger.info('Routine does not clear selection after use, not compiled')
+            return routine
+    dropped = set()
+    for segment in _split_segments(routine):
+        blocks = _blocks(routine, segment)
+        loads = [p for p in segment if routine[p].keyword == 'load']
+        definitions = _Definitions()
+        reads: dict[int, list[Block]] = {}
+        for i, block in enumerate(blocks):
+            current = definitions.shapes.get(block.label)
+            if block.consumer.keyword in {'line', 'plane'} and current \
+                    and current.same_as(block) \
+                    and not any(current.positions[-1] < p < block.positions[-1]
+                                for p in loads) \
+                    and not _redefined_between(blocks, current, block, definitions):
+                dropped.update(block.positions)
+                logger.debug('Dropped re-fit of %s', block.label)
+                continue
+            reads[i] = definitions.read_by(block)
+            definitions.define(block)
+        index = {id(block): i for i, block in enumerate(blocks)}
+        live = set()
+        for i in reversed(range(len(blocks))):
+            if i not in reads:
+                continue
+            if blocks[i].consumer.keyword in FITS and i not in live:
+                dropped.update(blocks[i].positions)
+                logger.debug('Dropped unused %s', blocks[i].consumer)
+                continue
+            live.update(index[id(b)] for b in reads[i])
+    compiled = Routine(i for p, i in enumerate(routine) if p not in dropped)
+    logger.info('Compiled routine of %d instructions into %d instructions',
+                len(routine), len(compiled))
+    return compiled
+
+
+def _redefined_between(blocks: list[Block], first: Block, second: Block,
+                       definitions: _Definitions) -> bool:
+    """Whether definitions read by `second` could change since `first`"""
+    read_labels = {b.label for b in definitions.read_by(second)}
+    between = [b for b in blocks
+               if first.positions[-1] < b.positions[-1] < second.positions[0]]
+    for block in between:
+        if block.label in read_labels:
+            return True
+        if block.consumer.keyword == 'centroid' and any(
+                _matches(loc.label, block.label) for loc in second.locators):
+            return True
+    return False
@@ -0,0 +1,128 @@
+"""
+Periodic search for interatomic contacts shorter than a given cutoff.
+Images of the selection are generated using every symmetry operation
+of the space group and the lattice translations needed to cover a box
+around the selection, extended by the cutoff in every direction.
+Pairs are then found using a cell list in a single vectorized pass,
+so the time needed scales linearly rather than quadratically with
+the number of atoms in the selection.
+"""
+
+import itertools
+import logging
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from picometer.atom import AtomSet, _operation_type, _parse_symm_op
+
+
+logger = logging.getLogger(__name__)
+
+
+COINCIDENCE_TOLERANCE = 0.01  # images closer than this are the same atom
+
+
+def neighbour_pairs(xyz1: np.ndarray, xyz2: np.ndarray, cutoff: float
+                    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Positions in (N, 3) `xyz1` and (K, 3) `xyz2` and distances of all pairs
+    of points not further than `cutoff` apart, found using a cell list:
+    points of `xyz2` are binned in cubic cells with edge equal to `cutoff`,
+    and every point of `xyz1` is compared only with 27 neighbouring cells.
+    """
+    empty = np.array([], dtype=np.intp)
+    if not len(xyz1) or not len(xyz2):
+        return empty, empty, np.array([], dtype=np.float64)
+    origin = np.minimum(xyz1.min(axis=0), xyz2.min(axis=0))
+    cells1 = np.floor((xyz1 - origin) / cutoff).astype(np.int64) + 1
+    cells2 = np.floor((xyz2 - origin) / cutoff).astype(np.int64) + 1
+    shape = np.maximum(cells1.max(axis=0), cells2.max(axis=0)) + 2
+    strides = np.array([shape[1] * shape[2], shape[2], 1])
+    order = np.argsort(cells2 @ strides, kind='stable')
+    sorted_cells2 = (cells2 @ strides)[order]
+    pairs_i, pairs_j = [], []
+    for offset in itertools.product([-1, 0, 1], repeat=3):
+        targets = (cells1 + offset) @ strides
+        starts = np.searchsorted(sorted_cells2, targets, side='left')
+        counts = np.searchsorted(sorted_cells2, targets, side='right') - starts
+        i = np.repeat(np.arange(len(xyz1)), counts)
+        first = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        pairs_i.append(i)
+        pairs_j.append(order[np.arange(len(i)) + first])
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    distances = np.sqrt(np.sum((xyz1[i] - xyz2[j]) ** 2, axis=1))
+    close = distances <= cutoff
+    return i[close], j[close], distances[close]
+
+
+def _images(atoms: AtomSet, cutoff: float, symm_op_codes: Sequence[str]
+            ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fractional coordinates of symmetry- and lattice-translated images
+    of `atoms` within `cutoff` from the box bounding `atoms`, followed by
+    their atom positions, symmetry operation indices, and translations.
+    """
+    fract_xyz = atoms.fract_xyz
+    margin = cutoff * atoms.cell_matrices.reciprocal_lengths
+    low = fract_xyz.min(axis=1) - margin
+    high = fract_xyz.max(axis=1) + margin
+    translations = np.array(list(itertools.product(*[
+        range(int(np.floor(lo)), int(np.floor(hi)) + 1)
+        for lo, hi in zip(low, high)])), dtype=np.float64)  # (T, 3)
+    images, positions, operations, shifts = [], [], [], []
+    for op_index, symm_op_code in enumerate(symm_op_codes):
+        symm_op = _parse_symm_op(symm_op_code)
+        transformed = symm_op.tf @ fract_xyz + symm_op.tl[:, np.newaxis]
+        wrap = np.floor(transformed)
+        candidates = (transformed - wrap)[np.newaxis] + translations[:, :, np.newaxis]
+        inside = np.all((candidates >= low[:, np.newaxis])
+                        & (candidates <= high[:, np.newaxis]), axis=1)  # (T, N)
+        t, n = np.nonzero(inside)
+        images.append(candidates[t, :, n])
+        positions.append(n)
+        operations.append(np.full(len(n), op_index))
+        shifts.append(translations[t] - wrap[:, n].T)
+    return (np.concatenate(images), np.concatenate(positions),
+            np.concatenate(operations), np.concatenate(shifts))
+
+
+def find_contacts(atoms: AtomSet,
+                  cutoff: float,
+                  symm_op_codes: Sequence[str] = ('x,y,z', ),
+                  ) -> pd.DataFrame:
+    """
+    Find all contacts between `atoms` and their images not longer than
+    `cutoff`. Return a long-format table with labels of both atoms,
+    symmetry code generating the second atom, and their distance.
+    Contacts within the selection are listed once; coincident images
+    of atoms at special positions are ignored.
+    """
+    columns = ['label1', 'label2', 'symm', 'distance']
+    if not len(atoms):
+        return pd.DataFrame(columns=columns)
+    images, positions, operations, shifts = _images(atoms, cutoff, symm_op_codes)
+    cart_images = atoms.orthogonalise(images.T).T
+    i, k, distances = neighbour_pairs(atoms.cart_xyz.T, cart_images, cutoff)
+    j, op, shift = positions[k], operations[k], shifts[k]
+    identity = np.array([_parse_symm_op(c).is_identity for c in symm_op_codes])
+    within = identity[op] & ~np.any(shift, axis=1)
+    keep = (distances > COINCIDENCE_TOLERANCE) & ~(within & (i >= j))
+    i, j, op = i[keep], j[keep], op[keep]
+    shift, distances = shift[keep], distances[keep]
+    codes, operation_type = {}, _operation_type()
+    for key in set(zip(op.tolist(), map(tuple, shift.tolist()))):
+        symm_op = _parse_symm_op(symm_op_codes[key[0]])
+        codes[key] = operation_type(symm_op.tf, symm_op.tl + np.array(key[1])).code
+    order = np.lexsort((distances, i))
+    labels = atoms.table.index
+    contacts = pd.DataFrame({
+        'label1': labels[i[order]],
+        'label2': labels[j[order]],
+        'symm': [codes[(o, tuple(s))] for o, s
+                 in zip(op[order].tolist(), shift[order].tolist())],
+        'distance': distances[order]}, columns=columns)
+    logger.debug('Found %d contacts shorter than %s between %d atoms and %d images',
+                 len(contacts), cutoff, len(atoms), len(images))
+    return contacts
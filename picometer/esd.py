@@ -0,0 +1,199 @@
+"""
+Propagation of standard uncertainties (esds) of fractional coordinates
+and unit cell parameters onto measured values. Every measurement provides
+analytic gradients of its value with respect to Cartesian coordinates
+of the atoms involved, which are then chained through the orthogonalisation
+matrix onto fractional coordinates and cell parameters. All functions accept
+stacks of `M` model states, so that a single NumPy call evaluates them all.
+
+Since cif files do not list correlations, esds of individual coordinates
+and cell parameters are treated as independent. Centroids, lines, and planes
+are treated as independent of the atoms they were defined with, and esds
+of lines and planes include coordinate, but not unit cell, uncertainties.
+"""
+
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from picometer.atom import AtomSet
+
+
+COMPLEX_STEP = 1e-20  # complex-step differentiation is exact for such steps
+
+
+class StackInputs(NamedTuple):
+    """Coordinates and cell of `M` model states with `N` atoms selected"""
+    fract: np.ndarray  # (M, N, 3) fractional coordinates
+    fract_esd: np.ndarray  # (M, N, 3) their standard uncertainties
+    cell: np.ndarray  # (M, 6) a, b, c, alpha, beta, gamma in Å and degrees
+    cell_esd: np.ndarray  # (M, 6) their standard uncertainties
+
+    @classmethod
+    def from_shapes(cls, shapes: Sequence[Sequence[AtomSet]],
+                    cell_esds: Sequence[Optional[np.ndarray]]) -> 'StackInputs':
+        """Gather inputs of equally-sized atom sets, concatenated in order"""
+        fract = np.stack([np.concatenate([s.fract_xyz.T for s in ms_shapes])
+                          for ms_shapes in shapes])
+        fract_esd = np.stack([np.concatenate([s.fract_xyz_esd.T for s in ms_shapes])
+                              for ms_shapes in shapes])
+        cell = np.array([[b.a_d, b.b_d, b.c_d, *np.rad2deg([b.al_d, b.be_d, b.ga_d])]
+                         for b in (ms_shapes[0].base for ms_shapes in shapes)])
+        cell_esd = np.array([np.zeros(6) if e is None else e for e in cell_esds])
+        return cls(fract, fract_esd, cell, cell_esd)
+
+    def take(self, positions: np.ndarray) -> 'StackInputs':
+        """Inputs for atoms at (M, K) `positions` in every model state"""
+        rows = np.arange(len(self.fract))[:, np.newaxis]
+        return self._replace(fract=self.fract[rows, positions],
+                             fract_esd=self.fract_esd[rows, positions])
+
+    @property
+    def cart(self) -> np.ndarray:
+        """(M, N, 3) Cartesian coordinates of atoms"""
+        return self.fract @ np.swapaxes(orthogonalisation(self.cell), 1, 2)
+
+    @property
+    def cart_covariances(self) -> np.ndarray:
+        """(M, N, 3, 3) Cartesian covariance matrices of atom positions"""
+        orth = orthogonalisation(self.cell)[:, np.newaxis]
+        return (orth * self.fract_esd[:, :, np.newaxis, :] ** 2) \
+            @ np.swapaxes(orth, 2, 3)
+
+
+def orthogonalisation(cell: np.ndarray) -> np.ndarray:
+    """(..., 3, 3) matrices with cell vectors as columns, like `BaseFrame.A_d.T`,
+    for (..., 6) `cell`; written to allow complex-step differentiation"""
+    a, b, c = cell[..., 0], cell[..., 1], cell[..., 2]
+    ca, cb, cg = np.moveaxis(np.cos(cell[..., 3:] * (np.pi / 180)), -1, 0)
+    sg = np.sin(cell[..., 5] * (np.pi / 180))
+    matrix = np.zeros(cell.shape[:-1] + (3, 3), dtype=cell.dtype)
+    matrix[..., 0, 0] = a
+    matrix[..., 0, 1] = b * cg
+    matrix[..., 1, 1] = b * sg
+    matrix[..., 0, 2] = c * cb
+    matrix[..., 1, 2] = c * (ca - cb * cg) / sg
+    matrix[..., 2, 2] = c * np.sqrt(1 - ca ** 2 - cb ** 2 - cg ** 2
+                                    + 2 * ca * cb * cg) / sg
+    return matrix
+
+
+def orthogonalisation_derivatives(cell: np.ndarray) -> np.ndarray:
+    """(..., 6, 3, 3) derivatives of `orthogonalisation` over cell parameters"""
+    steps = np.eye(6) * (1j * COMPLEX_STEP)
+    return orthogonalisation(cell[..., np.newaxis, :] + steps).imag / COMPLEX_STEP
+
+
+def propagate(gradients: np.ndarray, inputs: StackInputs) -> np.ndarray:
+    """(M, ) esds of values with (M, N, 3) Cartesian `gradients` w.r.t. atoms"""
+    d_fract = gradients @ orthogonalisation(inputs.cell)
+    d_cell = np.einsum('mni,mkij,mnj->mk', gradients,
+                       orthogonalisation_derivatives(inputs.cell), inputs.fract)
+    variance = np.sum((d_fract * inputs.fract_esd) ** 2, axis=(1, 2)) \
+        + np.sum((d_cell * inputs.cell_esd) ** 2, axis=1)
+    return np.sqrt(variance)
+
+
+def _norm(v: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.sum(v * v, axis=-1, keepdims=True))
+
+
+def _vector_angle_gradients(u: np.ndarray, v: np.ndarray
+                            ) -> tuple[np.ndarray, np.ndarray]:
+    """Gradients, in radians, of angles between (M, 3) vectors `u` and `v`"""
+    u_norm, v_norm = _norm(u), _norm(v)
+    u_unit, v_unit = u / u_norm, v / v_norm
+    cos = np.sum(u_unit * v_unit, axis=-1, keepdims=True)
+    sin = np.sqrt(np.clip(1 - cos ** 2, 0, None))
+    return (cos * u_unit - v_unit) / (u_norm * sin), \
+        (cos * v_unit - u_unit) / (v_norm * sin)
+
+
+def distance_gradients(xyz: np.ndarray) -> np.ndarray:
+    """(M, 2, 3) gradients of distances between (M, 2, 3) atom pairs"""
+    delta = xyz[:, 0] - xyz[:, 1]
+    unit = delta / _norm(delta)
+    return np.stack([unit, -unit], axis=1)
+
+
+def angle_gradients(xyz: np.ndarray) -> np.ndarray:
+    """(M, 3, 3) gradients of angles, in degrees, at middle of (M, 3, 3) atoms"""
+    du, dv = _vector_angle_gradients(xyz[:, 0] - xyz[:, 1], xyz[:, 2] - xyz[:, 1])
+    return np.rad2deg(np.stack([du, -du - dv, dv], axis=1))
+
+
+def dihedral_gradients(xyz: np.ndarray) -> np.ndarray:
+    """(M, 4, 3) gradients of dihedral angles, in degrees, of (M, 4, 3) atoms.
+    Based on Blondel & Karplus, J. Comput. Chem. 17, 1132–1141 (1996)"""
+    b1, b2, b3 = xyz[:, 1] - xyz[:, 0], xyz[:, 2] - xyz[:, 1], xyz[:, 3] - xyz[:, 2]
+    n1, n2 = np.cross(b1, b2), np.cross(b2, b3)
+    b2_norm = _norm(b2)
+    g0 = -b2_norm * n1 / _norm(n1) ** 2
+    g3 = b2_norm * n2 / _norm(n2) ** 2
+    p = -np.sum(b1 * b2, axis=-1, keepdims=True) / b2_norm ** 2
+    q = -np.sum(b3 * b2, axis=-1, keepdims=True) / b2_norm ** 2
+    g1 = (p - 1) * g0 - q * g3
+    g2 = (q - 1) * g3 - p * g0
+    return np.rad2deg(np.stack([g0, g1, g2, g3], axis=1))
+
+
+def centroid_esds(fract_esd: np.ndarray) -> np.ndarray:
+    """(M, 3) esds of fractional coordinates of centroids of (M, N, 3) atoms"""
+    return np.sqrt(np.sum(fract_esd ** 2, axis=1)) / fract_esd.shape[1]
+
+
+def fit_covariances(xyz: np.ndarray, covariances: np.ndarray, normal: bool
+                    ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (M, 3, 3) covariances of directions and of origins of lines (or planes,
+    if `normal`) best fit to (M, N, 3) Cartesian atom positions `xyz`
+    with (M, N, 3, 3) Cartesian `covariances`. Direction is an eigenvector
+    of the scatter matrix; its derivatives follow from perturbation theory.
+    Covariances of directions of degenerate fits are NaN.
+    """
+    deltas = xyz - xyz.mean(axis=1, keepdims=True)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.swapaxes(deltas, 1, 2) @ deltas)
+    k = 0 if normal else 2
+    direction = eigenvectors[:, :, k]  # (M, 3)
+    along = np.sum(deltas * direction[:, np.newaxis], axis=-1)  # (M, N)
+    jacobians = np.zeros(deltas.shape + (3, ))  # (M, N, 3, 3): d direction / d xyz
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for other in {0, 1, 2} - {k}:
+            u = eigenvectors[:, :, other]  # (M, 3)
+            across = np.sum(deltas * u[:, np.newaxis], axis=-1)  # (M, N)
+            gap = (eigenvalues[:, k] - eigenvalues[:, other])[:, np.newaxis, np.newaxis]
+            jacobians += u[:, np.newaxis, :, np.newaxis] * (
+                along[..., np.newaxis, np.newaxis] * u[:, np.newaxis, np.newaxis, :]
+                + across[..., np.newaxis, np.newaxis]
+                * direction[:, np.newaxis, np.newaxis, :]) / gap[..., np.newaxis]
+    direction_cov = np.sum(jacobians @ covariances @ np.swapaxes(jacobians, 2, 3),
+                           axis=1)
+    origin_cov = np.sum(covariances, axis=1) / xyz.shape[1] ** 2
+    return direction_cov, origin_cov
+
+
+def shape_fit_covariances(shapes: Sequence[Sequence[AtomSet]],
+                          cell_esds: Sequence[Optional[np.ndarray]], normal: bool
+                          ) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Covariances of directions and origins of lines (or planes, if `normal`)
+    best fit to atoms in every list of equally-sized `shapes`"""
+    inputs = StackInputs.from_shapes(shapes, cell_esds)
+    return list(zip(*fit_covariances(inputs.cart, inputs.cart_covariances, normal)))
+
+
+def direction_angle_esd(direction1: np.ndarray, cov1: np.ndarray,
+                        direction2: np.ndarray, cov2: np.ndarray) -> float:
+    """Esd, in degrees, of angle between two directions with covariances"""
+    g1, g2 = _vector_angle_gradients(direction1[np.newaxis], direction2[np.newaxis])
+    variance = g1[0] @ cov1 @ g1[0] + g2[0] @ cov2 @ g2[0]
+    return float(np.rad2deg(np.sqrt(variance)))
+
+
+def plane_distance_esd(xyz: np.ndarray, xyz_cov: np.ndarray, normal: np.ndarray,
+                       normal_cov: np.ndarray, origin: np.ndarray,
+                       origin_cov: np.ndarray) -> float:
+    """Esd of distance between point `xyz` and plane, all with covariances"""
+    delta = xyz - origin
+    variance = normal @ xyz_cov @ normal + normal @ origin_cov @ normal \
+        + delta @ normal_cov @ delta
+    return float(np.sqrt(variance))
@@ -8,20 +8,34 @@ and converted into a list of instructions.
 """
 import abc
 from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
+from functools import partial
 from glob import glob
+from itertools import groupby
 import logging
+from operator import attrgetter
+import os
 from pathlib import Path
-from typing import Any, Union, Protocol
+from typing import Any, Callable, Container, Iterable, Iterator, Literal, NamedTuple, \
+    Optional, Union, Protocol
 
 from numpy import rad2deg
 import numpy as np
 import pandas as pd
-import yaml
 
-from picometer.atom import group_registry, AtomSet, Locator
+from picometer.atom import group_registry, AtomSet, ClosestPair, Locator, \
+    FRACT_ESD_COLUMNS, _is_block_pattern, _match_blocks
+from picometer.cache import StructureCache
+from picometer.contacts import find_contacts
+from picometer import esd
+from picometer.esd import StackInputs
 from picometer.models import ModelState, ModelStates
-from picometer.shapes import ExplicitShape
+from picometer.results import ResultStore
+from picometer.shapes import ExplicitShape, Line, Plane, Shape
+from picometer import stack as stacked
+from picometer.stack import ModelStateStack, stack_model_states
+from picometer.timing import Timer
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +67,16 @@ class Instruction:
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}({self.as_dict()})'
 
+    @property
+    def text(self) -> str:
+        """Compact one-line description, e.g. `select: Fe` or `coordinates`"""
+        if not self.raw_kwargs:
+            return self.keyword
+        if isinstance(self.raw_kwargs, dict):
+            return f'{self.keyword}: ' + ', '.join(
+                f'{k}: {v}' for k, v in self.raw_kwargs.items())
+        return f'{self.keyword}: {self.raw_kwargs}'
+
     @property
     def handler(self) -> 'type(BaseInstructionHandler)':
         return BaseInstructionHandlerType.REGISTRY[self.keyword]
@@ -107,6 +131,7 @@ class Routine(deque[Instruction]):
 
     @classmethod
     def from_string(cls, text: str) -> 'Routine':
+        import yaml  # imported on first use to speed up start-up
         yaml_segments = yaml.load_all(text, yaml.SafeLoader)
         return cls.concatenate([cls.from_dict(y) for y in yaml_segments])
 
@@ -119,6 +144,7 @@ class Routine(deque[Instruction]):
         return {'instructions': [i.as_dict() for i in self]}
 
     def to_yaml(self, path: Union[str, Path]) -> None:
+        import yaml
         with open(path, 'w') as yaml_file:
             yaml.dump(self.as_dict(), yaml_file)
 
@@ -127,11 +153,17 @@ class Routine(deque[Instruction]):
 
 
 class ProcessorProtocol(Protocol):
+    contacts: dict[str, pd.DataFrame]
+    contacts_table: pd.DataFrame
     evaluation_table: pd.DataFrame
     history: Routine
     model_states: ModelStates
+    results: ResultStore
     selection: list[Locator]
     settings: dict[str, Any]
+    timer: Timer
+
+    def reset(self) -> None: ...
 
 
 class BaseInstructionHandlerType(type):
@@ -178,16 +210,88 @@ class BaseInstructionHandler(metaclass=BaseInstructionHandlerType):
 
 
 class SerialInstructionHandler(BaseInstructionHandler):
-    """Handlers that handle model states independently and exhausts selection"""
+    """
+    Handlers that handle model states independently and exhausts selection.
+    Handlers that define `stack_by` can additionally evaluate model states
+    with equally-sized selections together as a `ModelStateStack`:
+    - `stack_by`: `'focus'` to stack whole selection, `'shapes'` to stack
+      individually-selected shapes, or None if handler can not stack
+    - `evaluate_stack()`: return a list of results for each model state
+    - `evaluate_esds()`: return esds of results if `propagate_esds` is set
+    - `apply_one()`: store the result in the processor / model state
+    """
+
+    stack_by: Literal['focus', 'shapes', None] = None
+
+    def __init__(self, processor: ProcessorProtocol) -> None:
+        super().__init__(processor)
+        self.esds: dict[str, Any] = {}  # esds of results, if propagated
+
+    @property
+    def propagate_esds(self) -> bool:
+        return self.processor.settings['propagate_esds']
+
     def handle(self, instruction: Instruction) -> None:
+        stacked_results = {}
+        if self.stack_by and self.processor.settings['stack_model_states']:
+            stacked_results = self.evaluate_stacks(instruction)
+        span = partial(self.processor.timer.span, 'model_state',
+                       self.processor.results.stage, instruction.text)
         for ms_key, ms in self.processor.model_states.items():
-            self.handle_one(instruction, ms_key, ms)
+            with span(ms_key):
+                if ms_key in stacked_results:
+                    self.apply_one(instruction, ms_key, ms, stacked_results[ms_key])
+                else:
+                    self.handle_one(instruction, ms_key, ms)
         self.clear_selection_after_use()
 
     @abc.abstractmethod
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
         """Abstract function to handle a process a single model state"""
 
+    def evaluate_stacks(self, instruction: Instruction) -> dict[str, Any]:
+        """Evaluate all stackable model states in batches, return results"""
+        collect = self._collect_focus if self.stack_by == 'focus' \
+            else self._collect_shapes
+        items = ((ms_key, ms, collect(ms))
+                 for ms_key, ms in self.processor.model_states.items())
+        results = {}
+        for stack in stack_model_states(items):
+            with self.processor.timer.span('stack', self.processor.results.stage,
+                                           instruction.text):
+                stack_results = self.evaluate_stack(instruction, stack)
+                results.update(zip(stack.keys, stack_results))
+                if self.propagate_esds:
+                    self.esds.update(zip(stack.keys, self.evaluate_esds(
+                        stack.shapes, stack.model_states, stack_results)))
+            logger.debug('Evaluated %s for stack of %d', instruction, len(stack.keys))
+        return results
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        """Return list of results for each model state in stack"""
+        raise NotImplementedError
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        """Return list of esds of `results` evaluated for equally-sized
+        `shapes` in each of `model_states`"""
+        return [np.nan] * len(model_states)
+
+    def record(self, ms_key: str, label: str, value: Any) -> None:
+        """Add `value` and, if propagated, its esd to the results"""
+        self.processor.results.add(ms_key, label, value)
+        if self.propagate_esds:
+            self.processor.results.add(ms_key, label + '_esd',
+                                       self.esds.get(ms_key, np.nan))
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: Any) -> None:
+        """Store result of evaluating the instruction for a single model state"""
+        raise NotImplementedError
+
+    def _collect_focus(self, ms: ModelState) -> list[AtomSet]:
+        return [ms.nodes.locate(self.processor.selection)]
+
     def _collect_shapes(self, ms: ModelState) -> list[ExplicitShape]:
         shapes = []
         for locator in self.processor.selection:
@@ -201,25 +305,146 @@ class SerialInstructionHandler(BaseInstructionHandler):
 # ~~~~~~~~~~~~~~~~~~~~ CONCRETE INSTRUCTIONS DECLARATIONS ~~~~~~~~~~~~~~~~~~~~ #
 
 
+class LoadItem(NamedTuple):
+    """A single structure to be loaded and the index of its load instruction"""
+    cif_path: str
+    block_name: Optional[str]
+    stage: int
+
+
 class LoadInstructionHandler(BaseInstructionHandler):
     name = 'load'
     kwargs = dict(path=str, block=str)
 
     def handle(self, instruction: Instruction) -> None:
+        cif_paths = self._cif_paths(instruction)
+        for cif_path, (matched, ) in zip(cif_paths, self._read_atom_sets(
+                cif_paths, instruction.kwargs['block'])):
+            for block_name, atoms in matched:
+                self._load_model_state(cif_path, block_name, atoms)
+
+    def items(self, instructions: list[Instruction], resolve: bool = False
+              ) -> list[LoadItem]:
+        """List structures requested by subsequent load `instructions`.
+        Block patterns are resolved while reading, unless `resolve`d here
+        to list every structure before any is read, at the cost of a scan"""
+        first_stage = self.processor.results.stage
+        self._texts = {first_stage + i: instruction.text
+                       for i, instruction in enumerate(instructions)}
+        items = []
+        for i, instruction in enumerate(instructions):
+            block = instruction.kwargs['block']
+            for cif_path in self._cif_paths(instruction):
+                block_names = [block]
+                if resolve and _is_block_pattern(block):
+                    block_names = _match_blocks(
+                        cif_path, block, AtomSet.cif_block_names(cif_path))
+                items.extend(LoadItem(cif_path, block_name, first_stage + i)
+                             for block_name in block_names)
+        return items
+
+    def stream(self, items: list[LoadItem], cached: Container[LoadItem] = (),
+               done: int = 0) -> Iterator[tuple[LoadItem, Optional[str]]]:
+        """
+        Load structures listed in `items` one at a time, replacing
+        the previously loaded model state, and yield each item with its
+        block pattern resolved, together with label of the new model state.
+        Items in `cached` are not read and yielded with label `None`;
+        first `done` structures are skipped. Time spent waiting for and
+        loading every structure is recorded as a span of its load instruction.
+        """
+        to_read = [item for item in items if item not in cached]
+        files = [list(group) for _, group
+                 in groupby(to_read, key=attrgetter('cif_path'))]
+        reads = self._read_ahead(files)
+        read: dict[LoadItem, list[tuple[Optional[str], AtomSet]]] = {}
+        n = 0  # structures yielded or skipped so far
+        try:
+            for item in items:
+                if item in cached:
+                    if n >= done:
+                        yield item, None
+                    n += 1
+                    continue
+                matched, i = read.get(item), 0
+                while matched is None or i < len(matched):
+                    label = None
+                    with self.processor.timer.span('instruction', item.stage,
+                                                   self._texts[item.stage]):
+                        if matched is None:
+                            read = next(reads)
+                            matched = read[item]
+                        if i < len(matched) and n >= done:
+                            block_name, atoms = matched[i]
+                            self.processor.model_states.clear()
+                            self.processor.results.stage = item.stage
+                            label = self._load_model_state(
+                                item.cif_path, block_name, atoms)
+                    if i >= len(matched):
+                        break
+                    if label is not None:
+                        yield item._replace(block_name=matched[i][0]), label
+                    i += 1
+                    n += 1
+        finally:
+            reads.close()
+
+    def _read_ahead(self, files: list[list[LoadItem]]
+                    ) -> Iterator[dict[LoadItem, list[tuple[Optional[str], AtomSet]]]]:
+        """Read blocks of `files` in order, in background while current one
+        is used; consecutive items from the same cif file are read from
+        a single parse. Yield blocks matched by every item of every file"""
+        workers = self._workers(len(files))
+        executor_type = ThreadPoolExecutor if workers <= 1 else ProcessPoolExecutor
+        prefetch = 2 * max(workers, 1)
+        logger.info('Streaming %d cif files with prefetch=%d', len(files), prefetch)
+        with executor_type(max_workers=max(workers, 1)) as executor:
+            def submit(file_items: list[LoadItem]) -> Future:
+                return executor.submit(self._read_blocks, file_items[0].cif_path,
+                                       [item.block_name for item in file_items])
+            futures = deque(submit(file_items) for file_items in files[:prefetch])
+            for i, file_items in enumerate(files):
+                matched = futures.popleft().result()
+                if i + prefetch < len(files):
+                    futures.append(submit(files[i + prefetch]))
+                yield dict(zip(file_items, matched))
+
+    @staticmethod
+    def model_state_label(cif_path: str, block_name: Optional[str]) -> str:
+        return cif_path + (':' + block_name if block_name else '')
+
+    @staticmethod
+    def _cif_paths(instruction: Instruction) -> list[str]:
         cif_path = instruction.kwargs['path']
-        block_name = instruction.kwargs['block']
-        if Path(cif_path).is_file():
-            self._load_model_state(cif_path, block_name)
-        else:
-            for cif_path in sorted(glob(cif_path)):
-                self._load_model_state(cif_path, block_name)
-
-    def _load_model_state(self, cif_path, block_name):
-        atoms = AtomSet.from_cif(cif_path=cif_path, block_name=block_name)
-        label = cif_path + (':' + block_name if block_name else '')
-        self.processor.model_states[label] = ModelState(atoms=atoms)
-        logger.info(f'Loaded model state {label}')
+        return [cif_path] if Path(cif_path).is_file() else sorted(glob(cif_path))
 
+    @property
+    def _read_blocks(self) -> Callable[[str, list[Optional[str]]],
+                                       list[list[tuple[Optional[str], AtomSet]]]]:
+        cache_dir = self.processor.settings['structure_cache_dir']
+        cache = StructureCache(cache_dir) if cache_dir else None
+        esds = self.processor.settings['propagate_esds']
+        return partial(AtomSet.from_cif_blocks, cache=cache, esds=esds)
+
+    def _workers(self, n_files: int) -> int:
+        workers = self.processor.settings['load_workers'] or os.cpu_count()
+        return min(workers, n_files)
+
+    def _read_atom_sets(self, cif_paths: list[str], block: Optional[str]
+                        ) -> Iterable[list[list[tuple[Optional[str], AtomSet]]]]:
+        """Read blocks matching `block` from cif files in order,
+        using a pool of processes if requested"""
+        workers = self._workers(len(cif_paths))
+        blocks = [[block]] * len(cif_paths)
+        if workers <= 1:
+            return map(self._read_blocks, cif_paths, blocks)
+        logger.info('Reading %d cif files using %d processes', len(cif_paths), workers)
+        chunk_size = max(1, len(cif_paths) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._read_blocks, cif_paths, blocks,
+                                     chunksize=chunk_size))
+
+    def _load_model_state(self, cif_path: str, block_name: str, atoms: AtomSet) -> str:
         if self.processor.settings['complete_uiso_from_umatrix']:
             if 'U11' in atoms.table.columns:
                 if 'Uiso' not in atoms.table.columns:
@@ -237,24 +462,26 @@ class LoadInstructionHandler(BaseInstructionHandler):
                 mask1 = atoms.table['Uiso'].notna()
                 mask2 = atoms.table[['U11', 'U22', 'U33']].isna().all(axis=1)
                 # based on http://dx.doi.org/10.1107/S0021889802008580
-                n_mat = np.diag([atoms.base.a_r, atoms.base.b_r, atoms.base.c_r])
+                n_mat = np.diag(atoms.cell_matrices.reciprocal_lengths)
                 n_inv = np.linalg.inv(n_mat)
-                u_star = (m := np.linalg.inv(atoms.base.A_d.T)) @ m.T
+                u_star = (m := atoms.cell_matrices.fractionalisation) @ m.T
                 u_cif = n_inv @ u_star @ n_inv.T
                 for atom_label in atoms.table.index[mask1 & mask2]:
                     u_atom = atoms.table.at[atom_label, 'Uiso'] * u_cif
                     atoms.table.loc[atom_label, u_columns] = u_atom[np.triu_indices(3)]
 
-        if not self.processor.settings['auto_write_unit_cell']:
-            return
-        et = self.processor.evaluation_table
-        et.loc[label, 'unit_cell_a'] = atoms.base.a_d
-        et.loc[label, 'unit_cell_b'] = atoms.base.b_d
-        et.loc[label, 'unit_cell_c'] = atoms.base.c_d
-        et.loc[label, 'unit_cell_al'] = rad2deg(atoms.base.al_d)
-        et.loc[label, 'unit_cell_be'] = rad2deg(atoms.base.be_d)
-        et.loc[label, 'unit_cell_ga'] = rad2deg(atoms.base.ga_d)
-        et.loc[label, 'unit_cell_v'] = atoms.base.v_d
+        label = self.model_state_label(cif_path, block_name)
+        self.processor.model_states[label] = ModelState(atoms=atoms)
+        logger.info('Loaded model state %s', label)
+
+        if self.processor.settings['auto_write_unit_cell']:
+            self.processor.results.extend(label, [
+                'unit_cell_a', 'unit_cell_b', 'unit_cell_c', 'unit_cell_al',
+                'unit_cell_be', 'unit_cell_ga', 'unit_cell_v'], [
+                atoms.base.a_d, atoms.base.b_d, atoms.base.c_d,
+                rad2deg(atoms.base.al_d), rad2deg(atoms.base.be_d),
+                rad2deg(atoms.base.ga_d), atoms.base.v_d])
+        return label
 
 
 class SelectInstructionHandler(BaseInstructionHandler):
@@ -265,7 +492,7 @@ class SelectInstructionHandler(BaseInstructionHandler):
         loc = Locator.from_dict(instruction.kwargs)
         if loc:
             self.processor.selection.append(loc)
-            logger.info(f'Added {loc} to current selection')
+            logger.info('Added %s to current selection', loc)
         else:
             self.clear_selection()
 
@@ -279,7 +506,7 @@ class RecenterInstructionHandler(BaseInstructionHandler):
         new_locators = [Locator.from_dict(dict(loc._asdict(), at=new_center))
                         for loc in self.processor.selection]
         self.processor.selection = new_locators
-        logger.info(f'Recentered selection, current: {self.processor.selection}')
+        logger.info('Recentered selection, current: %s', self.processor.selection)
 
 
 class GroupInstructionHandler(BaseInstructionHandler):
@@ -290,48 +517,111 @@ class GroupInstructionHandler(BaseInstructionHandler):
         group = deepcopy(self.processor.selection)
         label = instruction.kwargs['label']
         group_registry[label] = group
-        logger.info(f'Defined new group {label} from selection {group}')
+        logger.info('Defined new group %s from selection %s', label, group)
         self.clear_selection_after_use()
 
 
 class CentroidInstructionHandler(SerialInstructionHandler):
     name = 'centroid'
     kwargs = dict(label=str)
+    stack_by = 'focus'
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         focus = ms.nodes.locate(self.processor.selection)
         c_fract = focus.fractionalise(focus.centroid)
+        if self.propagate_esds:
+            self.esds[ms_key] = self.evaluate_esds([[focus]], [ms], [])[0]
+        self.apply_one(instruction, ms_key, ms, (focus.base, c_fract))
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        bases = [shapes[0].base for shapes in stack.shapes]
+        c_cart = stacked.centroids(stack.xyz[0])
+        f_mats = np.stack([shapes[0].cell_matrices.fractionalisation
+                           for shapes in stack.shapes])
+        c_fract = np.matmul(f_mats, c_cart[:, :, np.newaxis])[:, :, 0]
+        return list(zip(bases, c_fract))
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        fract_esd = np.stack([ms_shapes[0].fract_xyz_esd.T for ms_shapes in shapes])
+        return list(esd.centroid_esds(fract_esd))
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: tuple) -> None:
+        label = instruction.kwargs['label']
+        base, c_fract = result
         c_atoms = {'label': [label], 'fract_x': [c_fract[0]],
                    'fract_y': [c_fract[1]], 'fract_z': [c_fract[2]], }
+        if self.propagate_esds:
+            c_esd = self.esds.get(ms_key, np.full(3, np.nan))
+            c_atoms.update({k: [v] for k, v in zip(FRACT_ESD_COLUMNS, c_esd)})
         atoms = pd.DataFrame.from_records(c_atoms).set_index('label')
-        centroid = AtomSet(focus.base, atoms)
-        ms.centroids += centroid
-        logger.info(f'Defined centroid {label}: {centroid} for model state {ms_key}')
+        centroid = AtomSet(base, atoms)
+        ms.add_nodes(centroid)
+        logger.info('Defined centroid %s: %s for model state %s',
+                    label, centroid, ms_key)
 
 
 class LineInstructionHandler(SerialInstructionHandler):
     name = 'line'
     kwargs = dict(label=str)
+    stack_by = 'focus'
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         focus = ms.nodes.locate(self.processor.selection)
-        line = focus.line
-        ms.shapes[label] = line
-        logger.info(f'Defined line {label}: {line} for model state {ms_key}')
+        if self.propagate_esds:
+            self.esds[ms_key] = self.evaluate_esds([[focus]], [ms], [])[0]
+        self.apply_one(instruction, ms_key, ms, focus.line)
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        origins = stacked.centroids(stack.xyz[0])
+        directions = stacked.line_directions(stack.xyz[0])
+        return [Line(direction=d, origin=o) for d, o in zip(directions, origins)]
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        cell_esds = [ms.cell_esd for ms in model_states]
+        return esd.shape_fit_covariances(shapes, cell_esds, normal=False)
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: Line) -> None:
+        label = instruction.kwargs['label']
+        if self.propagate_esds:
+            result.direction_cov, result.origin_cov = \
+                self.esds.get(ms_key, (None, None))
+        ms.shapes[label] = result
+        logger.info('Defined line %s: %s for model state %s', label, result, ms_key)
 
 
 class PlaneInstructionsHandler(SerialInstructionHandler):
     name = 'plane'
     kwargs = dict(label=str)
+    stack_by = 'focus'
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         focus = ms.nodes.locate(self.processor.selection)
-        plane = focus.plane
-        ms.shapes[label] = plane
-        logger.info(f'Defined plane {label}: {plane} for model state {ms_key}')
+        if self.propagate_esds:
+            self.esds[ms_key] = self.evaluate_esds([[focus]], [ms], [])[0]
+        self.apply_one(instruction, ms_key, ms, focus.plane)
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        origins = stacked.centroids(stack.xyz[0])
+        directions = stacked.plane_normals(stack.xyz[0])
+        return [Plane(direction=d, origin=o) for d, o in zip(directions, origins)]
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        cell_esds = [ms.cell_esd for ms in model_states]
+        return esd.shape_fit_covariances(shapes, cell_esds, normal=True)
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: Plane) -> None:
+        label = instruction.kwargs['label']
+        if self.propagate_esds:
+            result.direction_cov, result.origin_cov = \
+                self.esds.get(ms_key, (None, None))
+        ms.shapes[label] = result
+        logger.info('Defined plane %s: %s for model state %s', label, result, ms_key)
 
 
 class CoordinatesInstructionHandler(SerialInstructionHandler):
@@ -340,11 +630,14 @@ class CoordinatesInstructionHandler(SerialInstructionHandler):
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
         focus = ms.nodes.locate(self.processor.selection)
-        for label, coords in focus.table.iterrows():
-            self.processor.evaluation_table.loc[ms_key, label + '_x'] = coords.fract_x
-            self.processor.evaluation_table.loc[ms_key, label + '_y'] = coords.fract_y
-            self.processor.evaluation_table.loc[ms_key, label + '_z'] = coords.fract_z
-        logger.info(f'Noted coordinates for current selection in model state {ms_key}')
+        suffixes, values = ['_x', '_y', '_z'], focus.fract_xyz.T
+        if self.propagate_esds:  # follow every coordinate with its esd
+            suffixes = ['_x', '_x_esd', '_y', '_y_esd', '_z', '_z_esd']
+            values = np.stack([values, focus.fract_xyz_esd.T], axis=-1)
+        columns = [label + suffix for label in focus.table.index
+                   for suffix in suffixes]
+        self.processor.results.extend(ms_key, columns, values.ravel())
+        logger.info('Noted coordinates for current selection in model state %s', ms_key)
 
 
 class DisplacementInstructionHandler(SerialInstructionHandler):
@@ -354,67 +647,186 @@ class DisplacementInstructionHandler(SerialInstructionHandler):
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
         focus = ms.nodes.locate(self.processor.selection)
         assert len(focus) > 0
-        for label, displacements in focus.table.iterrows():
-            for suffix in 'Uiso U11 U22 U33 U23 U13 U12'.split():
-                label_ = label + '_' + suffix
-                value = getattr(displacements, suffix, None)
-                if value is not None:
-                    self.processor.evaluation_table.loc[ms_key, label_] = value
+        suffixes = [s for s in 'Uiso U11 U22 U33 U23 U13 U12'.split()
+                    if s in focus.table.columns]
+        columns = [label + '_' + suffix for label in focus.table.index
+                   for suffix in suffixes]
+        values = focus.table[suffixes].to_numpy(dtype=object).ravel()
+        self.processor.results.extend(ms_key, columns, values)
         if self.processor.settings['displacement_get_cartesian_eigenvalues']:
-            for label, es in zip(focus.table.index, focus.u_cartesian_eigenvalues):
-                for e, suffix in zip(es, ['Uce1', 'Uce2', 'Uce3']):
-                    label_ = label + '_' + suffix
-                    self.processor.evaluation_table.loc[ms_key, label_] = e
-        logger.info(f'Noted displacement for current selection in model state {ms_key}')
+            columns = [label + '_' + suffix for label in focus.table.index
+                       for suffix in ['Uce1', 'Uce2', 'Uce3']]
+            values = focus.u_cartesian_eigenvalues.ravel()
+            self.processor.results.extend(ms_key, columns, values)
+        logger.info('Noted displacement for current selection in model state %s',
+                    ms_key)
 
 
 class DistanceInstructionHandler(SerialInstructionHandler):
     name = 'distance'
     kwargs = dict(label=str)
+    stack_by = 'shapes'
+
+    @property
+    def memory_budget(self) -> int:
+        return self.processor.settings['distance_memory_budget'] * 2 ** 20
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         shapes = self._collect_shapes(ms)
         assert len(shapes) == 2
-        distance = shapes[0].distance(shapes[1])
-        self.processor.evaluation_table.loc[ms_key, label] = distance
-        logger.info(f'Evaluated distance {label}: {distance} for model state {ms_key}')
+        if all(isinstance(s, AtomSet) for s in shapes):
+            result = shapes[0].closest_pair(shapes[1], self.memory_budget)
+            if self.propagate_esds:
+                self.esds[ms_key] = self.evaluate_esds([shapes], [ms], [result])[0]
+        else:
+            result = shapes[0].distance(shapes[1])
+            if self.propagate_esds:
+                self.esds[ms_key] = self._shape_distance_esd(ms, shapes)
+        self.apply_one(instruction, ms_key, ms, result)
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        assert len(stack.xyz) == 2
+        n_pairs = stack.xyz[0].shape[1] * stack.xyz[1].shape[1]
+        if 16 * n_pairs > self.memory_budget:  # pair-wise arrays too large
+            return [s[0].closest_pair(s[1], self.memory_budget)
+                    for s in stack.shapes]
+        results = []
+        block_size = self.memory_budget // (16 * n_pairs)
+        for start in range(0, len(stack.keys), block_size):
+            block = slice(start, start + block_size)
+            distances, i, j = stacked.closest_pairs(*(x[block] for x in stack.xyz))
+            for shapes, d, i_, j_ in zip(stack.shapes[block], distances, i, j):
+                results.append(ClosestPair(d, shapes[0].table.index[i_],
+                                           shapes[1].table.index[j_], i_, j_))
+        return results
+
+    def evaluate_esds(self, shapes: list[list[AtomSet]], model_states: list[ModelState],
+                      results: list[ClosestPair]) -> list:
+        inputs = StackInputs.from_shapes(shapes, [ms.cell_esd for ms in model_states])
+        offsets = [len(ms_shapes[0]) for ms_shapes in shapes]
+        positions = np.array([[r.position1, o + r.position2]
+                              for r, o in zip(results, offsets)])
+        inputs = inputs.take(positions)
+        return list(esd.propagate(esd.distance_gradients(inputs.cart), inputs))
+
+    @staticmethod
+    def _shape_distance_esd(ms: ModelState, shapes: list[Shape]) -> float:
+        """Esd of distance between atoms and a plane; NaN for other shapes"""
+        atom_sets = [s for s in shapes if isinstance(s, AtomSet)]
+        planes = [s for s in shapes if isinstance(s, Plane)]
+        if len(atom_sets) != 1 or len(planes) != 1 or planes[0].origin_cov is None:
+            return np.nan
+        atoms, plane = atom_sets[0], planes[0]
+        closest = np.argmin(np.abs((atoms.cart_xyz.T - plane.origin) @ plane.direction))
+        inputs = StackInputs.from_shapes([[atoms.take(np.array([closest]))]],
+                                         [ms.cell_esd])
+        return esd.plane_distance_esd(
+            inputs.cart[0, 0], inputs.cart_covariances[0, 0], plane.direction,
+            plane.direction_cov, plane.origin, plane.origin_cov)
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: Union[ClosestPair, float]) -> None:
+        label = instruction.kwargs['label']
+        if isinstance(result, ClosestPair):
+            self.record(ms_key, label, result.distance)
+            logger.info('Evaluated distance %s: %s between %s and %s '
+                        'for model state %s', label, result.distance,
+                        result.label1, result.label2, ms_key)
+        else:
+            self.record(ms_key, label, result)
+            logger.info('Evaluated distance %s: %s for model state %s',
+                        label, result, ms_key)
 
 
 class AngleInstructionHandler(SerialInstructionHandler):
     name = 'angle'
     kwargs = dict(label=str)
+    stack_by = 'shapes'
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         shapes = self._collect_shapes(ms)
         assert len(shapes)
         angle = shapes[0].angle(*shapes[1:])
-        self.processor.evaluation_table.loc[ms_key, label] = angle
-        logger.info(f'Evaluated angle {label}: {angle} for model state {ms_key}')
+        if self.propagate_esds:
+            if all(isinstance(s, AtomSet) for s in shapes):
+                self.esds[ms_key] = self.evaluate_esds([shapes], [ms], [angle])[0]
+            elif all(s.direction_cov is not None for s in shapes):
+                self.esds[ms_key] = esd.direction_angle_esd(
+                    shapes[0].direction, shapes[0].direction_cov,
+                    shapes[1].direction, shapes[1].direction_cov)
+        self.apply_one(instruction, ms_key, ms, angle)
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        return list(stacked.angles(stack.combined_xyz))
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        inputs = StackInputs.from_shapes(shapes, [ms.cell_esd for ms in model_states])
+        return list(esd.propagate(esd.angle_gradients(inputs.cart), inputs))
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: float) -> None:
+        label = instruction.kwargs['label']
+        self.record(ms_key, label, result)
+        logger.info('Evaluated angle %s: %s for model state %s', label, result, ms_key)
 
 
 class DihedralInstructionHandler(SerialInstructionHandler):
     name = 'dihedral'
     kwargs = dict(label=str)
+    stack_by = 'shapes'
 
     def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
-        label = instruction.kwargs['label']
         shapes = self._collect_shapes(ms)
         assert len(shapes) == 4 and all(s.kind is s.Kind.spatial for s in shapes)
         dihedral = shapes[0].dihedral(*shapes[1:])  # noqa: shapes: list[AtomSet]
-        self.processor.evaluation_table.loc[ms_key, label] = dihedral
-        logger.info(f'Evaluated dihedral {label}: {dihedral} for model state {ms_key}')
+        if self.propagate_esds:
+            self.esds[ms_key] = self.evaluate_esds([shapes], [ms], [dihedral])[0]
+        self.apply_one(instruction, ms_key, ms, dihedral)
+
+    def evaluate_stack(self, instruction: Instruction, stack: ModelStateStack) -> list:
+        assert len(stack.xyz) == 4
+        return list(stacked.dihedrals(stack.combined_xyz))
+
+    def evaluate_esds(self, shapes: list[list[Shape]], model_states: list[ModelState],
+                      results: list) -> list:
+        inputs = StackInputs.from_shapes(shapes, [ms.cell_esd for ms in model_states])
+        return list(esd.propagate(esd.dihedral_gradients(inputs.cart), inputs))
+
+    def apply_one(self, instruction: Instruction, ms_key: str, ms: ModelState,
+                  result: float) -> None:
+        label = instruction.kwargs['label']
+        self.record(ms_key, label, result)
+        logger.info('Evaluated dihedral %s: %s for model state %s',
+                    label, result, ms_key)
+
+
+class ContactsInstructionHandler(SerialInstructionHandler):
+    name = 'contacts'
+    kwargs = dict(cutoff=float)
+
+    def handle_one(self, instruction: Instruction, ms_key: str, ms: ModelState) -> None:
+        cutoff = instruction.kwargs['cutoff']
+        focus = ms.nodes.locate(self.processor.selection)
+        contacts = find_contacts(focus, cutoff, ms.symm_op_codes)
+        self.processor.contacts[ms_key] = contacts
+        logger.info('Found %d contacts shorter than %s for model state %s',
+                    len(contacts), cutoff, ms_key)
 
 
 class WriteInstructionHandler(BaseInstructionHandler):
     name = 'write'
-    kwargs = dict(path=Path)
+    kwargs = dict(path=Path, table=str)
+    tables = ('evaluation', 'contacts')
 
     def handle(self, instruction: Instruction) -> None:
         path = instruction.kwargs['path']
-        self.processor.evaluation_table.to_csv(path_or_buf=path)
-        logger.info(f'Saved current evaluation table to {path}')
+        table_name = instruction.kwargs['table'] or 'evaluation'
+        if table_name not in self.tables:
+            raise ValueError(f'Unknown table {table_name!r}, use one of {self.tables}')
+        table = getattr(self.processor, table_name + '_table')
+        table.to_csv(path_or_buf=path)
+        logger.info('Saved current %s table to %s', table_name, path)
 
 
 class ClearInstructionHandler(BaseInstructionHandler):
@@ -422,8 +834,8 @@ class ClearInstructionHandler(BaseInstructionHandler):
     kwargs = dict()
 
     def handle(self, instruction: Instruction) -> None:
-        self.processor.__init__()
-        logger.info('Reinitialized processor')
+        self.processor.reset()
+        logger.info('Reset processor')
 
 
 class SetInstructionHandler(BaseInstructionHandler):
@@ -1,5 +1,8 @@
+import atexit
 from pathlib import Path
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 from typing import Any, Callable, Union
 
 
@@ -7,9 +10,11 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 
 
 def _get_logger() -> logging.Logger:
-    """Set up logging, but don't log yet in case picometer is used as package"""
+    """Set up logging, but don't log yet in case picometer is used as package.
+    Level is left unset, so that debug messages are not even created unless
+    a handler added using `add_file_handler` or `register_log_listener`,
+    or the configuration of the root logger, requests them"""
     logger_ = logging.getLogger('picometer')
-    logger_.setLevel(logging.DEBUG)
     logger_.addHandler(logging.NullHandler())
     return logger_
 
@@ -17,14 +22,58 @@ def _get_logger() -> logging.Logger:
 logger = _get_logger()
 
 
-def add_file_handler(path: Union[str, Path]) -> logging.FileHandler:
+class _BackgroundHandlers(QueueListener):
+    """Handlers that write log records in a background thread. Records are
+    passed to it by a `QueueHandler`, which only interpolates their message"""
+    def __init__(self) -> None:
+        super().__init__(queue.SimpleQueue(), respect_handler_level=True)
+        self.queue_handler = QueueHandler(self.queue)
+
+    def add(self, handler: logging.Handler) -> None:
+        if not self.handlers:
+            logger.addHandler(self.queue_handler)
+            self.start()
+        self.handlers = self.handlers + (handler, )
+
+    def flush(self) -> None:
+        """Block until all records logged so far have been handled"""
+        if self._thread is not None:
+            self.stop()
+            self.start()
+            for handler in self.handlers:
+                handler.flush()
+
+    def close(self) -> None:
+        """Handle all remaining records and stop the background thread"""
+        if self._thread is not None:
+            self.stop()
+
+
+_background_handlers = _BackgroundHandlers()
+atexit.register(_background_handlers.close)
+
+
+def flush_logs() -> None:
+    """Wait until the background thread writes every record logged so far"""
+    _background_handlers.flush()
+
+
+def _add_background_handler(handler: logging.Handler, level: Union[int, str]) -> None:
+    """Handle records of `level` in background, enabling them if necessary"""
+    handler.setLevel(level)
+    handler.setFormatter(formatter)
+    if not logger.isEnabledFor(handler.level):
+        logger.setLevel(handler.level)
+    _background_handlers.add(handler)
+
+
+def add_file_handler(path: Union[str, Path],
+                     level: Union[int, str] = logging.DEBUG) -> logging.FileHandler:
     """If used as program, allow logging directly to a file using `FileHandler`"""
     # now = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     # path = str((p := Path(path)).with_suffix('')) + '_' + now + p.suffix
     file_handler = logging.FileHandler(path)
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    _add_background_handler(file_handler, level)
     return file_handler
 
 
@@ -39,10 +88,10 @@ class LogEventHandler(logging.Handler):
         self.log_callback(log_entry)  # Send log entry to the callback
 
 
-def register_log_listener(log_callback: Callable[[str], Any]) -> LogEventHandler:
-    """A simple implementation, register function to call it for each log entry"""
+def register_log_listener(log_callback: Callable[[str], Any],
+                          level: Union[int, str] = logging.DEBUG) -> LogEventHandler:
+    """A simple implementation, register function to call it for each log entry.
+    The callback is called in a background thread; see `flush_logs`"""
     log_event_handler = LogEventHandler(log_callback)
-    log_event_handler.setLevel(logging.DEBUG)
-    log_event_handler.setFormatter(formatter)
-    logger.addHandler(log_event_handler)
+    _add_background_handler(log_event_handler, level)
     return log_event_handler
@@ -1,26 +1,133 @@
 import logging
+from typing import Optional
 
-from picometer.atom import AtomSet
+import numpy as np
+import pandas as pd
+
+from picometer.atom import AtomSet, LabelIndex
 from picometer.shapes import ExplicitShape
 
 
 logger = logging.getLogger(__name__)
 
 
+class NodeStore:
+    """Growable table of node (atom and centroid) labels and coordinates"""
+
+    def __init__(self, table: Optional[pd.DataFrame] = None) -> None:
+        table = table if table is not None else pd.DataFrame()
+        self.columns: list[str] = list(table.columns)
+        self.labels: list[str] = []
+        self.rows: dict[str, int] = {}  # label: row of its first occurrence
+        self.label_index = LabelIndex.get(())
+        self.values = np.empty((max(16, 2 * len(table)), len(self.columns)))
+        self.size = 0
+        self.append(table)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, n: int, columns: list[str]) -> None:
+        """Make room for `n` more rows and make sure `columns` are present"""
+        new_columns = [c for c in columns if c not in self.columns]
+        capacity = len(self.values)
+        if self.size + n <= capacity and not new_columns:
+            return
+        if self.size + n > capacity:
+            capacity = max(self.size + n, 2 * capacity)
+        values = np.full((capacity, len(self.columns) + len(new_columns)), np.nan)
+        values[:self.size, :len(self.columns)] = self.values[:self.size]
+        self.values = values
+        self.columns.extend(new_columns)
+
+    def append(self, table: pd.DataFrame) -> None:
+        """Append all rows of `table`, in amortized constant time per row"""
+        self._reserve(n := len(table), columns := list(table.columns))
+        column_positions = [self.columns.index(c) for c in columns]
+        block = np.full((n, len(self.columns)), np.nan)
+        block[:, column_positions] = table.to_numpy(dtype=np.float64, na_value=np.nan)
+        self.values[self.size:self.size + n] = block
+        new_labels = table.index.tolist()
+        for row, label in enumerate(new_labels, start=self.size):
+            self.rows.setdefault(label, row)
+        self.labels.extend(new_labels)
+        self.label_index = self.label_index.extended(new_labels) \
+            if self.size else LabelIndex.get(tuple(new_labels))
+        self.size += n
+
+    def frame(self, start: int = 0, stop: int = None) -> pd.DataFrame:
+        """A `pd.DataFrame` view of rows from `start` to `stop` without copy"""
+        stop = self.size if stop is None else stop
+        return pd.DataFrame(self.values[start:stop],
+                            index=pd.Index(self.labels[start:stop], dtype=str),
+                            columns=pd.Index(self.columns, dtype=str), copy=False)
+
+
 class ModelState:
-    """Class describing atomsets, selections, and shapes in one structure"""
+    """
+    Class describing atomsets, selections, and shapes in one structure.
+    Atoms and centroids are kept together in a single growable `NodeStore`,
+    to which new centroids can be appended with `add_nodes` cheaply.
+    """
     def __init__(self,
                  atoms: AtomSet,
-                 centroids: AtomSet = AtomSet(),
+                 centroids: AtomSet = None,
                  shapes: dict[str, ExplicitShape] = None):
-        self.atoms: AtomSet = atoms
-        self.centroids: AtomSet = centroids
+        self._atoms: AtomSet = atoms
+        self._nodes: Optional[AtomSet] = None
+        self._store = NodeStore(atoms.table)
+        self._n_atoms = len(self._store)
+        if centroids:
+            self.add_nodes(centroids)
         self.shapes: dict[str, ExplicitShape] = shapes if shapes else {}
-        logger.debug(f'Initialized {self}')
+        logger.debug('Initialized %s', self)
+
+    @property
+    def atoms(self) -> AtomSet:
+        return self._atoms
+
+    @atoms.setter
+    def atoms(self, atoms: AtomSet) -> None:
+        centroids = self.centroids
+        self._atoms = atoms
+        self._store = NodeStore(atoms.table)
+        self._n_atoms = len(self._store)
+        self._nodes = None
+        self.add_nodes(centroids)
+
+    @property
+    def symm_op_codes(self) -> tuple[str, ...]:
+        """Symmetry operations of the space group of the model state"""
+        return self.atoms.symm_op_codes
+
+    @property
+    def cell_esd(self) -> Optional[np.ndarray]:
+        """Standard uncertainties of unit cell parameters, if kept on load"""
+        return self.atoms.cell_esd
+
+    @property
+    def centroids(self) -> AtomSet:
+        return AtomSet(self.atoms.base, self._store.frame(start=self._n_atoms))
+
+    @centroids.setter
+    def centroids(self, centroids: AtomSet) -> None:
+        self._store = NodeStore(self.atoms.table)  # keep earlier views intact
+        self._nodes = None
+        self.add_nodes(centroids)
+
+    def add_nodes(self, nodes: AtomSet) -> None:
+        """Append new nodes i.e. centroids to the node store"""
+        if nodes.table is not None:
+            self._store.append(nodes.table)
+            self._nodes = None
 
     @property
     def nodes(self) -> AtomSet:
-        return self.atoms + self.centroids
+        """All atoms and centroids; a view of the store, do not edit in-place"""
+        if self._nodes is None:
+            self._nodes = AtomSet(self.atoms.base, self._store.frame())
+            self._nodes.label_index = self._store.label_index
+        return self._nodes
 
 
 class ModelStates(dict[str, ModelState]):
@@ -1,17 +1,34 @@
+from hashlib import sha1
 import logging
-from typing import Callable, Dict, List
+from pathlib import Path
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from picometer.atom import Locator
+from picometer.atom import group_registry, Locator
+from picometer.cache import CachedResult, ResultCache
+from picometer.checkpoint import Checkpoint, CheckpointError, \
+    CHECKPOINT_FORMAT_VERSION, read_checkpoint, write_checkpoint
+from picometer.compiler import compile_routine
 from picometer.models import ModelStates
-from picometer.instructions import Instruction, Routine
+from picometer.instructions import Instruction, LoadInstructionHandler, \
+    LoadItem, Routine
+from picometer.logging import flush_logs
+from picometer.results import ResultStore
 from picometer.settings import Settings
+from picometer.timing import Timer
 
 
 logger = logging.getLogger(__name__)
 
 
+PERFORMANCE_SETTINGS = {'load_workers', 'structure_cache_dir', 'stack_model_states',
+                        'distance_memory_budget', 'incremental_cache_dir',
+                        'checkpoint_path', 'checkpoint_every', 'checkpoint_seconds'}
+
+
 class Processor:
     """
     This is the main class responsible for controlling, processing,
@@ -21,27 +38,296 @@ class Processor:
     instructions: Dict[str, Callable] = {}
 
     def __init__(self, settings: Settings = None) -> None:
-        self.evaluation_table = pd.DataFrame()
+        self.timer = Timer()
         self.history = Routine()
+        self._overrides = dict(settings) if settings else {}  # kept after reset
+        self.reset()
+        self._streamed = 0  # structures of the streamed segment processed so far
+        self._checkpointed = (0, time.monotonic())  # instructions handled, time
+        logger.info('Initialized processor %s', self)
+
+    def reset(self) -> None:
+        """Discard structures, results, selection, and settings changed since
+        initialization; keep history and timings, so that they cover the whole
+        processed routine, and settings given on initialization"""
+        self.results = ResultStore()
+        self.contacts: Dict[str, pd.DataFrame] = {}
         self.model_states: ModelStates = ModelStates()
         self.selection: List[Locator] = []
         self.settings = Settings.from_yaml()
-        if settings:
-            self.settings.update(settings)
-        logger.info(f'Initialized processor {self}')
+        self.settings.update(self._overrides)
+
+    @classmethod
+    def from_checkpoint(cls, path: Union[str, Path]) -> 'Processor':
+        """Restore processor, including global groups, from a checkpoint"""
+        checkpoint = read_checkpoint(path)
+        new = cls()
+        new.history = checkpoint.history
+        new.model_states = checkpoint.model_states
+        new.selection = checkpoint.selection
+        new.settings.data = checkpoint.settings
+        new.results = checkpoint.results
+        new.contacts = checkpoint.contacts
+        new._streamed = checkpoint.streamed
+        group_registry.clear()
+        group_registry.update(checkpoint.groups)
+        new._checkpointed = (len(new.history), time.monotonic())
+        return new
+
+    def checkpoint(self, path: Union[str, Path] = None) -> None:
+        """Save current state to `path` or the `checkpoint_path` setting"""
+        path = path or self.settings['checkpoint_path']
+        write_checkpoint(path, Checkpoint(
+            version=CHECKPOINT_FORMAT_VERSION, history=self.history,
+            model_states=self.model_states, selection=self.selection,
+            groups=dict(group_registry), settings=self.settings.data,
+            results=self.results, contacts=self.contacts, streamed=self._streamed))
+        self._checkpointed = (len(self.history), time.monotonic())
+
+    def _checkpoint_if_due(self, handled: int = None) -> None:
+        """Save a checkpoint if enough instructions or time passed since last;
+        `handled` counts instructions handled so far, by default `history`"""
+        if not self.settings['checkpoint_path']:
+            return
+        handled = len(self.history) if handled is None else handled
+        every, seconds = self.settings['checkpoint_every'], \
+            self.settings['checkpoint_seconds']
+        last_handled, last_time = self._checkpointed
+        if every and handled - last_handled >= every \
+                or seconds and time.monotonic() - last_time >= seconds:
+            self.checkpoint()
+            self._checkpointed = (handled, self._checkpointed[1])
+
+    @property
+    def evaluation_table(self) -> pd.DataFrame:
+        """Table of results, materialized from `results`; do not edit in-place"""
+        return self.results.table
+
+    @evaluation_table.setter
+    def evaluation_table(self, table: pd.DataFrame) -> None:
+        self.results = ResultStore.from_frame(table)
+
+    @property
+    def timing_table(self) -> pd.DataFrame:
+        """Total wall and CPU time spent on every instruction, see `Timer`"""
+        return self.timer.summary()
+
+    @property
+    def contacts_table(self) -> pd.DataFrame:
+        """Long-format table of contacts found in all model states"""
+        if not self.contacts:
+            return pd.DataFrame(columns=['label1', 'label2', 'symm', 'distance'])
+        return pd.concat(self.contacts, names=['model_state', None]) \
+            .reset_index(level=1, drop=True)
+
+    def _handle(self, instruction: Instruction, stage: int) -> None:
+        self.results.stage = stage
+        handler = instruction.handler(self)
+        with self.timer.span('instruction', stage, instruction.text):
+            handler.handle(instruction)
 
     def process(self, instruction: Instruction) -> None:
         """Process one instruction by handling it by dedicated `InstructionHandle`"""
-        handler = instruction.handler(self)
-        handler.handle(instruction)
+        self._handle(instruction, stage=len(self.history))
         self.history.append(instruction)
-        logger.info(f'{self} processed {instruction}')
+        logger.info('%s processed %s', self, instruction)
+        self._checkpoint_if_due()
+
+    def stream(self, routine: Routine) -> None:
+        """
+        Process a `Routine` one structure at a time to limit memory usage.
+        In every segment of the routine separated by `clear`, structures
+        requested by leading `load` instructions are loaded one by one,
+        subjected to all subsequent instructions, and discarded afterwards.
+        Trailing `write` instructions are processed once all are handled.
+        Segments that do not follow this pattern are processed in bulk.
+        """
+        for segment in _split_on_clear(routine):
+            if (parts := _stream_parts(segment)) is None:
+                logger.warning('Segment can not be streamed, bulk-processing it')
+                for instruction in segment:
+                    self.process(instruction)
+                continue
+            head, loads, body, tail = parts
+            for instruction in head:
+                self.process(instruction)
+            self.results.stage = body_stage = len(self.history)
+            body_stage += len(loads)
+            selection, settings = list(self.selection), self.settings.data.copy()
+            final_state = None
+            loader = loads[0].handler(self)
+            cache, fingerprint = self._result_cache(body), ''
+            items = loader.items(loads, resolve=cache is not None)
+            done = self._streamed  # structures processed before resuming
+            if done:
+                logger.info('Skipping %d structures processed before resuming', done)
+            cached = {}
+            if cache:
+                fingerprint = self._fingerprint(body)
+                for item in items:
+                    if result := cache.get(fingerprint, *item[:2]):
+                        cached[item] = result
+            if cached:
+                logger.info('Reusing results of %d unchanged structures', len(cached))
+            structures = loader.stream(items, cached, done)
+            for i, (item, label) in enumerate(structures, start=done):
+                if label is None:
+                    self._replay(item, body_stage, cached[item])
+                else:
+                    start = len(self.results)
+                    for offset, instruction in enumerate(body):
+                        self._handle(instruction, stage=body_stage + offset)
+                    logger.info('%s processed routine for model state %s', self, label)
+                    if cache:
+                        cache.put(fingerprint, *item[:2], self._result(
+                            label, start, item, body_stage))
+                    final_state = self.selection, self.settings.data
+                    self.selection = list(selection)
+                    self.settings.data = settings.copy()
+                    self.model_states.clear()
+                self._streamed = i + 1
+                self._checkpoint_if_due(len(self.history) + (i + 1) * (len(body) + 1))
+            structures.close()
+            self._streamed = 0
+            if final_state is None:  # evaluate selection & settings after body
+                self.model_states.clear()
+                for offset, instruction in enumerate(body):
+                    self._handle(instruction, stage=body_stage + offset)
+                final_state = self.selection, self.settings.data
+            self.model_states.clear()
+            self.selection, self.settings.data = final_state
+            self.history.extend(loads + body)
+            self._checkpoint_if_due()
+            for instruction in tail:
+                self.process(instruction)
+
+    def _result_cache(self, body: list[Instruction]) -> Optional[ResultCache]:
+        """Cache of results of incremental runs, if requested and possible"""
+        if not (cache_dir := self.settings['incremental_cache_dir']):
+            return None
+        if any(instruction.keyword == 'write' for instruction in body):
+            logger.warning('Routine writes for every structure, not cached')
+            return None
+        return ResultCache(cache_dir)
 
+    def _fingerprint(self, body: list[Instruction]) -> str:
+        """Hash of all settings, groups, and instructions affecting `body` results"""
+        settings = {k: v for k, v in self.settings.items()
+                    if k not in PERFORMANCE_SETTINGS}
+        groups = repr(sorted(dict(group_registry).items()))
+        instructions = [i.as_dict() for i in list(self.history) + body
+                        if i.keyword not in {'load', 'write'}]
+        import yaml
+        dump = yaml.safe_dump([settings, groups, instructions], sort_keys=True)
+        return sha1(dump.encode('utf-8')).hexdigest()
 
-def process(routine: Routine) -> Processor:
-    """Shorthand function to process a full `Routine` of `Instruction`s"""
-    logger.info(f'Bulk-processing {routine}')
-    processor = Processor()
+    def _result(self, label: str, start: int, item: LoadItem, body_stage: int
+                ) -> CachedResult:
+        """Collect results of model state `label` recorded since `start`"""
+        columns, values, stages = self.results.records(start)
+        offsets = np.maximum(stages - body_stage, -1)  # -1 for load instruction
+        return CachedResult(columns, values, offsets, self.contacts.get(label))
+
+    def _replay(self, item: LoadItem, body_stage: int, result: CachedResult) -> None:
+        """Record cached results as if model state from `item` was processed"""
+        label = LoadInstructionHandler.model_state_label(*item[:2])
+        stages = np.where(result.offsets < 0, item.stage, result.offsets + body_stage)
+        for stage in dict.fromkeys(stages.tolist()):
+            mask = stages == stage
+            self.results.stage = stage
+            self.results.extend(label, [c for c, m in zip(result.columns, mask) if m],
+                                result.values[mask])
+        if result.contacts is not None:
+            self.contacts[label] = result.contacts
+        logger.info('%s reused results for model state %s', self, label)
+
+
+def _split_on_clear(routine: Routine) -> List[List[Instruction]]:
+    """Split routine into segments, each starting with `clear` but first"""
+    segments = [[]]
+    for instruction in routine:
+        if instruction.keyword == 'clear' and segments[-1]:
+            segments.append([])
+        segments[-1].append(instruction)
+    return segments
+
+
+def _stream_parts(segment: List[Instruction]) -> Optional[Tuple[List, ...]]:
+    """Split segment into leading `set`s, `load`s, body, and trailing `write`s"""
+    keywords = [instruction.keyword for instruction in segment]
+    head_end = 0
+    while head_end < len(segment) and keywords[head_end] in {'clear', 'set'}:
+        head_end += 1
+    load_end = head_end
+    while load_end < len(segment) and keywords[load_end] == 'load':
+        load_end += 1
+    body_end = len(segment)
+    while body_end > load_end and keywords[body_end - 1] == 'write':
+        body_end -= 1
+    if load_end == head_end or \
+            {'clear', 'load', 'write'}.intersection(keywords[load_end:body_end]):
+        return None
+    return (segment[:head_end], segment[head_end:load_end],
+            segment[load_end:body_end], segment[body_end:])
+
+
+def _checkpoint_path(routine: Routine, settings: Optional[Settings]) -> str:
+    """Path to checkpoint given in `settings` or `set` by the `routine`"""
+    path = settings['checkpoint_path'] if settings else ''
     for instruction in routine:
-        processor.process(instruction)
+        if instruction.keyword == 'set' and isinstance(instruction.raw_kwargs, dict):
+            path = instruction.raw_kwargs.get('checkpoint_path', path)
+    return path
+
+
+def _resume(routine: Routine, settings: Optional[Settings], stream: bool = False
+            ) -> Tuple[Processor, Routine]:
+    """Processor restored from checkpoint and the rest of routine to process"""
+    if not (path := _checkpoint_path(routine, settings)):
+        raise CheckpointError('Resuming requires the "checkpoint_path" setting')
+    if not Path(path).is_file():
+        logger.warning('Checkpoint %s not found, processing from the start', path)
+        return Processor(settings), routine
+    processor = Processor.from_checkpoint(path)
+    done = len(processor.history)
+    if list(processor.history) != list(routine)[:done]:
+        raise CheckpointError(f'Checkpoint {path} was saved for another routine')
+    if processor._streamed and not stream:
+        raise CheckpointError(f'Checkpoint {path} was saved while streaming, '
+                              f'resume it in stream mode')
+    if settings:  # allow e.g. changing the number of workers when resuming
+        defaults = Settings()
+        processor.settings.update({k: v for k, v in settings.items()
+                                   if k in PERFORMANCE_SETTINGS and v != defaults[k]})
+        processor._overrides = dict(settings)  # for documents after next `clear`
+    logger.info('Resuming routine after %d processed instructions', done)
+    return processor, Routine(list(routine)[done:])
+
+
+def process(routine: Routine,
+            settings: Settings = None,
+            stream: bool = False,
+            optimize: bool = False,
+            resume: bool = False,
+            ) -> Processor:
+    """
+    Shorthand function to process a full `Routine` of `Instruction`s.
+    If `stream`, process structures one at a time, see `Processor.stream`.
+    If `optimize`, skip redundant instructions, see `compile_routine`.
+    If `resume`, continue from the last checkpoint saved for the routine.
+    """
+    if optimize:
+        routine = compile_routine(routine, settings)
+    if resume:
+        processor, routine = _resume(routine, settings, stream)
+    else:
+        processor = Processor(settings)
+    if stream:
+        logger.info('Stream-processing %s', routine)
+        processor.stream(routine)
+    else:
+        logger.info('Bulk-processing %s', routine)
+        for instruction in routine:
+            processor.process(instruction)
+    flush_logs()
     return processor
@@ -0,0 +1,138 @@
+"""
+Columnar store of evaluation results, used behind `evaluation_table`.
+Instead of enlarging a `pd.DataFrame` one cell at a time, every result
+is appended as a (model state, column, value) record to growable arrays.
+The wide evaluation table is materialized only when it is requested.
+Its columns are ordered by the `stage` (index of the instruction) and row
+in which they first appeared, so that the table does not depend on whether
+model states were processed one instruction or one structure at a time.
+"""
+
+import logging
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+def _as_float(value: Any) -> float:
+    """Convert value to float, casting `None`, `pd.NA` etc. to `np.nan`"""
+    try:
+        return float(value)
+    except TypeError:
+        if pd.isna(value):
+            return np.nan
+        raise
+
+
+class ResultStore:
+    """Accumulate result records and materialize them as a wide table"""
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.row_ids: dict[str, int] = {}
+        self.column_ids: dict[str, int] = {}
+        self.column_keys: list[tuple[int, int]] = []  # first (stage, row id)
+        self.stage: int = 0  # set by the processor to current instruction index
+        self._rows = np.empty(capacity, dtype=np.intp)
+        self._columns = np.empty(capacity, dtype=np.intp)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._stages = np.empty(capacity, dtype=np.intp)
+        self._size = 0
+        self._table: Optional[pd.DataFrame] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({len(self.row_ids)} rows, ' \
+               f'{len(self.column_ids)} columns, {self._size} records)'
+
+    @classmethod
+    def from_frame(cls, table: pd.DataFrame) -> 'ResultStore':
+        """Create a new store containing all values of an existing table"""
+        new = cls(capacity=max(table.size, 1))
+        for row, values in table.iterrows():
+            new.extend(row, values.index, values.to_numpy())
+        return new
+
+    def _reserve(self, n: int) -> None:
+        """Make sure that the arrays can accommodate `n` more records"""
+        if (required := self._size + n) <= len(self._values):
+            return
+        capacity = max(required, 2 * len(self._values))
+        for name in ['_rows', '_columns', '_values', '_stages']:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _row_id(self, row: str) -> int:
+        return self.row_ids.setdefault(row, len(self.row_ids))
+
+    def _column_id(self, column: str, row_id: int) -> int:
+        if (column_id := self.column_ids.get(column)) is None:
+            column_id = self.column_ids[column] = len(self.column_ids)
+            self.column_keys.append((self.stage, row_id))
+        return column_id
+
+    def add(self, row: str, column: str, value: Any) -> None:
+        """Record `value` in the cell `row`, `column` of the table"""
+        self._reserve(1)
+        i = self._size
+        self._rows[i] = row_id = self._row_id(row)
+        self._columns[i] = self._column_id(column, row_id)
+        self._values[i] = _as_float(value)
+        self._stages[i] = self.stage
+        self._size += 1
+        self._table = None
+
+    def extend(self, row: str, columns: Iterable[str], values: Iterable[Any]) -> None:
+        """Record several `values` in `columns` of the same `row`"""
+        values = [_as_float(v) for v in values]
+        if not values:
+            return
+        row_id = self._row_id(row)
+        column_ids = [self._column_id(c, row_id) for c in columns]
+        assert len(column_ids) == len(values)
+        self._reserve(n := len(values))
+        i = self._size
+        self._rows[i:i + n] = row_id
+        self._columns[i:i + n] = column_ids
+        self._values[i:i + n] = values
+        self._stages[i:i + n] = self.stage
+        self._size += n
+        self._table = None
+
+    def records(self, start: int = 0) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """Columns, values, and stages of all records from `start` onwards"""
+        names = list(self.column_ids)
+        columns = [names[c] for c in self._columns[start:self._size].tolist()]
+        return (columns, self._values[start:self._size].copy(),
+                self._stages[start:self._size].copy())
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """Wide table of results; later records overwrite earlier ones"""
+        if self._table is None:
+            self._table = self._materialize()
+        return self._table
+
+    def _materialize(self) -> pd.DataFrame:
+        if not self._size:
+            return pd.DataFrame()
+        n_columns = len(self.column_ids)
+        rows = self._rows[:self._size]
+        columns = self._columns[:self._size]
+        cells = rows * n_columns + columns
+        _, last_from_end = np.unique(cells[::-1], return_index=True)
+        last = self._size - 1 - last_from_end
+        data = np.full((len(self.row_ids), n_columns), np.nan)
+        data[rows[last], columns[last]] = self._values[last]
+        order = sorted(range(n_columns), key=lambda c: (*self.column_keys[c], c))
+        logger.debug('Materialized evaluation table from %s', self)
+        return pd.DataFrame(data[:, order],
+                            index=pd.Index(list(self.row_ids), dtype=str),
+                            columns=pd.Index(list(self.column_ids), dtype=str)[order])
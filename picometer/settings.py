@@ -1,11 +1,10 @@
 from collections import UserDict
 from dataclasses import asdict, dataclass, fields, Field
+from functools import lru_cache
 from importlib import resources
 import logging
 from typing import Union
 
-import yaml
-
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +21,15 @@ class DefaultSettings:
     displacement_get_cartesian_eigenvalues: bool = False
     complete_uiso_from_umatrix: bool = False
     complete_umatrix_from_uiso: bool = False
+    load_workers: int = 1  # processes reading cif files; 0 to use all CPUs
+    structure_cache_dir: str = ''  # if given, cache parsed cif files there
+    stack_model_states: bool = True  # evaluate equal selections in batches
+    distance_memory_budget: int = 64  # MiB of temporary arrays in `distance`
+    propagate_esds: bool = False  # write esds of results and coordinates
+    incremental_cache_dir: str = ''  # if given and streaming, reuse results there
+    checkpoint_path: str = ''  # if given, periodically save processor state there
+    checkpoint_every: int = 0  # instructions between checkpoints; 0 to ignore
+    checkpoint_seconds: float = 300  # seconds between checkpoints; 0 to ignore
 
     @classmethod
     def get_field(cls, key: str) -> Field:
@@ -30,31 +38,43 @@ class DefaultSettings:
         raise SettingsError(f'Unknown setting name {key!r}')
 
 
+def _read_settings_yaml(path) -> dict:
+    import yaml  # imported on first use to speed up start-up
+    settings_stream = open(path, 'r') if path \
+        else resources.open_text('picometer', 'settings.yaml')
+    with settings_stream:
+        return yaml.safe_load(settings_stream)['settings']
+
+
+@lru_cache(maxsize=None)
+def _packaged_settings() -> dict:
+    """Default settings from the packaged yaml, parsed once per process"""
+    return _read_settings_yaml(None)
+
+
 class Settings(UserDict):
     """Automatically set self from `DefaultSettings` on init, handle settings"""
 
     @classmethod
     def from_yaml(cls, path=None) -> 'Settings':
-        settings_stream = open(path, 'r') if path \
-            else resources.open_text('picometer', 'settings.yaml')
-        with settings_stream:
-            return cls(yaml.safe_load(settings_stream)['settings'])
+        """Read settings from yaml `path`, by default the packaged one"""
+        return cls(_read_settings_yaml(path) if path else _packaged_settings())
 
     def __init__(self, data: dict = None) -> None:
         super().__init__(asdict(DefaultSettings()))  # noqa
         if data:
             self.update(data)
-        logger.debug(f'Initialized {self}')
+        logger.debug('Initialized %s', self)
 
     def __setitem__(self, key, value, /) -> None:
         field = DefaultSettings.get_field(key)
         super().__setitem__(key, value := field.type(value))
-        logger.debug(f'Changed setting {key} to {value}')
+        logger.debug('Changed setting %s to %s', key, value)
 
     def __delitem__(self, key, /) -> None:
         field = DefaultSettings.get_field(key)
         super().__setitem__(key, default := field.default)
-        logger.debug(f'Reset setting {key} to {default}')
+        logger.debug('Reset setting %s to %s', key, default)
 
     def update(self, other: Union[dict, UserDict] = None, /, **kwargs) -> None:
         other = {**other, **kwargs} if other else kwargs
@@ -67,15 +67,19 @@ class Shape:
     kind: Kind
     direction: Versor3
     origin: Vector3
+    direction_cov: np.ndarray = None  # covariance of direction, if propagated
+    origin_cov: np.ndarray = None  # covariance of origin, if propagated
 
     def __repr__(self):
         name = self.__class__.__name__
         return f'{name}(direction={self.direction}, origin={self.origin})'
 
     def at(self, origin: Vector3) -> 'Shape':
-        """Return a copy of self with centroid at new origin"""
-        new = copy.deepcopy(self)
+        """Return a shallow copy of self with centroid at new origin.
+        Shapes replace rather than edit their data, so it remains intact"""
+        new = copy.copy(self)
         new.origin = np.array(origin, dtype=float)
+        new.origin_cov = None  # uncertainty of the new origin is not known
         return new
 
     @abc.abstractmethod
@@ -91,7 +95,7 @@ class Shape:
         assert isinstance(self, Shape) and isinstance(other, Shape)
         if not self.kind.value >= other.kind.value:  # let self.kind >= other
             return other.distance(self)
-        logger.debug(f'Calculating distance between {self} and {other}')
+        logger.debug('Calculating distance between %s and %s', self, other)
         return self._distance(other)  # delegate to concrete implementation
 
     @abc.abstractmethod
@@ -104,7 +108,7 @@ class Shape:
         For Explicit shape, accept two parameters; for AtomSets, any size.
         """
         assert all(isinstance(o, Shape) for o in [self, *others])
-        logger.debug(f'Calculating angle between {self} and {others}')
+        logger.debug('Calculating angle between %s and %s', self, others)
         return self._angle(*others)  # delegate to concrete implementation
 
 
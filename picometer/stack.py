@@ -0,0 +1,116 @@
+"""
+Batched geometry evaluated simultaneously for many model states.
+In an isostructural series, the same selection yields the same number
+of atoms in every model state, so their Cartesian coordinates can be
+stacked into `(M, N, 3)` arrays for `M` model states and `N` atoms.
+Functions defined here evaluate such stacks in single NumPy calls
+and mirror the per-structure definitions in `picometer.atom.AtomSet`.
+"""
+
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from picometer.atom import AtomSet
+from picometer.models import ModelState
+from picometer.shapes import Shape
+
+
+class ModelStateStack(NamedTuple):
+    """Model states with equally-sized selected shapes, stacked together"""
+    keys: list[str]
+    model_states: list[ModelState]
+    shapes: list[list[AtomSet]]  # for every model state, list of its shapes
+    xyz: list[np.ndarray]  # for every shape, (M, N_i, 3) cart. coordinates
+
+    @classmethod
+    def from_shapes(cls, keys: list[str], model_states: list[ModelState],
+                    shapes: list[list[AtomSet]]) -> 'ModelStateStack':
+        xyz = [np.stack([ms_shapes[i].cart_xyz.T for ms_shapes in shapes])
+               for i in range(len(shapes[0]))]
+        return cls(keys=keys, model_states=model_states, shapes=shapes, xyz=xyz)
+
+    @property
+    def combined_xyz(self) -> np.ndarray:
+        """(M, sum(N_i), 3) coordinates of all shapes, in selection order"""
+        return np.concatenate(self.xyz, axis=1)
+
+
+def stack_model_states(items: Iterable[tuple[str, ModelState, list[Shape]]],
+                       ) -> list[ModelStateStack]:
+    """
+    Group model states whose shapes are all non-empty `AtomSet`s
+    of identical lengths into `ModelStateStack`s; skip the remaining ones.
+    """
+    groups = defaultdict(list)
+    for ms_key, ms, shapes in items:
+        if shapes and all(isinstance(s, AtomSet) and len(s) for s in shapes):
+            groups[tuple(len(s) for s in shapes)].append((ms_key, ms, shapes))
+    return [ModelStateStack.from_shapes(*map(list, zip(*group)))
+            for group in groups.values()]
+
+
+def _norm(v: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.sum(v * v, axis=-1))
+
+
+def degrees_between(v: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """Calculate angles between stacks of vectors, (M, 3) each, in degrees"""
+    return np.rad2deg(np.arccos(np.sum(v * w, axis=-1) / (_norm(v) * _norm(w))))
+
+
+def centroids(xyz: np.ndarray) -> np.ndarray:
+    """(M, 3) average positions of (M, N, 3) stack of coordinates"""
+    return xyz.mean(axis=1)
+
+
+def line_directions(xyz: np.ndarray) -> np.ndarray:
+    """(M, 3) directions of lines best fit to (M, N, 3) coordinates"""
+    _, _, vv = np.linalg.svd(xyz - centroids(xyz)[:, np.newaxis, :],
+                             full_matrices=False)
+    return vv[:, 0, :]
+
+
+def plane_normals(xyz: np.ndarray) -> np.ndarray:
+    """(M, 3) normals of planes best fit to (M, N, 3) coordinates"""
+    deltas = np.swapaxes(xyz - centroids(xyz)[:, np.newaxis, :], 1, 2)
+    uu, _, _ = np.linalg.svd(deltas, full_matrices=xyz.shape[1] < 3)
+    return uu[:, :, -1]
+
+
+def closest_pairs(xyz1: np.ndarray, xyz2: np.ndarray
+                  ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(M, ) closest distances between (M, N, 3) & (M, K, 3) coordinates,
+    followed by (M, ) positions of closest atoms in N and K, respectively"""
+    p = np.sum(xyz1 ** 2, axis=2)[:, :, np.newaxis] \
+        + np.sum(xyz2 ** 2, axis=2)[:, np.newaxis, :]
+    n = np.matmul(xyz1, np.swapaxes(xyz2, 1, 2))
+    d2 = (p - 2 * n).reshape(len(xyz1), -1)
+    closest = np.argmin(d2, axis=1)
+    d2_min = d2[np.arange(len(d2)), closest]
+    i, j = np.unravel_index(closest, xyz1.shape[1:2] + xyz2.shape[1:2])
+    return np.sqrt(np.maximum(d2_min, 0.)), i, j
+
+
+def distances(xyz1: np.ndarray, xyz2: np.ndarray) -> np.ndarray:
+    """(M, ) closest distances between (M, N, 3) & (M, K, 3) coordinates"""
+    return closest_pairs(xyz1, xyz2)[0]
+
+
+def angles(xyz: np.ndarray) -> np.ndarray:
+    """(M, ) angles 0-1-2 in degrees for (M, 3, 3) stack of coordinates"""
+    assert xyz.shape[1] == 3, 'Input AtomSet must contain exactly 3 atoms'
+    return degrees_between(xyz[:, 0] - xyz[:, 1], xyz[:, 2] - xyz[:, 1])
+
+
+def dihedrals(xyz: np.ndarray) -> np.ndarray:
+    """(M, ) dihedrals 0-1-2-3 in degrees for (M, 4, 3) stack of coordinates"""
+    assert xyz.shape[1] == 4, 'Input AtomSet must contain exactly 4 atoms'
+    plane1_dir = np.cross(xyz[:, 0] - xyz[:, 1], xyz[:, 2] - xyz[:, 1])
+    plane2_dir = np.cross(xyz[:, 1] - xyz[:, 2], xyz[:, 3] - xyz[:, 2])
+    twist_dir = np.cross(plane1_dir, plane2_dir)
+    axis = xyz[:, 2] - xyz[:, 1]
+    cosine = np.sum(twist_dir * axis, axis=-1) / (_norm(twist_dir) * _norm(axis))
+    sign = np.where(1 - cosine < 1E-8, +1, -1)
+    return sign * degrees_between(plane1_dir, plane2_dir)
@@ -0,0 +1,112 @@
+"""
+Wall and CPU time spent by the `Processor` on every processed instruction
+and, for instructions handled independently in every model state,
+on every model state. Time spent in stacked evaluation of many model states
+at once is recorded separately, see `SerialInstructionHandler`.
+Timings can be summarized as a table, or exported as a Chrome trace,
+which can be inspected as a timeline in e.g. https://ui.perfetto.dev.
+CPU time is the time of the main process only: time spent reading
+cif files in parallel worker processes is not accounted for.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import time
+from typing import Iterator, Literal, NamedTuple, Optional, Union
+
+import pandas as pd
+
+
+SpanKind = Literal['instruction', 'model_state', 'stack']
+
+
+class TimingSpan(NamedTuple):
+    kind: SpanKind
+    stage: int  # index of the instruction in the whole processed routine
+    instruction: str
+    model_state: Optional[str]  # label of model state, or None if not specific
+    start: float  # seconds since timer was created
+    wall: float  # seconds
+    cpu: float  # seconds
+
+
+class Timer:
+    """Collects `TimingSpan`s of instructions handled by the `Processor`"""
+
+    def __init__(self) -> None:
+        self.spans: list[TimingSpan] = []
+        self._origin = time.perf_counter()
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    @contextmanager
+    def span(self, kind: SpanKind, stage: int, instruction: str,
+             model_state: Optional[str] = None) -> Iterator[None]:
+        """Record wall and CPU time spent in the context as a new span"""
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.spans.append(TimingSpan(
+                kind, stage, instruction, model_state, wall_start - self._origin,
+                time.perf_counter() - wall_start, time.process_time() - cpu_start))
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """Table of all recorded spans in order of their completion"""
+        return pd.DataFrame(self.spans, columns=TimingSpan._fields)
+
+    def summary(self, by: Literal['instruction', 'model_state'] = 'instruction'
+                ) -> pd.DataFrame:
+        """
+        Table of total wall and CPU time spent on every instruction
+        (identified by its stage and text) or on every model state.
+        Instructions are sorted by stage, i.e. their index in the history,
+        which is kept across `clear`, so that every document of a multi-
+        document routine has its own rows, even if it repeats an earlier one.
+        Column `calls` counts times an instruction was handled: once in bulk,
+        or once per model state when streaming; `model_states` counts
+        model states an instruction was handled for individually.
+        """
+        table = self.table
+        if by == 'model_state':
+            table = table[table['kind'] == 'model_state']
+            summary = table.groupby('model_state', sort=False).agg(
+                instructions=('stage', 'size'), wall=('wall', 'sum'),
+                cpu=('cpu', 'sum'))
+            return summary.reset_index()
+        keys = ['stage', 'instruction']
+        is_ms = table['kind'] == 'model_state'
+        model_states = table[is_ms].groupby(keys, sort=False).size()
+        summary = table[table['kind'] == 'instruction'].groupby(keys, sort=False) \
+            .agg(calls=('wall', 'size'), wall=('wall', 'sum'), cpu=('cpu', 'sum'))
+        summary.insert(1, 'model_states', model_states.reindex(
+            summary.index, fill_value=0))
+        return summary.reset_index().sort_values('stage', kind='stable',
+                                                 ignore_index=True)
+
+    def trace(self) -> dict:
+        """All spans as complete events of a Chrome / Perfetto trace"""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            name = span.instruction if span.kind == 'instruction' \
+                else f'{span.model_state or span.kind}: {span.instruction}'
+            args = dict(stage=span.stage, instruction=span.instruction,
+                        cpu_ms=span.cpu * 1e3)
+            if span.model_state is not None:
+                args['model_state'] = span.model_state
+            events.append(dict(name=name, cat=span.kind, ph='X', pid=pid, tid=pid,
+                               ts=span.start * 1e6, dur=span.wall * 1e6, args=args))
+        events.sort(key=lambda event: (event['ts'], -event['dur']))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def write_trace(self, path: Union[str, Path]) -> None:
+        """Save Chrome trace JSON to `path` for viewing in a timeline viewer"""
+        Path(path).write_text(json.dumps(self.trace()))
@@ -1,13 +1,113 @@
-from typing import Iterable, List
+from collections import OrderedDict
+from typing import Hashable, Iterable, Tuple
+import warnings
 
-import uncertainties as uc
+import numpy as np
+
+
+CIF_PLACEHOLDERS = ('?', '.')  # unknown and inapplicable values
 
 
 def ustr2float(s: str) -> float:
     """Convert a string "1.23(4)" to float `1.23`, stripping uncertainty."""
+    import uncertainties as uc  # imported on first use to speed up start-up
     return uc.ufloat_fromstr(s).nominal_value
 
 
-def ustr2floats(s: Iterable[str]) -> List[float]:
+def _bytes2floats(buffer: np.ndarray, count: int) -> np.ndarray:
+    """Parse `count` whitespace-separated floats from a uint8 `buffer`"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            floats = np.fromstring(buffer.tobytes(), sep=' ')
+        except DeprecationWarning:  # raised by numpy on unparsable text
+            floats = np.empty(0)
+    if len(floats) != count:
+        raise ValueError(f'Could not convert {count} u-strings to floats')
+    return floats
+
+
+def ustrs2arrays(s: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert u-strings such as "1.23(4)", "-0.5", or "1e-3(2)" to arrays
+    of values and standard uncertainties. All strings are joined into a single
+    byte buffer, which is parsed in one vectorized pass. Values are identical
+    to `ustr2float`; ones without uncertainty are exact (esd 0), while cif
+    placeholders "?" (unknown) and "." (inapplicable) become NaN.
+    """
+    strings = list(s)
+    if not strings:
+        return np.empty(0), np.empty(0)
+    if any(p in strings for p in CIF_PLACEHOLDERS):
+        strings = ['nan' if s in CIF_PLACEHOLDERS else s for s in strings]
+    text = np.frombuffer(('\n'.join(strings) + '\n').encode('ascii'), np.uint8)
+    opens, closes = text == ord('('), text == ord(')')
+    in_esd = np.logical_xor.accumulate(opens | closes) | closes  # "(12)"
+    nominals = text.copy()
+    nominals[in_esd] = ord(' ')
+    values = _bytes2floats(nominals, len(strings))
+    esds = np.where(np.isnan(values), np.nan, 0.0)
+    open_positions = np.flatnonzero(opens)
+    if not open_positions.size:
+        return values, esds
+
+    # esd digits, e.g. "12" of "0.034(12)", combined by their place value
+    digit_positions = np.flatnonzero(in_esd & ~opens & ~closes)
+    group = np.searchsorted(open_positions, digit_positions) - 1
+    place = np.flatnonzero(closes)[group] - digit_positions - 1
+    digits = np.bincount(group, minlength=len(open_positions), weights=(
+        text[digit_positions] - ord('0')) * 10.0 ** place)
+
+    # esd is scaled by the number of decimals in the preceding nominal value
+    newlines = np.flatnonzero(text == ord('\n'))
+    esd_lines = np.searchsorted(newlines, open_positions)
+    nominal_end = np.zeros(len(strings), dtype=np.intp)
+    nominal_end[esd_lines] = open_positions
+    dots = np.flatnonzero(nominals == ord('.'))
+    dot_lines = np.searchsorted(newlines, dots)
+    decimals = np.zeros(len(strings), dtype=np.intp)
+    decimals[dot_lines] = np.maximum(nominal_end[dot_lines] - dots - 1, 0)
+    power = -decimals[esd_lines]
+    exponents = np.flatnonzero((nominals | 0x20) == ord('e'))
+    exponent_lines = np.searchsorted(newlines, exponents)
+    for k in np.flatnonzero(np.isin(esd_lines, exponent_lines)):  # rare
+        mantissa, _, exponent = strings[esd_lines[k]].partition('(')[0] \
+            .lower().partition('e')
+        power[k] = int(exponent) - len(mantissa.partition('.')[2])
+    esds[esd_lines] = np.where(power < 0, digits / 10.0 ** -power,
+                               digits * 10.0 ** power)
+    return values, esds
+
+
+def ustr2floats(s: Iterable[str]) -> np.ndarray:
     """Convenience function to convert an iterable of u-strings to floats."""
-    return [ustr2float(s) for s in s]
+    return ustrs2arrays(s)[0]
+
+
+def ustr2float_esd(s: str) -> Tuple[float, float]:
+    """Convert a string "1.23(4)" to a tuple `(1.23, 0.04)`; "1.23" is exact."""
+    values, esds = ustrs2arrays([s])
+    return float(values[0]), float(esds[0])
+
+
+def ustr2floats_esds(s: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Convenience function to convert u-strings to arrays of floats & esds."""
+    return ustrs2arrays(s)
+
+
+class LRUCache(OrderedDict):
+    """A dictionary that holds up to `maxsize` most recently used items"""
+    def __init__(self, maxsize: int = 1024) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key: Hashable):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
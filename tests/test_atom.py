@@ -0,0 +1,278 @@
+import importlib.resources
+import os
+import re
+from pathlib import Path
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from picometer import atom
+from picometer.atom import (AtomSet, group_registry, LabelIndex, Locator,
+                            _closest_positions, _literal_prefix, _parse_symm_op)
+from picometer.cache import StructureCache
+
+
+class TestAtomSetFromCif(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with importlib.resources.path('tests', 'cobalt.cif') as cif_path:
+            cls.cobalt = AtomSet.from_cif(str(cif_path))
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            cls.ferrocene1 = AtomSet.from_cif(str(cif_path))
+        with importlib.resources.path('tests', 'ferrocene2.cif') as cif_path:
+            cls.ferrocene2 = AtomSet.from_cif(str(cif_path))
+
+    def test_columns(self) -> None:
+        xyz = ['fract_x', 'fract_y', 'fract_z']
+        uij = ['U11', 'U22', 'U33', 'U12', 'U13', 'U23']
+        self.assertEqual(list(self.cobalt.table.columns), xyz + ['Uiso'] + uij)
+        self.assertEqual(list(self.ferrocene1.table.columns), xyz + ['Uiso'])
+        self.assertEqual(list(self.ferrocene2.table.columns), xyz + uij)
+
+    def test_dtypes(self) -> None:
+        for atoms in [self.cobalt, self.ferrocene1, self.ferrocene2]:
+            self.assertTrue(all(dt == np.float64 for dt in atoms.table.dtypes))
+
+    def test_labels_in_cif_order(self) -> None:
+        labels = list(self.ferrocene1.table.index)
+        self.assertEqual(labels[:3], ['Fe', 'C(11)', 'C(12)'])
+        self.assertEqual(len(labels), len(set(labels)))
+
+    def test_aniso_aligned_to_site_labels(self) -> None:
+        t = self.cobalt.table
+        us = ['U11', 'U22', 'U33', 'U12', 'U13', 'U23']
+        np.testing.assert_equal(t.loc['O1', us].to_numpy(),
+                                np.array([.067, .066, .018, .031, -.007, -.008]))
+        self.assertAlmostEqual(t.at['O1', 'fract_z'], 0.5147, places=4)
+
+
+class TestLabelIndex(unittest.TestCase):
+    labels = ('Fe', 'C(11)', 'C(12)', 'C1', 'Co1', 'H(11)', 'C1', 'c2')
+
+    def setUp(self) -> None:
+        self.index = LabelIndex(self.labels)
+
+    def test_literal_prefix(self) -> None:
+        self.assertEqual(_literal_prefix('C.+'), 'C')
+        self.assertEqual(_literal_prefix('C(11)'), 'C')
+        self.assertEqual(_literal_prefix('Co?1'), 'C')
+        self.assertEqual(_literal_prefix('Fe'), 'Fe')
+        self.assertEqual(_literal_prefix('C|H'), '')
+        self.assertEqual(_literal_prefix('[CH].*'), '')
+
+    def test_exact_match(self) -> None:
+        np.testing.assert_array_equal(self.index.match('Fe'), [0])
+        np.testing.assert_array_equal(self.index.match('C1'), [3, 6])
+
+    def test_regex_match_equals_pandas(self) -> None:
+        pandas_index = pd.Index(self.labels, dtype=str)
+        for regex in ['C.+', 'C', r'C\(1', 'C|H', '[CH].*', 'Co?1', '.*1$', 'X']:
+            expected = np.flatnonzero(pandas_index.str.match(regex))
+            np.testing.assert_array_equal(self.index.match(regex), expected)
+
+    def test_extended(self) -> None:
+        extended = self.index.extended(['X1', 'Fe'])
+        self.assertEqual(extended.labels, self.labels + ('X1', 'Fe'))
+        np.testing.assert_array_equal(extended.match('Fe'), [0, 9])
+        np.testing.assert_array_equal(extended.match('X.'), [8])
+        self.assertIs(extended, LabelIndex.get(self.labels + ('X1', 'Fe')))
+
+
+class TestLocate(unittest.TestCase):
+    def setUp(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene3.cif') as cif_path:
+            self.atoms = AtomSet.from_cif(str(cif_path))
+        self.copy = AtomSet(self.atoms.base, self.atoms.table.copy())
+
+    def tearDown(self) -> None:
+        group_registry.pop('test_group', None)
+
+    def test_identical_labels_share_label_set_id(self) -> None:
+        self.assertEqual(self.atoms.label_set_id, self.copy.label_set_id)
+        subset = self.atoms.select_atom('C.+')
+        self.assertNotEqual(self.atoms.label_set_id, subset.label_set_id)
+
+    def test_plan_is_shared_between_atom_sets(self) -> None:
+        locators = [Locator('H.+', symm='-x,-y,-z')]
+        plan1 = self.atoms._plan(locators)
+        plan2 = self.copy._plan(locators)
+        self.assertIs(plan1, plan2)
+        self.assertEqual(len(plan1[0][0]), 10)
+
+    def test_plan_invalidated_by_group_redefinition(self) -> None:
+        group_registry['test_group'] = [Locator('Fe')]
+        self.assertEqual(len(self.atoms.locate([Locator('test_group')])), 1)
+        group_registry['test_group'] = [Locator('C.+')]
+        self.assertEqual(len(self.atoms.locate([Locator('test_group')])), 10)
+
+    def test_locate_equals_recursive_locate(self) -> None:
+        group_registry['test_group'] = [Locator('H.+', symm='-x,-y,-z')]
+        locators = [Locator('Fe'), Locator('test_group', symm='x+1,y,z')]
+        t1 = self.atoms.locate(locators).table
+        t2 = self.atoms._locate_recursively(locators).table
+        assert_frame_equal(t1, t2)
+
+
+class TestParseSymmOp(unittest.TestCase):
+    def test_parsed_operations_are_cached(self) -> None:
+        self.assertIs(_parse_symm_op('-x,-y,-z'), _parse_symm_op('-x,-y,-z'))
+
+    def test_matrices(self) -> None:
+        symm_op = _parse_symm_op('-y,x-y,z+1/2')
+        np.testing.assert_array_equal(symm_op.tf, symm_op.operation.tf)
+        np.testing.assert_array_equal(symm_op.tl, [0, 0, 0.5])
+        np.testing.assert_array_equal(symm_op.tf_t, symm_op.tf.T)
+        self.assertFalse(symm_op.tf.flags.writeable)
+
+    def test_identity(self) -> None:
+        self.assertTrue(_parse_symm_op('x, y, z').is_identity)
+        self.assertFalse(_parse_symm_op('x,y,z+1').is_identity)
+        self.assertFalse(_parse_symm_op('-x,y,z').is_identity)
+
+
+class TestCopyOnWrite(unittest.TestCase):
+    def setUp(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene2.cif') as cif_path:
+            self.atoms = AtomSet.from_cif(str(cif_path))
+        self.original = self.atoms.table.copy()
+
+    def tearDown(self) -> None:
+        assert_frame_equal(self.atoms.table, self.original)
+
+    def test_identity_transform_shares_table(self) -> None:
+        self.assertIs(self.atoms.transform('x, y, z').table, self.atoms.table)
+        self.assertIs(self.atoms.transform('x,y,z+0').table, self.atoms.table)
+
+    def test_transform_is_involutive(self) -> None:
+        inverted = self.atoms.transform('-x,-y,-z')
+        self.assertFalse(np.allclose(inverted.fract_xyz, self.atoms.fract_xyz))
+        assert_frame_equal(inverted.transform('-x,-y,-z').table, self.original)
+
+    def test_contiguous_selection_is_a_view(self) -> None:
+        subset = self.atoms.select_atom('C.+')
+        self.assertTrue(np.shares_memory(subset.table['fract_x'].to_numpy(),
+                                         self.atoms.table['fract_x'].to_numpy()))
+
+    def test_origin_change_does_not_affect_parent(self) -> None:
+        subset = self.atoms.select_atom('C.+')
+        subset.origin = subset.centroid + 1.0
+        moved = self.atoms.at(self.atoms.centroid + 1.0)
+        np.testing.assert_allclose(moved.centroid, self.atoms.centroid + 1.0)
+
+
+class TestMemoizedGeometry(unittest.TestCase):
+    def setUp(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene2.cif') as cif_path:
+            self.atoms = AtomSet.from_cif(str(cif_path))
+
+    def test_cell_matrices(self) -> None:
+        matrices = self.atoms.cell_matrices
+        np.testing.assert_allclose(matrices.orthogonalisation @
+                                   matrices.fractionalisation, np.eye(3), atol=1e-12)
+        copy = AtomSet(self.atoms.base, self.atoms.table)
+        self.assertIs(copy.cell_matrices, matrices)
+
+    def test_memoized_values_are_read_only(self) -> None:
+        self.assertIs(self.atoms.cart_xyz, self.atoms.cart_xyz)
+        self.assertIs(self.atoms.centroid, self.atoms.centroid)
+        with self.assertRaises(ValueError):
+            self.atoms.fract_uij[0, 0, 0] = 0.
+
+    def test_origin_setter_invalidates_memo(self) -> None:
+        cart_xyz = self.atoms.cart_xyz
+        self.atoms.origin = self.atoms.centroid + 1.0
+        np.testing.assert_allclose(self.atoms.cart_xyz, cart_xyz + 1.0)
+
+    def test_transform_recomputes_geometry(self) -> None:
+        centroid = self.atoms.centroid
+        inverted = self.atoms.transform('-x,-y,-z')
+        np.testing.assert_allclose(inverted.centroid, -centroid)
+
+
+class TestClosestPair(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(1337)
+        self.xyz1 = rng.random((300, 3)) * 20
+        self.xyz2 = rng.random((200, 3)) * 20 + 15
+        d = np.linalg.norm(self.xyz1[:, np.newaxis] - self.xyz2, axis=2)
+        self.i, self.j = np.unravel_index(np.argmin(d), d.shape)
+        self.distance = d[self.i, self.j]
+
+    def test_brute_force(self) -> None:
+        distance, i, j = _closest_positions(self.xyz1, self.xyz2)
+        self.assertAlmostEqual(distance, self.distance)
+        self.assertEqual((i, j), (self.i, self.j))
+
+    def test_small_memory_budget(self) -> None:
+        distance, i, j = _closest_positions(self.xyz1, self.xyz2, 1)
+        self.assertAlmostEqual(distance, self.distance)
+        self.assertEqual((i, j), (self.i, self.j))
+
+    def test_kdtree(self) -> None:
+        if atom._kdtree_type() is None:
+            self.skipTest('scipy is not installed')
+        kdtree_min_pairs = atom.KDTREE_MIN_PAIRS
+        try:
+            atom.KDTREE_MIN_PAIRS = 0
+            distance, i, j = _closest_positions(self.xyz1, self.xyz2)
+        finally:
+            atom.KDTREE_MIN_PAIRS = kdtree_min_pairs
+        self.assertAlmostEqual(distance, self.distance)
+        self.assertEqual((i, j), (self.i, self.j))
+
+    def test_closest_pair_labels(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            atoms = AtomSet.from_cif(str(cif_path))
+        fe = atoms.select_atom('Fe')
+        carbons = atoms.select_atom(r'C\(1.\)')
+        pair = fe.closest_pair(carbons)
+        self.assertEqual(pair.label1, 'Fe')
+        self.assertAlmostEqual(pair.distance, fe.distance(carbons))
+        self.assertAlmostEqual(pair.distance, fe.distance(
+            carbons.select_atom(re.escape(pair.label2))))
+
+
+class TestStructureCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = StructureCache(Path(self.temp_dir.name) / 'cache')
+        with importlib.resources.path('tests', 'cobalt.cif') as cif_path:
+            self.cif_path = Path(self.temp_dir.name) / 'cobalt.cif'
+            shutil.copy(cif_path, self.cif_path)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_cache_miss_writes_entry(self) -> None:
+        self.assertIsNone(self.cache.get(self.cif_path))
+        _ = AtomSet.from_cif(str(self.cif_path), cache=self.cache)
+        self.assertIsNotNone(self.cache.get(self.cif_path))
+        self.assertEqual(len(list(self.cache.directory.glob('*.npz'))), 1)
+
+    def test_cache_hit_is_identical(self) -> None:
+        parsed = AtomSet.from_cif(str(self.cif_path))
+        _ = AtomSet.from_cif(str(self.cif_path), cache=self.cache)
+        cached = AtomSet.from_cif(str(self.cif_path), cache=self.cache)
+        assert_frame_equal(parsed.table, cached.table, check_exact=True)
+        np.testing.assert_array_equal(parsed.base.A_d, cached.base.A_d)
+        self.assertEqual(parsed.symm_op_codes, cached.symm_op_codes)
+
+    def test_modified_file_is_not_read_from_cache(self) -> None:
+        _ = AtomSet.from_cif(str(self.cif_path), cache=self.cache)
+        key1 = self.cache.key(self.cif_path)
+        stat = self.cif_path.stat()
+        os.utime(self.cif_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertNotEqual(key1, self.cache.key(self.cif_path))
+        self.assertIsNone(self.cache.get(self.cif_path))
+
+    def test_block_name_is_part_of_key(self) -> None:
+        self.assertNotEqual(self.cache.key(self.cif_path),
+                            self.cache.key(self.cif_path, 'other_block'))
+
+
+if __name__ == '__main__':
+    unittest.main()
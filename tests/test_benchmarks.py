@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks import suite
+from benchmarks.synthetic import write_synthetic_cif
+from picometer.atom import AtomSet
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cif_path = Path(self.temp_dir.name) / 'synthetic.cif'
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_structure(self) -> None:
+        block_names = write_synthetic_cif(self.cif_path, n_atoms=60, n_blocks=3,
+                                          n_reflections=10)
+        self.assertEqual(AtomSet.cif_block_names(str(self.cif_path)), block_names)
+        atoms = AtomSet.from_cif(str(self.cif_path), block_names[2])
+        self.assertEqual(len(atoms), 60)
+        self.assertIn('U23', atoms.table.columns)
+        ring = atoms.select_atom('C1_.*').cart_xyz
+        self.assertAlmostEqual(np.linalg.norm(ring[:, 0] - ring[:, 1]), 1.39, places=1)
+
+    def test_without_adps(self) -> None:
+        write_synthetic_cif(self.cif_path, n_atoms=12, adps=False)
+        atoms = AtomSet.from_cif(str(self.cif_path))
+        self.assertNotIn('U11', atoms.table.columns)
+
+
+class TestSuite(unittest.TestCase):
+    def test_run_and_compare(self) -> None:
+        scales = {'n_blocks': [2]}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            results_path = Path(temp_dir) / 'results.json'
+            results = suite.run_suite(scales, repeat=1)
+            results_path.write_text(json.dumps(dict(results=results)))
+            comparison = suite.compare(results_path, results_path)
+        self.assertEqual([r['phase'] for r in results], list(suite.PHASES))
+        self.assertTrue((comparison['ratio'] == 1).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import importlib.resources
+from pathlib import Path
+import tempfile
+import unittest
+
+from hikari.dataframes import CifFrame
+import numpy as np
+from pandas.testing import assert_frame_equal
+
+from picometer.atom import AtomSet
+from picometer.cif import CifError, CifReader, PICOMETER_DATA_NAMES
+
+
+CELL = '\n'.join(f'_cell_{k} {v}' for k, v in [
+    ('length_a', '10.0(1)'), ('length_b', '11.0'), ('length_c', '12.0'),
+    ('angle_alpha', '90'), ('angle_beta', '90'), ('angle_gamma', '90')])
+SITES = """
+loop_
+_atom_site_label
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+C1 0.1 0.2 0.3
+'C 2' 0.4 0.5 0.6
+"""
+
+
+class TestCifReader(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def write(self, text: str) -> str:
+        path = Path(self.temp_dir.name) / 'test.cif'
+        path.write_text(text)
+        return str(path)
+
+    def test_same_as_hikari(self) -> None:
+        for name in ['cobalt.cif', 'ferrocene1.cif', 'ferrocene2.cif']:
+            with importlib.resources.path('tests', name) as cif_path:
+                cf = CifFrame()
+                cf.read(str(cif_path))
+                with CifReader(cif_path) as reader:
+                    block = reader.block()
+            expected = {k: v for k, v in cf[list(cf.keys())[0]].items()
+                        if k.lower().startswith(PICOMETER_DATA_NAMES)}
+            self.assertEqual(block, expected)
+
+    def test_skips_unrelated_data(self) -> None:
+        cif_path = self.write(f"""data_other
+{CELL.replace('10.0(1)', '99')}
+data_wanted
+_shelx_hkl_file
+;
+_cell_length_a 99
+data_fake
+;
+loop_
+_refln_index_h
+_refln_index_k
+   1   2
+   3   4   5 'unterminated
+{CELL}
+{SITES}""")
+        with CifReader(cif_path) as reader:
+            self.assertEqual(reader.block_names, ['other', 'wanted'])
+            block = reader.block('WANTED')
+        self.assertEqual(block['_cell_length_a'], '10.0(1)')
+        self.assertEqual(block['_atom_site_label'], ['C1', 'C 2'])
+        self.assertNotIn('_refln_index_h', block)
+
+    def test_fallback_to_hikari(self) -> None:
+        cif_path = self.write('data_test\n' + CELL.replace('\n_cell_length_b',
+                                                           ' _cell_length_b') + SITES)
+        with self.assertRaises(CifError), CifReader(cif_path) as reader:
+            reader.block()
+        atoms = AtomSet.from_cif(cif_path)
+        np.testing.assert_array_equal(atoms.fract_xyz[:, 1], [0.4, 0.5, 0.6])
+        self.assertAlmostEqual(atoms.base.b_d, 11.0)
+
+    def test_from_cif_unchanged(self) -> None:
+        with importlib.resources.path('tests', 'cobalt.cif') as cif_path:
+            cf = CifFrame()
+            cf.read(str(cif_path))
+            parsed = AtomSet._parse_cif_block(cf[list(cf.keys())[0]])
+            read = AtomSet._parse_cif(str(cif_path))
+        assert_frame_equal(read.table, parsed.table, check_exact=True)
+        self.assertEqual(read.symm_op_codes, parsed.symm_op_codes)
+        np.testing.assert_array_equal(read.cell, parsed.cell)
+
+
+if __name__ == '__main__':
+    unittest.main()
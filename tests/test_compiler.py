@@ -0,0 +1,73 @@
+import importlib.resources
+import unittest
+
+from pandas.testing import assert_frame_equal
+
+from picometer.compiler import compile_routine
+from picometer.instructions import Instruction, Routine
+from picometer.process import process
+from picometer.settings import Settings
+from tests.test_instructions import get_yaml
+
+
+class TestCompileRoutine(unittest.TestCase):
+    def test_ferrocene_results_unchanged(self) -> None:
+        routine = Routine.from_string(get_yaml('test_ferrocene.yaml'))
+        compiled = compile_routine(routine)
+        self.assertLess(len(compiled), len(routine))
+        t1 = process(routine).evaluation_table
+        t2 = process(routine, optimize=True).evaluation_table
+        assert_frame_equal(t1, t2, check_exact=True)
+
+    def test_unused_fit_is_dropped(self) -> None:
+        routine = Routine([Instruction(select='Fe'), Instruction(select='C1'),
+                           Instruction(line='unused'),
+                           Instruction(select='Fe'), Instruction(select='C1'),
+                           Instruction(distance='Fe-C1')])
+        self.assertEqual(list(compile_routine(routine)), list(routine)[3:])
+
+    def test_repeated_fit_is_dropped(self) -> None:
+        fit = [Instruction(select='C.+'), Instruction(plane='cp')]
+        use = [Instruction(select='Fe'), Instruction(select='cp'),
+               Instruction(distance='Fe-cp')]
+        routine = Routine(fit + use + fit + use)
+        self.assertEqual(list(compile_routine(routine)), fit + use + use)
+
+    def test_refit_after_redefinition_is_kept(self) -> None:
+        fit = [Instruction(select='ring'), Instruction(plane='cp')]
+        use = [Instruction(select='Fe'), Instruction(select='cp'),
+               Instruction(distance='Fe-cp')]
+        routine = Routine([Instruction(select='C1'), Instruction(group='ring')]
+                          + fit + use
+                          + [Instruction(select='C2'), Instruction(group='ring')]
+                          + fit + use)
+        self.assertEqual(list(compile_routine(routine)), list(routine))
+
+    def test_load_between_selection_and_refit(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            tests_path = cif_path.parent
+        routine = Routine([Instruction(load=str(tests_path / 'ferrocene1.cif')),
+                           Instruction(select='C.+'), Instruction(plane='pA'),
+                           Instruction(select='C.+'),
+                           Instruction(load=str(tests_path / 'ferrocene2.cif')),
+                           Instruction(plane='pA'), Instruction(select='pA'),
+                           Instruction(select='Fe'), Instruction(distance='d')])
+        assert_frame_equal(process(routine).evaluation_table,
+                           process(routine, optimize=True).evaluation_table,
+                           check_exact=True)
+
+    def test_centroid_read_by_regex_is_kept(self) -> None:
+        routine = Routine([Instruction(select='C.+'), Instruction(centroid='Cg1'),
+                           Instruction(select='C.+'), Instruction('coordinates')])
+        self.assertEqual(list(compile_routine(routine)), list(routine))
+
+    def test_initial_settings_respected(self) -> None:
+        routine = Routine([Instruction(select='C1'), Instruction(line='unused'),
+                           Instruction(select='Fe'), Instruction(distance='Fe-C1')])
+        settings = Settings({'clear_selection_after_use': False})
+        self.assertEqual(list(compile_routine(routine, settings)), list(routine))
+        self.assertEqual(list(compile_routine(routine)), list(routine)[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import importlib.resources
+import itertools
+import unittest
+
+import numpy as np
+
+from picometer.atom import AtomSet, _parse_symm_op
+from picometer.contacts import find_contacts, neighbour_pairs
+
+
+class TestNeighbourPairs(unittest.TestCase):
+    def test_equals_brute_force(self) -> None:
+        rng = np.random.default_rng(2024)
+        xyz1, xyz2 = rng.random((200, 3)) * 15, rng.random((300, 3)) * 15
+        i, j, d = neighbour_pairs(xyz1, xyz2, cutoff=2.0)
+        all_d = np.linalg.norm(xyz1[:, np.newaxis] - xyz2, axis=2)
+        expected = set(zip(*np.nonzero(all_d <= 2.0)))
+        self.assertEqual(set(zip(i.tolist(), j.tolist())), expected)
+        np.testing.assert_allclose(d, all_d[i, j])
+
+    def test_empty(self) -> None:
+        i, j, d = neighbour_pairs(np.zeros((0, 3)), np.zeros((5, 3)), 1.0)
+        self.assertEqual((len(i), len(j), len(d)), (0, 0, 0))
+
+
+class TestFindContacts(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with importlib.resources.path('tests', 'cobalt.cif') as cif_path:
+            cls.atoms = AtomSet.from_cif(str(cif_path))
+
+    def brute_force(self, cutoff: float) -> list[float]:
+        fract_xyz, cart_xyz = self.atoms.fract_xyz, self.atoms.cart_xyz.T
+        distances = []
+        for symm_op_code in self.atoms.symm_op_codes:
+            symm_op = _parse_symm_op(symm_op_code)
+            transformed = symm_op.tf @ fract_xyz + symm_op.tl[:, np.newaxis]
+            for t in itertools.product(range(-3, 4), repeat=3):
+                t = np.array(t)
+                image = self.atoms.orthogonalise(transformed + np.c_[t]).T
+                d = np.linalg.norm(cart_xyz[:, np.newaxis] - image, axis=2)
+                within = symm_op.is_identity and not any(t)
+                for i, j in zip(*np.nonzero((d <= cutoff) & (d > 0.01))):
+                    if not within or i < j:
+                        distances.append(d[i, j])
+        return sorted(distances)
+
+    def test_symmetry_operations_read(self) -> None:
+        self.assertEqual(len(self.atoms.symm_op_codes), 6)
+        self.assertEqual(self.atoms.symm_op_codes[1], 'x-y,x,z')
+
+    def test_equals_brute_force(self) -> None:
+        contacts = find_contacts(self.atoms, 3.0, self.atoms.symm_op_codes)
+        self.assertEqual(list(contacts.columns),
+                         ['label1', 'label2', 'symm', 'distance'])
+        np.testing.assert_allclose(sorted(contacts['distance']),
+                                   self.brute_force(3.0))
+
+    def test_symmetry_codes_generate_contacts(self) -> None:
+        contacts = find_contacts(self.atoms, 3.0, self.atoms.symm_op_codes)
+        for label1, label2, symm, distance in contacts.itertuples(index=False):
+            atom1 = self.atoms.select_atom(label1)
+            atom2 = self.atoms.select_atom(label2).transform(symm)
+            self.assertAlmostEqual(atom1.distance(atom2), distance)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import importlib.resources
+import unittest
+
+from hikari.dataframes import BaseFrame
+import numpy as np
+import pandas as pd
+
+from picometer import esd
+from picometer.atom import AtomSet, FRACT_ESD_COLUMNS
+from picometer import stack as stacked
+from picometer.instructions import Instruction, Routine
+from picometer.process import process
+from picometer.utility import ustr2float_esd
+from tests.test_instructions import get_yaml
+
+
+def numerical_gradients(function, xyz: np.ndarray, step: float = 1e-6) -> np.ndarray:
+    gradients = np.zeros_like(xyz)
+    for index in np.ndindex(xyz.shape):
+        plus, minus = xyz.copy(), xyz.copy()
+        plus[index] += step
+        minus[index] -= step
+        gradients[index] = (function(plus) - function(minus))[index[0]] / (2 * step)
+    return gradients
+
+
+class TestGradients(unittest.TestCase):
+    def setUp(self) -> None:
+        self.xyz = np.random.default_rng(42).random((5, 4, 3)) * 3
+
+    def test_orthogonalisation(self) -> None:
+        bf = BaseFrame()
+        bf.edit_cell(a=10.4, b=7.6, c=5.8, al=91, be=120.9, ga=95)
+        cell = np.array([10.4, 7.6, 5.8, 91, 120.9, 95])
+        np.testing.assert_allclose(esd.orthogonalisation(cell), bf.A_d.T)
+        derivatives = esd.orthogonalisation_derivatives(cell)
+        for k in range(6):
+            step = np.eye(6)[k] * 1e-6
+            expected = (esd.orthogonalisation(cell + step)
+                        - esd.orthogonalisation(cell - step)) / 2e-6
+            np.testing.assert_allclose(derivatives[k], expected, atol=1e-8)
+
+    def test_distance_gradients(self) -> None:
+        expected = numerical_gradients(
+            lambda x: stacked.distances(x[:, :1], x[:, 1:]), self.xyz[:, :2])
+        np.testing.assert_allclose(esd.distance_gradients(self.xyz[:, :2]),
+                                   expected, atol=1e-6)
+
+    def test_angle_gradients(self) -> None:
+        expected = numerical_gradients(stacked.angles, self.xyz[:, :3])
+        np.testing.assert_allclose(esd.angle_gradients(self.xyz[:, :3]),
+                                   expected, atol=1e-5)
+
+    def test_dihedral_gradients(self) -> None:
+        expected = numerical_gradients(stacked.dihedrals, self.xyz)
+        np.testing.assert_allclose(esd.dihedral_gradients(self.xyz),
+                                   expected, atol=1e-5)
+
+    def test_fit_covariances(self) -> None:
+        def fit(xyz: np.ndarray, k: int) -> np.ndarray:
+            deltas = xyz - xyz.mean(axis=1, keepdims=True)
+            directions = np.linalg.eigh(np.swapaxes(deltas, 1, 2) @ deltas)[1][:, :, k]
+            return directions * np.sign(directions[:, :1])
+        for k, normal in [(0, True), (2, False)]:
+            covariances = np.zeros(self.xyz.shape + (3, ))
+            covariances[:, 1, 2, 2] = 1.0  # only z of atom 1 is uncertain
+            direction_cov, _ = esd.fit_covariances(self.xyz, covariances, normal)
+            plus, minus = self.xyz.copy(), self.xyz.copy()
+            plus[:, 1, 2] += 1e-6
+            minus[:, 1, 2] -= 1e-6
+            jacobian = (fit(plus, k) - fit(minus, k)) / 2e-6
+            expected = jacobian[:, :, np.newaxis] * jacobian[:, np.newaxis, :]
+            np.testing.assert_allclose(direction_cov, expected, atol=1e-6)
+
+
+class TestPropagation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            cls.atoms = AtomSet.from_cif(str(cif_path), esds=True)
+
+    def test_ustr2float_esd(self) -> None:
+        self.assertEqual(ustr2float_esd('1.23(4)'), (1.23, 0.04))
+        self.assertEqual(ustr2float_esd('-.0218(10)'), (-0.0218, 0.001))
+        self.assertEqual(ustr2float_esd('90.0'), (90.0, 0.0))
+
+    def test_esds_are_opt_in(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            atoms = AtomSet.from_cif(str(cif_path))
+        self.assertIsNone(atoms.cell_esd)
+        self.assertFalse(set(FRACT_ESD_COLUMNS) & set(atoms.table.columns))
+        np.testing.assert_array_equal(self.atoms.cell_esd,
+                                      [0.005, 0.004, 0.004, 0.0, 0.08, 0.0])
+
+    def test_angle_esd(self) -> None:
+        """Reference esd evaluated with `uncertainties` from the same cif"""
+        shapes = [self.atoms.select_atom(rf'C\(1{i}\)') for i in (1, 2, 3)]
+        inputs = esd.StackInputs.from_shapes([shapes], [self.atoms.cell_esd])
+        esds = esd.propagate(esd.angle_gradients(inputs.cart), inputs)
+        self.assertAlmostEqual(esds[0], 0.3152, places=4)
+
+    def test_symmetry_keeps_esds(self) -> None:
+        transformed = self.atoms.transform('-y,x,-z')
+        np.testing.assert_allclose(transformed.fract_xyz_esd,
+                                   self.atoms.fract_xyz_esd[[1, 0, 2]])
+
+
+class TestPropagationInstructions(unittest.TestCase):
+    def test_stacked_equals_serial(self) -> None:
+        routine_text = get_yaml('test_ferrocene.yaml').replace(
+            'settings:', 'settings:\n  propagate_esds: True', 1)
+        serial_text = routine_text.replace(
+            'settings:', 'settings:\n  stack_model_states: False', 1)
+        t1 = process(Routine.from_string(serial_text)).evaluation_table
+        t2 = process(Routine.from_string(routine_text)).evaluation_table
+        pd.testing.assert_frame_equal(t1, t2, check_exact=False, rtol=1e-9)
+        self.assertIn('C(11)-C(12)-C(13)_esd', t2.columns)
+        self.assertFalse(t2['C(11)-C(12)-C(13)-C(14)_esd'].isna().any())
+        values = process(Routine.from_string(get_yaml('test_ferrocene.yaml')))
+        pd.testing.assert_frame_equal(values.evaluation_table,
+                                      t2[values.evaluation_table.columns])
+
+    def test_coordinates_esds(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            routine = Routine([Instruction(set={'propagate_esds': True}),
+                               Instruction(load=str(cif_path)),
+                               Instruction(select='C.+'), Instruction(centroid='cA'),
+                               Instruction(select=r'C\(11\)'), Instruction(select='cA'),
+                               Instruction('coordinates')])
+        table = process(routine).evaluation_table
+        self.assertEqual([c for c in table.columns if c.startswith('cA')], [
+            'cA_x', 'cA_x_esd', 'cA_y', 'cA_y_esd', 'cA_z', 'cA_z_esd'])
+        atoms = AtomSet.from_cif(str(cif_path), esds=True).select_atom(r'C\(11\)')
+        np.testing.assert_array_equal(
+            table[['C(11)_x_esd', 'C(11)_y_esd', 'C(11)_z_esd']].to_numpy()[0],
+            atoms.fract_xyz_esd[:, 0])
+        self.assertFalse(table[['cA_x_esd', 'cA_y_esd']].isna().any(axis=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -132,6 +132,17 @@ class TestSettingInstructions(unittest.TestCase):
             self.assertEqual(ms_key1, ms_key2)
             self.assertTrue(ms1.atoms.table.equals(ms2.atoms.table))
 
+    def test_load_grep_parallel(self):
+        routine1_text = get_yaml('test_instructions.yaml', lines=range(2))
+        routine1_text = routine1_text.replace('ferrocene1', 'ferrocene*')
+        routine2_text = 'settings:\n  load_workers: 2\n' + routine1_text
+        p1 = process(Routine.from_string(routine1_text))
+        p2 = process(Routine.from_string(routine2_text))
+        self.assertEqual(list(p1.model_states.keys()), list(p2.model_states.keys()))
+        for ms1, ms2 in zip(p1.model_states.values(), p2.model_states.values()):
+            self.assertTrue(ms1.atoms.table.equals(ms2.atoms.table))
+        self.assertTrue(p1.evaluation_table.equals(p2.evaluation_table))
+
     def test_select_atom(self) -> None:
         self.routine_text += '  - select: Fe\n'
         p = process(Routine.from_string(self.routine_text))
@@ -395,6 +406,19 @@ class TestMeasuringInstructions(unittest.TestCase):
                             3.23411241, 3.15891163, 3.21732243])
         self.assertTrue(np.allclose(results, correct))
 
+    def test_contacts(self):
+        self.routine_text += '  - select: Fe\n'
+        self.routine_text += '  - select: cp_A\n'
+        self.routine_text += '  - contacts: 2.2\n'
+        p = process(Routine.from_string(self.routine_text))
+        contacts = p.contacts_table
+        self.assertTrue(all(contacts['distance'] <= 2.2))
+        fe_contacts = contacts[contacts['label1'] == 'Fe']
+        self.assertTrue(all(fe_contacts['label2'].str.startswith('C')))
+        self.assertTrue(all(fe_contacts['distance'] > 1.9))
+        model_states = list(p.model_states.keys())
+        self.assertEqual(len(fe_contacts.loc[model_states[0]]), 5)
+
     def test_angle_plane_plane(self):
         self.routine_text += '  - select: 001_plane\n'
         self.routine_text += '  - select: cp_A_plane\n'
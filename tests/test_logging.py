@@ -1,9 +1,12 @@
+import logging
 from pathlib import Path
 import tempfile
 import unittest
+from unittest import mock
 
 from picometer.logging import add_file_handler, register_log_listener
 from picometer.instructions import Routine
+from picometer.shapes import Shape
 from picometer.process import process
 from tests.test_instructions import get_yaml
 
@@ -32,3 +35,20 @@ class TestLogging(unittest.TestCase):
             _ = process(self.routine)
             with open(log_path, 'r') as log_file:
                 self.assertEqual(snatched_log_msg, log_file.read().splitlines())
+
+    def test_file_handler_level(self) -> None:
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as temp_dir:
+            log_path = Path(temp_dir) / 'picometer.log'
+            _ = add_file_handler(log_path, level='INFO')
+            _ = process(self.routine)
+            with open(log_path, 'r') as log_file:
+                levels = {line.split(' - ')[2] for line in log_file}
+        self.assertEqual(levels, {'INFO'})
+
+    def test_disabled_messages_not_formatted(self) -> None:
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        with mock.patch.object(Shape, '__repr__', autospec=True,
+                               return_value='shape') as shape_repr:
+            _ = process(self.routine)
+        shape_repr.assert_not_called()
@@ -0,0 +1,78 @@
+import importlib.resources
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from picometer.atom import AtomSet, Locator
+from picometer.models import ModelState, NodeStore
+
+
+def centroid(atoms: AtomSet, label: str, xyz: list[float]) -> AtomSet:
+    table = pd.DataFrame([xyz], columns=['fract_x', 'fract_y', 'fract_z'],
+                         index=pd.Index([label], dtype=str))
+    return AtomSet(atoms.base, table)
+
+
+class TestNodeStore(unittest.TestCase):
+    def test_append_grows_and_keeps_rows(self) -> None:
+        table = pd.DataFrame({'fract_x': [0.1], 'Uiso': [0.2]}, index=['A'])
+        store = NodeStore(table)
+        for i in range(100):
+            store.append(pd.DataFrame({'fract_x': [i]}, index=[f'X{i}']))
+        self.assertEqual(len(store), 101)
+        self.assertEqual(store.rows['X99'], 100)
+        frame = store.frame()
+        self.assertEqual(frame.at['X42', 'fract_x'], 42.)
+        self.assertTrue(np.isnan(frame.at['X42', 'Uiso']))
+
+    def test_new_columns_are_added(self) -> None:
+        store = NodeStore(pd.DataFrame({'fract_x': [0.1]}, index=['A']))
+        store.append(pd.DataFrame({'fract_y': [0.5]}, index=['B']))
+        self.assertEqual(store.columns, ['fract_x', 'fract_y'])
+        self.assertTrue(np.isnan(store.frame().at['A', 'fract_y']))
+
+
+class TestModelState(unittest.TestCase):
+    def setUp(self) -> None:
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            self.atoms = AtomSet.from_cif(str(cif_path))
+        self.ms = ModelState(atoms=self.atoms)
+
+    def test_nodes_without_centroids_equal_atoms(self) -> None:
+        assert_frame_equal(self.ms.nodes.table, self.atoms.table)
+        self.assertEqual(len(self.ms.centroids), 0)
+
+    def test_add_nodes(self) -> None:
+        self.ms.add_nodes(centroid(self.atoms, 'X1', [0.1, 0.2, 0.3]))
+        self.ms.add_nodes(centroid(self.atoms, 'X2', [0.4, 0.5, 0.6]))
+        self.assertEqual(len(self.ms.nodes), len(self.atoms) + 2)
+        self.assertEqual(list(self.ms.centroids.table.index), ['X1', 'X2'])
+        x2 = self.ms.nodes.locate([Locator('X2')])
+        self.assertEqual(x2.table.at['X2', 'fract_y'], 0.5)
+
+    def test_nodes_view_is_reused_until_change(self) -> None:
+        nodes = self.ms.nodes
+        self.assertIs(nodes, self.ms.nodes)
+        self.ms.add_nodes(centroid(self.atoms, 'X1', [0.1, 0.2, 0.3]))
+        self.assertIsNot(nodes, self.ms.nodes)
+        self.assertEqual(len(nodes), len(self.atoms))
+
+    def test_centroids_setter_replaces_centroids(self) -> None:
+        self.ms.add_nodes(centroid(self.atoms, 'X1', [0.1, 0.2, 0.3]))
+        self.ms.centroids = centroid(self.atoms, 'X2', [0.4, 0.5, 0.6])
+        self.assertEqual(list(self.ms.centroids.table.index), ['X2'])
+        self.assertEqual(len(self.ms.nodes), len(self.atoms) + 1)
+
+    def test_centroids_setter_keeps_earlier_views(self) -> None:
+        self.ms.add_nodes(centroid(self.atoms, 'X1', [0.1, 0.2, 0.3]))
+        old_centroids, old_nodes = self.ms.centroids, self.ms.nodes
+        self.ms.centroids = centroid(self.atoms, 'X2', [0.4, 0.5, 0.6])
+        self.assertEqual(list(old_centroids.table.index), ['X1'])
+        self.assertEqual(old_centroids.table.at['X1', 'fract_x'], 0.1)
+        self.assertEqual(old_nodes.table.at['X1', 'fract_y'], 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
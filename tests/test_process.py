@@ -0,0 +1,311 @@
+import importlib.resources
+import itertools
+import json
+from pathlib import Path
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pandas.testing import assert_frame_equal
+
+from picometer import atom
+from picometer.atom import AtomSet, Locator
+from picometer.checkpoint import CheckpointError
+from picometer.instructions import Instruction, LoadInstructionHandler, Routine
+from picometer.process import _stream_parts, process, Processor
+from picometer.settings import Settings
+from picometer.utility import LRUCache
+from tests.test_instructions import get_yaml
+
+
+class TestProcessor(unittest.TestCase):
+    def test_settings_kept_after_clear(self) -> None:
+        document = get_yaml('test_instructions.yaml', [0, 1])
+        routine = Routine.concatenate([
+            Routine.from_string('settings:\n  clear_selection_after_use: False\n'
+                                + document), Routine.from_string(document)])
+        settings = Settings({'load_workers': 4, 'auto_write_unit_cell': False})
+        for stream in [False, True]:
+            processor = process(routine, settings=settings, stream=stream)
+            self.assertEqual(processor.settings['load_workers'], 4)
+            self.assertFalse(processor.settings['auto_write_unit_cell'])
+            self.assertTrue(processor.settings['clear_selection_after_use'])
+            self.assertNotIn('unit_cell_a', processor.evaluation_table.columns)
+
+
+class TestStreaming(unittest.TestCase):
+    def assert_stream_equals_bulk(self, routine_text: str) -> None:
+        bulk = process(Routine.from_string(routine_text))
+        streamed = process(Routine.from_string(routine_text), stream=True)
+        assert_frame_equal(bulk.evaluation_table, streamed.evaluation_table,
+                           check_exact=True)
+        assert_frame_equal(bulk.contacts_table, streamed.contacts_table,
+                           check_exact=True)
+        self.assertEqual(bulk.history, streamed.history)
+        self.assertEqual(len(streamed.model_states), 0)
+
+    def test_ferrocene(self) -> None:
+        self.assert_stream_equals_bulk(get_yaml('test_ferrocene.yaml'))
+
+    def test_new_columns_in_later_structures(self) -> None:
+        routine_text = get_yaml('test_instructions.yaml')
+        routine_text += '  - select: cp_A\n  - coordinates\n'
+        routine_text += '  - select: Fe\n  - select: cp_A\n  - contacts: 2.2\n'
+        self.assert_stream_equals_bulk(routine_text)
+
+    def test_stream_parts(self) -> None:
+        routine = Routine([Instruction(set={'load_workers': 1}),
+                           Instruction(load='a.cif'), Instruction(load='b.cif'),
+                           Instruction(select='Fe'), Instruction('coordinates'),
+                           Instruction(write='out.csv')])
+        head, loads, body, tail = _stream_parts(list(routine))
+        self.assertEqual([len(head), len(loads), len(body), len(tail)], [1, 2, 2, 1])
+        routine.append(Instruction(load='c.cif'))
+        self.assertIsNone(_stream_parts(list(routine)))
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp())
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            tests_path = cif_path.parent
+        for i in range(1, 7):
+            shutil.copy(tests_path / f'ferrocene{i}.cif', self.temp_dir)
+        routine_text = get_yaml('test_ferrocene.yaml')
+        routine_text = routine_text.replace('  - write:', '  - select: Fe\n'
+                                            '  - select: cp_A\n  - contacts: 2.2\n'
+                                            '  - write:')
+        self.routine_text = routine_text.replace(str(tests_path), str(self.temp_dir))
+        self.settings = Settings({'incremental_cache_dir': self.temp_dir / 'cache'})
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def assert_incremental_equals_bulk(self, reused: int) -> None:
+        bulk = process(Routine.from_string(self.routine_text))
+        with self.assertLogs('picometer.process', level='INFO') as logs:
+            incremental = process(Routine.from_string(self.routine_text),
+                                  settings=self.settings, stream=True)
+        reuse_messages = [m for m in logs.output if 'reused results' in m]
+        self.assertEqual(len(reuse_messages), reused)
+        assert_frame_equal(bulk.evaluation_table, incremental.evaluation_table,
+                           check_exact=True)
+        assert_frame_equal(bulk.contacts_table, incremental.contacts_table,
+                           check_exact=True)
+        self.assertEqual(bulk.history, incremental.history)
+
+    def test_unchanged_structures_reused(self) -> None:
+        self.assert_incremental_equals_bulk(reused=0)
+        self.assert_incremental_equals_bulk(reused=6)
+
+    def test_fingerprint_depends_on_groups(self) -> None:
+        processor = Processor()
+        body = [Instruction(select='ring'), Instruction('coordinates')]
+        fingerprint = processor._fingerprint(body)
+        with mock.patch.dict(atom.group_registry, ring=[Locator('C1')]):
+            self.assertNotEqual(processor._fingerprint(body), fingerprint)
+        self.assertEqual(processor._fingerprint(body), fingerprint)
+
+    def test_block_patterns_reused(self) -> None:
+        self.routine_text = re.sub(r'- load: (\S+)', r"- load: {path: \1, block: '*'}",
+                                   self.routine_text)
+        self.assert_incremental_equals_bulk(reused=0)
+        self.assert_incremental_equals_bulk(reused=6)
+
+    def test_modified_structure_recomputed(self) -> None:
+        self.assert_incremental_equals_bulk(reused=0)
+        with open(self.temp_dir / 'ferrocene3.cif', 'a') as cif_file:
+            cif_file.write('\n# modified\n')
+        self.assert_incremental_equals_bulk(reused=5)
+
+    def test_changed_routine_recomputed(self) -> None:
+        self.assert_incremental_equals_bulk(reused=0)
+        self.routine_text = self.routine_text.replace(
+            '  - write:', '  - select: Fe\n  - coordinates\n  - write:')
+        self.assert_incremental_equals_bulk(reused=0)
+
+
+class TestMultiBlockLoad(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp())
+        with importlib.resources.path('tests', 'ferrocene1.cif') as cif_path:
+            tests_path = cif_path.parent
+        self.cif_path = self.temp_dir / 'ferrocenes.cif'
+        self.cif_path.write_text('\n'.join((tests_path / f'ferrocene{i}.cif')
+                                           .read_text() for i in range(1, 7)))
+        self.routine_text = get_yaml('test_ferrocene.yaml')
+        loads = [line for line in self.routine_text.splitlines()
+                 if line.startswith('  - load:')]
+        self.multi_text = self.routine_text.replace('\n'.join(loads), (
+            f"  - load: {{path: {self.cif_path}, block: '21019*'}}"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_all_blocks_loaded_from_single_parse(self) -> None:
+        separate = process(Routine.from_string(self.routine_text))
+        for stream in (False, True):
+            with self.subTest(stream=stream), \
+                    mock.patch.object(AtomSet, '_parse_cif_blocks',
+                                      wraps=AtomSet._parse_cif_blocks) as parse, \
+                    mock.patch.object(AtomSet, 'cif_block_names') as scan:
+                multi = process(Routine.from_string(self.multi_text), stream=stream)
+                self.assertEqual(parse.call_count, 1)
+                scan.assert_not_called()
+                assert_frame_equal(separate.evaluation_table.reset_index(drop=True),
+                                   multi.evaluation_table.reset_index(drop=True))
+        multi = process(Routine.from_string(self.multi_text))
+        self.assertEqual(list(multi.model_states), [
+            f'{self.cif_path}:{2101932 + i}' for i in range(6)])
+
+    def test_stream_equals_bulk(self) -> None:
+        bulk = process(Routine.from_string(self.multi_text))
+        streamed = process(Routine.from_string(self.multi_text), stream=True)
+        assert_frame_equal(bulk.evaluation_table, streamed.evaluation_table,
+                           check_exact=True)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.routine = Routine.from_string(get_yaml('test_instructions.yaml'))
+        self.settings = Settings({'checkpoint_path': self.temp_dir / 'checkpoint',
+                                  'checkpoint_every': 5})
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_resume_equals_uninterrupted(self) -> None:
+        uninterrupted = process(self.routine)
+        interrupted_at = len(self.routine) - 3
+        process(Routine(list(self.routine)[:interrupted_at]), settings=self.settings)
+        with self.assertLogs('picometer.process', level='INFO') as logs:
+            resumed = process(self.routine, settings=self.settings, resume=True)
+        processed = [m for m in logs.output if ' processed ' in m]
+        self.assertLess(len(processed), len(self.routine) - interrupted_at + 5)
+        assert_frame_equal(uninterrupted.evaluation_table,
+                           resumed.evaluation_table, check_exact=True)
+        self.assertEqual(uninterrupted.history, resumed.history)
+        self.assertEqual(list(uninterrupted.model_states),
+                         list(resumed.model_states))
+
+    def test_resume_in_fresh_process(self) -> None:
+        lines = [0, 1, 3] + list(range(7, 30))  # ferrocenes 1 & 3 differ in labels
+        routine = Routine.from_string(get_yaml('test_instructions.yaml', lines)
+                                      + '  - select: .+\n  - coordinates\n')
+        settings = Settings({**self.settings, 'checkpoint_every': 1})
+        uninterrupted = process(routine)
+        for resume in [False, True]:  # every run in fresh state, as if new process
+            with mock.patch.object(atom.LabelIndex, '_ids', itertools.count()), \
+                    mock.patch.dict(atom._label_indices, clear=True), \
+                    mock.patch.object(atom, '_plan_cache', LRUCache(maxsize=65536)):
+                resumed = process(Routine(list(routine)[:1]) if not resume
+                                  else routine, settings=settings, resume=resume)
+        assert_frame_equal(uninterrupted.evaluation_table,
+                           resumed.evaluation_table, check_exact=True)
+
+    def test_resume_without_checkpoint_processes_all(self) -> None:
+        uninterrupted = process(self.routine)
+        resumed = process(self.routine, settings=self.settings, resume=True)
+        assert_frame_equal(uninterrupted.evaluation_table,
+                           resumed.evaluation_table, check_exact=True)
+
+    def test_resume_multiple_documents(self) -> None:
+        routine = Routine.concatenate([self.routine, Routine(list(self.routine))])
+        uninterrupted = process(routine)
+        process(Routine(list(routine)[:len(self.routine) + 10]), settings=self.settings)
+        resumed = process(routine, settings=self.settings, resume=True)
+        assert_frame_equal(uninterrupted.evaluation_table,
+                           resumed.evaluation_table, check_exact=True)
+        self.assertEqual(uninterrupted.history, resumed.history)
+
+    def test_resume_stream_after_structure(self) -> None:
+        uninterrupted = process(self.routine, stream=True)
+        load = LoadInstructionHandler._load_model_state
+        loaded = []
+
+        def interrupted_load(*args, **kwargs) -> str:
+            if len(loaded) == 4:
+                raise KeyboardInterrupt
+            loaded.append(args[1])
+            return load(*args, **kwargs)
+        settings = Settings({**self.settings, 'checkpoint_every': 1})
+        with mock.patch.object(LoadInstructionHandler, '_load_model_state',
+                               side_effect=interrupted_load, autospec=True), \
+                self.assertRaises(KeyboardInterrupt):
+            process(self.routine, settings=settings, stream=True)
+        with self.assertRaises(CheckpointError):
+            process(self.routine, settings=settings, resume=True)
+        with mock.patch.object(LoadInstructionHandler, '_load_model_state',
+                               side_effect=load, autospec=True) as resumed_load:
+            resumed = process(self.routine, settings=settings, stream=True, resume=True)
+        self.assertEqual(resumed_load.call_count, 2)
+        assert_frame_equal(uninterrupted.evaluation_table,
+                           resumed.evaluation_table, check_exact=True)
+        self.assertEqual(uninterrupted.history, resumed.history)
+
+    def test_resume_other_routine_raises(self) -> None:
+        process(self.routine, settings=self.settings)
+        other = Routine([Instruction(load='other.cif')] + list(self.routine))
+        with self.assertRaises(CheckpointError):
+            process(other, settings=self.settings, resume=True)
+
+
+class TestTimings(unittest.TestCase):
+    def setUp(self) -> None:
+        self.routine = Routine.from_string(get_yaml('test_ferrocene.yaml'))
+
+    def test_every_instruction_timed(self) -> None:
+        processor = process(self.routine)
+        table = processor.timing_table
+        self.assertEqual(list(table['stage']), list(range(len(self.routine))))
+        self.assertEqual(list(table['instruction']),
+                         [instruction.text for instruction in self.routine])
+        self.assertTrue((table['calls'] == 1).all())
+        self.assertTrue((table['wall'] >= 0).all() and (table['cpu'] >= 0).all())
+        n_model_states = len(processor.model_states)
+        centroid = table[table['instruction'].str.startswith('centroid')]
+        self.assertTrue((centroid['model_states'] == n_model_states).all())
+        per_model_state = processor.timer.summary('model_state')
+        self.assertEqual(list(per_model_state['model_state']),
+                         list(processor.model_states))
+
+    def test_stream_counts_calls_per_structure(self) -> None:
+        processor = process(self.routine, stream=True)
+        table = processor.timing_table
+        self.assertEqual(list(table['stage']), list(range(len(self.routine))))
+        loads = table['instruction'].str.startswith('load')
+        self.assertTrue((table.loc[loads, 'calls'] == 1).all())
+        select_fe = table['instruction'] == 'select: Fe'
+        self.assertTrue((table.loc[select_fe, 'calls'] == 6).all())
+
+    def test_documents_timed_separately(self) -> None:
+        routine = Routine.concatenate([self.routine, Routine(list(self.routine))])
+        for stream in (False, True):
+            with self.subTest(stream=stream):
+                table = process(routine, stream=stream).timing_table
+                self.assertEqual(list(table['stage']), list(range(len(routine))))
+                self.assertEqual(list(table['instruction']),
+                                 [instruction.text for instruction in routine])
+                loads = table['instruction'].str.startswith('load')
+                self.assertEqual(loads.sum(), 12)
+                self.assertTrue((table.loc[loads, 'calls'] == 1).all())
+
+    def test_trace(self) -> None:
+        processor = process(self.routine)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trace_path = Path(temp_dir) / 'trace.json'
+            processor.timer.write_trace(trace_path)
+            events = json.loads(trace_path.read_text())['traceEvents']
+        self.assertEqual(len(events), len(processor.timer))
+        self.assertEqual({e['cat'] for e in events},
+                         {'instruction', 'model_state', 'stack'})
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0 for e in events))
+        timestamps = [e['ts'] for e in events]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+
+if __name__ == '__main__':
+    unittest.main()
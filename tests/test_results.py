@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from picometer.results import ResultStore
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = ResultStore(capacity=2)
+
+    def test_empty(self) -> None:
+        self.assertEqual(len(self.store), 0)
+        self.assertTrue(self.store.table.empty)
+
+    def test_matches_cell_by_cell_table(self) -> None:
+        expected = pd.DataFrame()
+        for row, column, value in [('a', 'x', 1.), ('a', 'y', 2.), ('b', 'z', 3.),
+                                   ('c', 'y', 4.), ('b', 'x', 5.)]:
+            expected.loc[row, column] = value
+            self.store.add(row, column, value)
+        assert_frame_equal(self.store.table, expected)
+
+    def test_extend_grows_capacity(self) -> None:
+        columns = [f'c{i}' for i in range(100)]
+        self.store.extend('a', columns, range(100))
+        self.store.extend('b', columns[::-1], range(100))
+        self.assertEqual(len(self.store), 200)
+        self.assertEqual(self.store.table.shape, (2, 100))
+        self.assertEqual(self.store.table.at['b', 'c0'], 99.)
+
+    def test_later_records_overwrite(self) -> None:
+        self.store.add('a', 'x', 1.)
+        self.store.add('a', 'x', 2.)
+        self.assertEqual(self.store.table.at['a', 'x'], 2.)
+
+    def test_missing_values_are_nan(self) -> None:
+        self.store.extend('a', ['x', 'y'], [pd.NA, None])
+        self.store.add('b', 'z', 1.)
+        self.assertEqual(np.isnan(self.store.table.to_numpy()).sum(), 5)
+
+    def test_from_frame_roundtrip(self) -> None:
+        self.store.extend('a', ['x', 'y'], [1., 2.])
+        self.store.extend('b', ['y', 'z'], [3., 4.])
+        table = self.store.table
+        assert_frame_equal(ResultStore.from_frame(table).table, table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,3 +39,9 @@ class TestSettings(unittest.TestCase):
         self.assertNotEqual(self.settings[known_setting.name], default_value)
         del self.settings[known_setting.name]
         self.assertEqual(self.settings[known_setting.name], default_value)
+
+    def test_packaged_settings_not_shared(self) -> None:
+        settings1, settings2 = Settings.from_yaml(), Settings.from_yaml()
+        settings1['load_workers'] = settings2['load_workers'] + 1
+        self.assertNotEqual(settings1['load_workers'], settings2['load_workers'])
+        self.assertEqual(settings2, Settings.from_yaml())
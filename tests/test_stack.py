@@ -0,0 +1,84 @@
+import unittest
+
+from hikari.dataframes import BaseFrame
+import numpy as np
+import pandas as pd
+
+from picometer.atom import AtomSet
+from picometer import stack as stacked
+from picometer.instructions import Routine
+from picometer.process import process
+from picometer.shapes import versorize
+from tests.test_instructions import get_yaml
+
+
+def random_atom_set(rng: np.random.Generator, n_atoms: int) -> AtomSet:
+    bf = BaseFrame()
+    bf.edit_cell(a=10 + rng.random(), b=11 + rng.random(), c=12 + rng.random(),
+                 al=90, be=100 + rng.random(), ga=90)
+    xyz = rng.random((n_atoms, 3))
+    table = pd.DataFrame(xyz, columns=['fract_x', 'fract_y', 'fract_z'],
+                         index=[f'C{i}' for i in range(n_atoms)])
+    return AtomSet(bf, table)
+
+
+class TestStackedGeometry(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        self.atom_sets = [random_atom_set(rng, 6) for _ in range(5)]
+        self.xyz = np.stack([a.cart_xyz.T for a in self.atom_sets])
+
+    def test_centroids(self) -> None:
+        expected = [a.centroid for a in self.atom_sets]
+        np.testing.assert_allclose(stacked.centroids(self.xyz), expected)
+
+    def test_line_directions(self) -> None:
+        expected = [a.line.direction for a in self.atom_sets]
+        results = [versorize(d) for d in stacked.line_directions(self.xyz)]
+        np.testing.assert_allclose(results, expected)
+
+    def test_plane_normals(self) -> None:
+        expected = [a.plane.direction for a in self.atom_sets]
+        results = [versorize(d) for d in stacked.plane_normals(self.xyz)]
+        np.testing.assert_allclose(results, expected)
+
+    def test_distances(self) -> None:
+        expected = [a[:2].distance(a[2:]) for a in self.atom_sets]
+        results = stacked.distances(self.xyz[:, :2], self.xyz[:, 2:])
+        np.testing.assert_allclose(results, expected)
+
+    def test_closest_pairs(self) -> None:
+        distances, i, j = stacked.closest_pairs(self.xyz[:, :2], self.xyz[:, 2:])
+        for a, d, i_, j_ in zip(self.atom_sets, distances, i, j):
+            expected = a[:2].closest_pair(a[2:])
+            self.assertAlmostEqual(d, expected.distance)
+            self.assertEqual(a.table.index[i_], expected.label1)
+            self.assertEqual(a.table.index[2 + j_], expected.label2)
+
+    def test_angles(self) -> None:
+        expected = [a[:3].angle() for a in self.atom_sets]
+        np.testing.assert_allclose(stacked.angles(self.xyz[:, :3]), expected)
+
+    def test_dihedrals(self) -> None:
+        expected = [a[:4].dihedral() for a in self.atom_sets]
+        np.testing.assert_allclose(stacked.dihedrals(self.xyz[:, :4]), expected)
+
+    def test_wrong_number_of_atoms_raises(self) -> None:
+        with self.assertRaises(AssertionError):
+            stacked.angles(self.xyz[:, :4])
+        with self.assertRaises(AssertionError):
+            stacked.dihedrals(self.xyz[:, :3])
+
+
+class TestStackedInstructions(unittest.TestCase):
+    def test_stacked_equals_serial(self) -> None:
+        routine_text = get_yaml('test_ferrocene.yaml')
+        serial_text = routine_text.replace(
+            'settings:', 'settings:\n  stack_model_states: False', 1)
+        t1 = process(Routine.from_string(serial_text)).evaluation_table
+        t2 = process(Routine.from_string(routine_text)).evaluation_table
+        pd.testing.assert_frame_equal(t1, t2, check_exact=False, rtol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+from pathlib import Path
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from picometer import settings
+from picometer.instructions import Routine
+from picometer.process import process
+from tests.test_instructions import get_yaml
+
+
+IMPORT_TIME_BUDGET = 1.0  # seconds to import the command line interface
+LAZY_IMPORTS = ('hikari', 'matplotlib', 'scipy', 'uncertainties', 'yaml')
+PROJECT_ROOT = Path(__file__).parents[1]
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], capture_output=True, check=True,
+                          cwd=PROJECT_ROOT, text=True)
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_dependencies_imported_lazily(self) -> None:
+        code = 'import sys, picometer.__main__; print(*sys.modules)'
+        imported = {m.split('.')[0] for m in _run_python('-c', code).stdout.split()}
+        self.assertFalse(imported.intersection(LAZY_IMPORTS))
+
+    def test_import_time_budget(self) -> None:
+        def import_time() -> float:
+            stderr = _run_python('-X', 'importtime', '-c',
+                                 'import picometer.__main__').stderr
+            line = next(line for line in stderr.splitlines()
+                        if line.endswith(' picometer.__main__'))
+            return int(line.split('|')[1]) / 1e6  # cumulative, in microseconds
+        self.assertLess(min(import_time() for _ in range(3)), IMPORT_TIME_BUDGET)
+
+    def test_clear_does_not_reread_settings(self) -> None:
+        routine = Routine.from_string(get_yaml('test_instructions.yaml'))
+        routine = Routine.concatenate([routine, Routine(list(routine))])
+        settings.Settings.from_yaml()
+        with mock.patch.object(settings, '_read_settings_yaml',
+                               wraps=settings._read_settings_yaml) as read:
+            processor = process(routine)
+        self.assertEqual(read.call_count, 0)
+        self.assertEqual(len(processor.timing_table), len(routine))
+
+
+if __name__ == '__main__':
+    unittest.main()
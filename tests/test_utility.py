@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+from picometer.utility import ustr2float, ustrs2arrays
+
+
+class TestUstrs2Arrays(unittest.TestCase):
+    def test_values_and_esds(self) -> None:
+        values, esds = ustrs2arrays(['1.234(5)', '-0.5', '1e-3(2)', '?', '.',
+                                     '-.0218(10)', '12(3)', '1.5E+2(12)'])
+        np.testing.assert_array_equal(
+            values, [1.234, -0.5, 1e-3, np.nan, np.nan, -0.0218, 12, 150])
+        np.testing.assert_allclose(
+            esds, [0.005, 0, 2e-3, np.nan, np.nan, 0.001, 3, 120], rtol=1e-15)
+
+    def test_identical_to_ustr2float(self) -> None:
+        rng = np.random.default_rng(42)
+        strings = [f'{v:.{d}f}({e})' if e % 3 else f'{v:.{d}f}' for v, d, e in
+                   zip(rng.normal(0, 100, 1000), rng.integers(0, 7, 1000),
+                       rng.integers(1, 100, 1000))]
+        values, esds = ustrs2arrays(strings)
+        self.assertEqual(values.tolist(), [ustr2float(s) for s in strings])
+        self.assertEqual(np.count_nonzero(esds), sum('(' in s for s in strings))
+
+    def test_empty_and_invalid(self) -> None:
+        self.assertEqual(len(ustrs2arrays([])[0]), 0)
+        with self.assertRaises(ValueError):
+            ustrs2arrays(['1.0', 'C1'])
+
+
+if __name__ == '__main__':
+    unittest.main()